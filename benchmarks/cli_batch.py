@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Compares resolving --metrics metrics with one bin/cli run per metric against a single bin/cli --file run,
+#   both against local stand-in TSDB and HBase UI servers. The region cache is populated before either is timed.
+#
+#   python benchmarks/cli_batch.py --metrics 100 --tsdb-latency 0.05
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import fake_servers
+import load_test
+
+CLI = os.path.join(load_test.ROOT, 'bin', 'cli')
+
+def run_cli(directory, args, stdin=None):
+    env = dict(os.environ, PYTHONPATH=load_test.ROOT, REGION_FINDER_LOG=os.path.join(directory, 'rf.log'))
+    process = subprocess.Popen([sys.executable, CLI] + args, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, _ = process.communicate(stdin)
+    return out.decode('utf-8')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare one bin/cli run per metric with a bin/cli batch run')
+    parser.add_argument('--metrics', type=int, default=100, help='metrics to resolve')
+    parser.add_argument('--tsdb-latency', type=float, default=0.05, help='seconds the stand-in TSDB takes per query')
+    parser.add_argument('--regions', type=int, default=2000, help='regions in the fake cluster')
+    parser.add_argument('--tsuids', type=int, default=1000, help='series per metric')
+    parser.add_argument('--batch-size', type=int, default=20, help='bin/cli --batch-size')
+    parser.add_argument('--concurrency', type=int, default=8, help='bin/cli --concurrency')
+    args = parser.parse_args()
+
+    cluster = fake_servers.FakeCluster(servers=20, regions=args.regions, tsuids=args.tsuids)
+    hbase_ui = fake_servers.start_hbase_ui(cluster)
+    tsdb = fake_servers.start_tsdb(cluster, latency=args.tsdb_latency)
+    directory = tempfile.mkdtemp(prefix='rf-cli-batch-')
+    try:
+        config_path = load_test.write_config(directory, fake_servers.url_of(tsdb), fake_servers.url_of(hbase_ui), 64, 30)
+        metrics = ['metric.{}'.format(i) for i in range(args.metrics)]
+        run_cli(directory, ['-c', config_path, metrics[0]])
+
+        cluster.reset_counters()
+        started = time.time()
+        for metric in metrics:
+            run_cli(directory, ['-c', config_path, metric])
+        single = {'seconds': round(time.time() - started, 2), 'tsdb_requests': cluster.tsdb_requests}
+
+        cluster.reset_counters()
+        started = time.time()
+        out = run_cli(directory, ['-c', config_path, '-f', '-', '--format', 'ndjson', '--batch-size', str(args.batch_size),
+                                  '--concurrency', str(args.concurrency)], '\n'.join(metrics).encode('utf-8'))
+        batched = {'seconds': round(time.time() - started, 2), 'tsdb_requests': cluster.tsdb_requests,
+                   'rows': len(out.splitlines()), 'metrics': len(set(json.loads(line)['metric'] for line in out.splitlines()))}
+    finally:
+        hbase_ui.shutdown()
+        tsdb.shutdown()
+        shutil.rmtree(directory)
+    print(json.dumps({'metrics': args.metrics, 'tsdb_latency': args.tsdb_latency, 'one_run_per_metric': single, 'batch': batched}, indent=2))
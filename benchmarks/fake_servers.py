@@ -0,0 +1,356 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Local stand-ins for the HBase master/region server web UIs, the scanner API of the HBase REST gateway and the TSDB
+#   HTTP API, used by the benchmarks.
+#
+# All region servers of the fake cluster are served by one HTTP server. Each one is linked from /master-status as
+#   //127.0.0.1:<port>/?rs=<n>, and HBaseUIClient keeps that query string when it requests /rs-status.
+
+import base64
+import binascii
+import hashlib
+import itertools
+import json
+import random
+import struct
+import threading
+import time
+from collections import OrderedDict
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs, unquote
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+    from urllib import unquote
+
+PRINTABLE = set(bytearray(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 `~!@#$%^&*()-_=+[]{}|;:\'",.<>/?'))
+
+# Same rendering as HBase's Bytes.toStringBinary
+def to_string_binary(key):
+    return ''.join(chr(b) if b in PRINTABLE else '\\x{:02X}'.format(b) for b in bytearray(key))
+
+def html_escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+def varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def pb_field(number, value):
+    if isinstance(value, bytes):
+        return varint(number << 3 | 2) + varint(len(value)) + value
+    return varint(number << 3) + varint(value)
+
+# The info:regioninfo cell of hbase:meta: PBUF and a RegionInfo message of HBase.proto
+def region_info_cell(table, region_id, start, stop, offline=False, split=False):
+    table_name = pb_field(1, b'default') + pb_field(2, table.encode('utf-8'))
+    message = pb_field(1, region_id) + pb_field(2, table_name) + pb_field(3, start) + pb_field(4, stop)
+    if offline:
+        message += pb_field(5, 1)
+    if split:
+        message += pb_field(6, 1)
+    return b'PBUF' + message
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class FakeCluster:
+    '''
+    A generated table of `regions` regions spread round-robin over `servers` region servers, and `tsuids` series per metric.
+
+    Row keys are <salt><metric uid><4 byte timestamp><tagk uid><tagv uid>. Region boundaries are drawn at random from the
+    key space of a handful of metric uids, so every generated series lands in some region.
+    '''
+    def __init__(self, servers=10, regions=1000, tsuids=10000, metric_width=3, tag_width=3, salt_width=0, metrics=8, seed=42):
+        self.servers = servers
+        self.metric_width = metric_width
+        self.tag_width = tag_width
+        self.salt_width = salt_width
+        self.tsuid_count = tsuids
+        self.metric_count = metrics
+        rng = random.Random(seed)
+        boundaries = set()
+        while len(boundaries) < regions - 1:
+            salt = bytes(bytearray([rng.randrange(20)])) if salt_width else b''
+            metric = struct.pack('>I', rng.randrange(1, metrics + 1))[-metric_width:]
+            boundaries.add(salt + metric + struct.pack('>I', rng.randrange(1 << 32)) + bytes(bytearray(rng.randrange(256) for _ in range(2 * tag_width))))
+        boundaries = [b''] + sorted(boundaries) + [b'']
+        self.regions = []
+        # Regions of each server, so that rendering a status page does not walk the whole table
+        self.regions_of = [[] for _ in range(servers)]
+        for i in range(regions):
+            name = 'tsdb,{}.{}'.format(1500000000000 + i, hashlib.md5(str(i).encode('ascii')).hexdigest())
+            self.regions.append((i % servers, name, boundaries[i], boundaries[i + 1]))
+            self.regions_of[i % servers].append(self.regions[-1])
+        # Counters that show how much work the stand-in TSDB had to do
+        self.tsdb_requests = 0
+        self.tsdb_datapoints_read = 0
+        self.tsdb_bytes_sent = 0
+        self.ui_requests = 0
+        self.rest_requests = 0
+        self._lock = threading.Lock()
+
+    def metric_uid(self, metric_name):
+        index = int(hashlib.md5(metric_name.encode('utf-8')).hexdigest(), 16) % self.metric_count + 1
+        return struct.pack('>I', index)[-self.metric_width:]
+
+    def tsuids_of(self, metric_name):
+        rng = random.Random(metric_name)
+        uid = binascii.hexlify(self.metric_uid(metric_name)).decode('ascii').upper()
+        tsuids = []
+        for _ in range(self.tsuid_count):
+            salt = '{:02X}'.format(rng.randrange(20)) if self.salt_width else ''
+            tags = '{:0{width}X}'.format(rng.getrandbits(8 * 2 * self.tag_width), width=4 * self.tag_width)
+            tsuids.append(salt + uid + tags)
+        return tsuids
+
+    def count(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def reset_counters(self):
+        with self._lock:
+            self.tsdb_requests = self.tsdb_datapoints_read = self.tsdb_bytes_sent = self.ui_requests = self.rest_requests = 0
+
+    # Rows of hbase:meta for the table, as sorted (row key, [(column, value)]) pairs. The row key is the full region
+    #   name, <table>,<start key>,<region id>.<encoded name>
+    def meta_rows(self):
+        rows = []
+        for server, name, start, stop in self.regions:
+            table, region = name.split(',')
+            row_key = table.encode('utf-8') + b',' + start + b',' + region.encode('utf-8')
+            rows.append((row_key, [
+                (b'info:regioninfo', region_info_cell(table, int(region.split('.')[0]), start, stop)),
+                (b'info:server', 'rs{}.local:16020'.format(server).encode('utf-8')),
+                (b'info:serverstartcode', struct.pack('>q', 1544258234698)),
+            ]))
+        rows.sort()
+        return rows
+
+    def master_status_html(self, port):
+        rows = []
+        for server in range(self.servers):
+            region_count = len(self.regions_of[server])
+            rows.append('<tr><td><a href="//127.0.0.1:{port}/?rs={server}">rs{server},60020,1544258234698</a></td>'
+                        '<td>Sat Dec 08 08:37:14 GMT 2018</td><td>10000</td><td>{count}</td></tr>'.format(port=port, server=server, count=region_count))
+        return ('<html><body><div class="tab-pane active" id="tab_baseStats"><table class="table table-striped">'
+                '<tr><th>ServerName</th><th>Start time</th><th>Requests Per Second</th><th>Num. Regions</th></tr>'
+                + ''.join(rows) +
+                '<tr><td>Total:{}</td><td></td><td></td><td>{}</td></tr></table></div></body></html>'.format(self.servers, len(self.regions)))
+
+    def rs_status_html(self, server, columns=3):
+        rows = []
+        for _, name, start, stop in self.regions_of[server]:
+            start_text = html_escape(to_string_binary(start))
+            stop_text = html_escape(to_string_binary(stop))
+            if columns == 4:
+                full_name = '{},{},{}.'.format(name.split(',')[0], start_text, name.split(',')[1])
+                rows.append('<tr><td><a href="region.jsp?name={0}">{0}</a></td><td>{1}</td><td>{2}</td><td>0</td></tr>'.format(full_name, start_text, stop_text))
+            else:
+                rows.append('<tr><td>{}</td><td>{}</td><td>{}</td></tr>'.format(name, start_text, stop_text))
+        header = '<tr><th>Region Name</th><th>Start Key</th><th>End Key</th>' + ('<th>ReplicaID</th>' if columns == 4 else '') + '</tr>'
+        return ('<html><body><div class="tab-pane active" id="tab_regionBaseInfo"><table class="table table-striped">'
+                + header + '\n'.join(rows) + '</table></div></body></html>')
+
+def start_hbase_ui(cluster, columns=3, latency=0.0):
+    '''Starts the stand-in master and region server UIs on an ephemeral port and returns the server. latency is added to every page'''
+    class HBaseUIHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            cluster.count(ui_requests=1)
+            time.sleep(latency)
+            url = urlparse(self.path)
+            if url.path == '/master-status':
+                body = cluster.master_status_html(self.server.server_address[1])
+            elif url.path == '/rs-status':
+                body = cluster.rs_status_html(int(parse_qs(url.query)['rs'][0]), columns)
+            else:
+                self.send_error(404)
+                return
+            send_body(self, 'text/html', body)
+
+        def log_message(self, *args):
+            pass
+    return start(HBaseUIHandler)
+
+def start_hbase_rest(cluster, latency=0.0):
+    '''
+    Starts a stand-in HBase REST gateway on an ephemeral port and returns the server. It only serves JSON scanners of
+    hbase:meta: POST /hbase:meta/scanner opens one, each GET of its Location returns the next batch cells (a batch may
+    end in the middle of a row) until a 204, and DELETE closes it. latency is added to every GET
+    '''
+    meta_rows = cluster.meta_rows()
+    scanners = {}
+    scanner_ids = itertools.count(1)
+
+    class HBaseRESTHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            cluster.count(rest_requests=1)
+            if unquote(urlparse(self.path).path) != '/hbase:meta/scanner':
+                self.send_error(404)
+                return
+            spec = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+            start_row = base64.b64decode(spec.get('startRow', ''))
+            end_row = base64.b64decode(spec.get('endRow', ''))
+            columns = set(base64.b64decode(column) for column in spec.get('column', []))
+            cells = [(row_key, column, value) for row_key, row in meta_rows for column, value in row
+                     if row_key >= start_row and (not end_row or row_key < end_row) and (not columns or column in columns)]
+            scanner_id = str(next(scanner_ids))
+            scanners[scanner_id] = (cells, int(spec.get('batch', 100)), [0])
+            self.send_response(201)
+            self.send_header('Location', 'http://127.0.0.1:{}/hbase:meta/scanner/{}'.format(self.server.server_address[1], scanner_id))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_GET(self):
+            cluster.count(rest_requests=1)
+            time.sleep(latency)
+            scanner = scanners.get(unquote(urlparse(self.path).path).rsplit('/', 1)[-1])
+            if scanner is None:
+                self.send_error(404)
+                return
+            cells, batch, position = scanner
+            page = cells[position[0]:position[0] + batch]
+            position[0] += len(page)
+            if len(page) == 0:
+                self.send_response(204)
+                self.end_headers()
+                return
+            rows = []
+            for row_key, column, value in page:
+                if len(rows) == 0 or rows[-1][0] != row_key:
+                    rows.append((row_key, []))
+                rows[-1][1].append({'column': b64(column), 'timestamp': 1544258234698, '$': b64(value)})
+            send_body(self, 'application/json', json.dumps({'Row': [{'key': b64(row_key), 'Cell': row_cells} for row_key, row_cells in rows]}))
+
+        def do_DELETE(self):
+            cluster.count(rest_requests=1)
+            scanners.pop(unquote(urlparse(self.path).path).rsplit('/', 1)[-1], None)
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+    return start(HBaseRESTHandler)
+
+def b64(value):
+    return base64.b64encode(value).decode('ascii')
+
+def start_tsdb(cluster, latency=0.0, points_per_hour=360, memoize=False):
+    '''
+    Starts the stand-in TSDB on an ephemeral port and returns the server.
+    latency is added to every /api/query, and every series has points_per_hour datapoints in every hour of the window.
+    With memoize, a query is answered with the body of the first response to the same path, so that building large
+    responses does not make the stand-in the bottleneck of a load test
+    '''
+    responses = {}
+    class TSDBHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if url.path == '/api/search/lookup':
+                self.lookup(params.get('m', [''])[0].split('{')[0])
+                return
+            if url.path != '/api/query':
+                self.send_error(404)
+                return
+            time.sleep(latency)
+            if self.path in responses:
+                cluster.count(tsdb_requests=1, tsdb_bytes_sent=len(responses[self.path]))
+                send_body(self, 'application/json', responses[self.path])
+                return
+            now = int(time.time())
+            start = resolve_time(params.get('start', ['1h-ago'])[0], now)
+            end = resolve_time(params.get('end', ['now'])[0], now)
+            results = []
+            for index, m in enumerate(params.get('m', [])):
+                # m is <aggregator>:[<downsampler>:]<metric>[{tags}]
+                parts = m.split('{')[0].split(':')
+                metric_name = parts[-1]
+                if metric_name.startswith('unknown.'):
+                    # Like TSDB, an unknown metric fails the whole request
+                    body = json.dumps({'error': {'code': 400, 'message': "No such name for 'metrics': '{}'".format(metric_name)}})
+                    cluster.count(tsdb_requests=1, tsdb_bytes_sent=len(body))
+                    send_body(self, 'application/json', body, 400)
+                    return
+                tsuids = cluster.tsuids_of(metric_name)
+                step = 3600 // points_per_hour
+                timestamps = range(start - start % step + step, end + 1, step)
+                cluster.count(tsdb_datapoints_read=len(tsuids) * len(timestamps))
+                if len(parts) == 3 and parts[1].startswith('0all'):
+                    dps = {str(start): float(len(tsuids) * len(timestamps))}
+                else:
+                    dps = dict((str(ts), float(len(tsuids))) for ts in timestamps)
+                result = OrderedDict([('metric', metric_name), ('tags', {}), ('aggregateTags', ['host'])])
+                if params.get('show_query') == ['true']:
+                    result['query'] = {'index': index, 'aggregator': parts[0], 'metric': metric_name}
+                result['tsuids'] = tsuids
+                result['dps'] = dps
+                results.append(result)
+            body = json.dumps(results)
+            if memoize:
+                responses[self.path] = body
+            cluster.count(tsdb_requests=1, tsdb_bytes_sent=len(body))
+            send_body(self, 'application/json', body)
+
+        # Like /api/search/lookup with limit=1: the first series of the metric
+        def lookup(self, metric_name):
+            cluster.count(tsdb_requests=1)
+            if metric_name.startswith('unknown.'):
+                body = json.dumps({'error': {'code': 404, 'message': "No such name for 'metrics': '{}'".format(metric_name)}})
+                send_body(self, 'application/json', body, 404)
+                return
+            tsuid = cluster.tsuids_of(metric_name)[0][2 * cluster.salt_width:]
+            send_body(self, 'application/json', json.dumps({'type': 'LOOKUP', 'metric': metric_name, 'limit': 1,
+                                                            'results': [{'tsuid': tsuid, 'metric': metric_name, 'tags': {}}]}))
+
+        def log_message(self, *args):
+            pass
+    return start(TSDBHandler)
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def resolve_time(value, now):
+    if value == 'now':
+        return now
+    if value.endswith('-ago'):
+        amount = value[:-4]
+        return now - int(amount[:-1]) * UNITS[amount[-1]]
+    value = int(value)
+    return value // 1000 if value > 9999999999 else value
+
+def send_body(handler, content_type, body, status=200):
+    body = body.encode('utf-8')
+    handler.send_response(status)
+    handler.send_header('Content-Type', content_type + '; charset=utf-8')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+def start(handler_class):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def url_of(server):
+    return 'http://127.0.0.1:{}'.format(server.server_address[1])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Cold start of the package and of bin/cli, each run in a fresh interpreter:
+#   - import: `import regionfinder` and the names bin/cli imports, with the heavy modules that got loaded
+#   - cli_help: `bin/cli -h`
+#   - cli_cached: a range mode run with --metric-uid, answered from a region cache populated beforehand. TSDB points at
+#     a closed port, so the run fails if it touches the network
+#
+#   python benchmarks/import_time.py --runs 20
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import fake_servers
+import load_test
+from load_test import ROOT
+
+HEAVY_MODULES = ['requests', 'urllib3', 'html.parser', 'multiprocessing.pool', 'yaml']
+IMPORT_SCRIPT = ('import json, sys; from regionfinder import Config, TSDBClient, HBaseUIClient, HTTPTransport, RegionFinderError; '
+                 'from regionfinder import batch; print(json.dumps([name for name in {} if name in sys.modules]))'.format(HEAVY_MODULES))
+
+def timed_runs(command, runs, env, cwd):
+    durations = []
+    output = None
+    for _ in range(runs):
+        started = time.time()
+        output = subprocess.check_output(command, env=env, cwd=cwd)
+        durations.append(time.time() - started)
+    durations.sort()
+    return {'median_ms': round(durations[len(durations) // 2] * 1000, 1), 'min_ms': round(durations[0] * 1000, 1)}, output
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure cold start time of regionfinder and bin/cli')
+    parser.add_argument('--runs', type=int, default=20, help='fresh interpreters per measurement')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='rf-import-time-')
+    env = dict(os.environ, PYTHONPATH=ROOT, REGION_FINDER_LOG=os.path.join(directory, 'rf.log'))
+    results = {}
+    try:
+        results['python'], _ = timed_runs([sys.executable, '-c', 'pass'], args.runs, env, directory)
+        results['import'], output = timed_runs([sys.executable, '-c', IMPORT_SCRIPT], args.runs, env, directory)
+        results['import']['heavy_modules_loaded'] = json.loads(output.decode('utf-8'))
+        cli = [sys.executable, os.path.join(ROOT, 'bin', 'cli')]
+        results['cli_help'], _ = timed_runs(cli + ['-h'], args.runs, env, directory)
+
+        # Populate the region cache once, then point TSDB at a port nothing listens on
+        cluster = fake_servers.FakeCluster(servers=10, regions=2000)
+        hbase_ui = fake_servers.start_hbase_ui(cluster)
+        try:
+            config_path = load_test.write_config(directory, fake_servers.url_of(hbase_ui), fake_servers.url_of(hbase_ui), 64, 30)
+            subprocess.check_output(cli + ['-c', config_path, '--range', '--metric-uid', '000001', 'metric.1'], env=env, cwd=directory)
+        finally:
+            hbase_ui.shutdown()
+        with open(config_path) as config_file:
+            config = config_file.read().replace(fake_servers.url_of(hbase_ui), 'http://127.0.0.1:{}'.format(load_test.free_port()))
+        with open(config_path, 'w') as config_file:
+            config_file.write(config)
+        results['cli_cached'], output = timed_runs(cli + ['-c', config_path, '--range', '--metric-uid', '000001', 'metric.1'], args.runs, env, directory)
+        results['cli_cached']['regions'] = len(output.decode('utf-8').splitlines()) - 1
+    finally:
+        shutil.rmtree(directory)
+    print(json.dumps({'runs': args.runs, 'results': results}, indent=2))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Load test for bin/server against local stand-in TSDB and HBase UI servers.
+#
+# Starts bin/server once per --workers value and hammers /region with --concurrency clients for --duration seconds,
+#   then prints throughput, latency percentiles and status codes per run as JSON. The stand-in TSDB answers every query
+#   after --tsdb-latency seconds, which is what a single-threaded server serialises on.
+#
+#   python benchmarks/load_test.py --workers 1 8 --concurrency 16 --duration 10
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+import fake_servers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_config(directory, tsdb_url, hbase_url, queue_size, request_timeout, server_options=()):
+    path = os.path.join(directory, 'config.yaml')
+    with open(path, 'w') as config_file:
+        config_file.write('\n'.join([
+            'tsdb:',
+            '  endpoint: ' + tsdb_url,
+            '  metricWidth: 3',
+            '  saltWidth: 0',
+            'hbaseMaster:',
+            '  endpoint: ' + hbase_url,
+            '  tableName: tsdb',
+            'server:',
+            '  queueSize: {}'.format(queue_size),
+            '  requestTimeout: {}'.format(request_timeout)] +
+            ['  {}: {}'.format(name, value) for name, value in server_options] + [
+            'cacheDir: ' + directory,
+            '']))
+    return path
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def start_server(config_path, workers, directory, extra_args=()):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT, REGION_FINDER_LOG=os.path.join(directory, 'rf.log'))
+    devnull = open(os.devnull, 'w')
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'bin', 'server'), '-c', config_path, '-p', str(port), '-w', str(workers)] + list(extra_args),
+                               env=env, stdout=devnull, stderr=devnull)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return process, 'http://127.0.0.1:{}'.format(port)
+        except socket.error:
+            if process.poll() is not None:
+                raise RuntimeError('bin/server exited with {}'.format(process.returncode))
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('bin/server did not start listening within 120s')
+
+def run_load(url, concurrency, duration, metrics, path='/region'):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client(n):
+        session = requests.Session()
+        i = n
+        while time.time() < stop_at:
+            started = time.time()
+            try:
+                status = session.get('{}{}?q={}&t=1h-ago'.format(url, path, metrics[i % len(metrics)]), timeout=60).status_code
+            except requests.RequestException:
+                status = 'error'
+            with lock:
+                latencies.append(time.time() - started)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    return summarize(latencies, statuses, elapsed)
+
+def summarize(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    def percentile(p):
+        if len(latencies) == 0:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 2),
+        'requests_per_second': round(statuses.get('200', 0) / elapsed, 2),
+        'latency_ms': {'p50': percentile(0.5), 'p90': percentile(0.9), 'p99': percentile(0.99), 'max': percentile(1.0)},
+        'statuses': statuses,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test bin/server against local stand-in TSDB and HBase UI servers')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8], help='server worker counts to compare')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--tsdb-latency', type=float, default=0.05, help='seconds the stand-in TSDB takes per query')
+    parser.add_argument('--servers', type=int, default=20, help='region servers in the fake cluster')
+    parser.add_argument('--regions', type=int, default=2000, help='regions in the fake cluster')
+    parser.add_argument('--tsuids', type=int, default=1000, help='series per metric')
+    parser.add_argument('--queue-size', type=int, default=64, help='server.queueSize of bin/server')
+    parser.add_argument('--request-timeout', type=float, default=30, help='server.requestTimeout of bin/server')
+    args = parser.parse_args()
+
+    cluster = fake_servers.FakeCluster(servers=args.servers, regions=args.regions, tsuids=args.tsuids)
+    hbase_ui = fake_servers.start_hbase_ui(cluster)
+    tsdb = fake_servers.start_tsdb(cluster, latency=args.tsdb_latency)
+    directory = tempfile.mkdtemp(prefix='rf-load-test-')
+    results = []
+    try:
+        config_path = write_config(directory, fake_servers.url_of(tsdb), fake_servers.url_of(hbase_ui), args.queue_size, args.request_timeout)
+        metrics = ['metric.{}'.format(i) for i in range(50)]
+        for workers in args.workers:
+            process, url = start_server(config_path, workers, directory)
+            try:
+                result = run_load(url, args.concurrency, args.duration, metrics)
+            finally:
+                process.terminate()
+                process.wait()
+            result['workers'] = workers
+            results.append(result)
+    finally:
+        hbase_ui.shutdown()
+        tsdb.shutdown()
+        shutil.rmtree(directory)
+    print(json.dumps({'concurrency': args.concurrency, 'tsdb_latency': args.tsdb_latency, 'runs': results}, indent=2))
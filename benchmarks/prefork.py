@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Compares bin/server with one process and in pre-fork mode (server.processes), on CPU-bound /region requests: every
+#   request builds and looks up the rowkeys of --tsuids series, the result cache is off, and the stand-in TSDB answers
+#   repeated queries from memory. For each run, prints throughput, latency percentiles, the proportional set size (PSS)
+#   of all the server processes together, and the requests made to the HBase UI, which only the parent process makes.
+#
+#   python benchmarks/prefork.py --processes 1 4 --tsuids 100000 --regions 100000 --duration 20
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import fake_servers
+from load_test import run_load, start_server, write_config
+
+# Processes of the tree rooted at pid
+def process_tree(pid):
+    pids = [pid]
+    for task in os.listdir('/proc/{}/task'.format(pid)):
+        try:
+            with open('/proc/{}/task/{}/children'.format(pid, task)) as children:
+                for child in children.read().split():
+                    pids.extend(process_tree(int(child)))
+        except (IOError, OSError):
+            pass
+    return pids
+
+# Sum of the proportional set size of the processes in MiB: pages shared by n processes count 1/n towards each of them
+def pss_mib(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open('/proc/{}/smaps_rollup'.format(pid)) as rollup:
+                for line in rollup:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+        except (IOError, OSError):
+            pass
+    return round(total / 1024.0, 1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare bin/server throughput and memory with one and several processes')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 4], help='server process counts to compare')
+    parser.add_argument('--workers', type=int, default=4, help='request threads of each server process')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per run')
+    parser.add_argument('--servers', type=int, default=100, help='region servers in the fake cluster')
+    parser.add_argument('--regions', type=int, default=100000, help='regions in the fake cluster')
+    parser.add_argument('--tsuids', type=int, default=100000, help='series per metric')
+    args = parser.parse_args()
+
+    cluster = fake_servers.FakeCluster(servers=args.servers, regions=args.regions, tsuids=args.tsuids)
+    hbase_ui = fake_servers.start_hbase_ui(cluster)
+    tsdb = fake_servers.start_tsdb(cluster, memoize=True)
+    directory = tempfile.mkdtemp(prefix='rf-prefork-')
+    results = []
+    try:
+        config_path = write_config(directory, fake_servers.url_of(tsdb), fake_servers.url_of(hbase_ui), 256, 120,
+                                   server_options=[('resultCacheSize', 0)])
+        metrics = ['metric.{}'.format(i) for i in range(8)]
+        for processes in args.processes:
+            # Every run scrapes the cluster from scratch
+            cache_file = os.path.join(directory, 'regionfinder_ranges.cache')
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            cluster.reset_counters()
+            process, url = start_server(config_path, args.workers, directory, ['-P', str(processes)])
+            try:
+                # Warm up every process, and the memoized TSDB responses
+                run_load(url, args.concurrency, 2, metrics)
+                result = run_load(url, args.concurrency, args.duration, metrics)
+                pids = process_tree(process.pid)
+                result['server_processes'] = len(pids)
+                result['pss_mib'] = pss_mib(pids)
+                result['hbase_ui_requests'] = cluster.ui_requests
+            finally:
+                process.terminate()
+                process.wait()
+            result['processes'] = processes
+            results.append(result)
+    finally:
+        hbase_ui.shutdown()
+        tsdb.shutdown()
+        shutil.rmtree(directory)
+    print(json.dumps({'workers': args.workers, 'concurrency': args.concurrency, 'tsuids': args.tsuids, 'runs': results}, indent=2))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Compares a full refresh of the region map from the status pages (/master-status, then /rs-status of every region
+#   server) with one from paged scans of hbase:meta through the stand-in HBase REST gateway, for clusters of a growing
+#   number of region servers. Both stand-ins add the same latency to every page they serve.
+#
+#   python benchmarks/region_source.py --servers 10 100 500 --regions-per-server 200 --latency 0.05
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import fake_servers
+from regionfinder import HBaseUIClient, HTTPTransport
+from regionfinder.region_source import MetaScanSource
+
+def refresh(cluster, url, region_source, workers):
+    directory = tempfile.mkdtemp(prefix='rf-region-source-')
+    transport = HTTPTransport(pool_size=workers)
+    try:
+        cluster.reset_counters()
+        started = time.time()
+        client = HBaseUIClient(url, 'tsdb', directory, autorefresh=False, scrape_workers=workers, transport=transport,
+                               region_source=region_source(transport) if region_source else None)
+        return {
+            'seconds': round(time.time() - started, 3),
+            'requests': cluster.ui_requests + cluster.rest_requests,
+            'regions': len(client.region_index),
+        }
+    finally:
+        transport.close()
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare region map refreshes from the status pages and from hbase:meta')
+    parser.add_argument('--servers', type=int, nargs='+', default=[10, 100, 500], help='region servers of each fake cluster')
+    parser.add_argument('--regions-per-server', type=int, default=200, help='regions of each region server')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every page the stand-ins serve')
+    parser.add_argument('--workers', type=int, default=8, help='region servers scraped concurrently')
+    parser.add_argument('--batch-size', type=int, default=5000, help='hbase:meta rows per REST request')
+    args = parser.parse_args()
+
+    results = []
+    for servers in args.servers:
+        cluster = fake_servers.FakeCluster(servers=servers, regions=servers * args.regions_per_server)
+        hbase_ui = fake_servers.start_hbase_ui(cluster, latency=args.latency)
+        hbase_rest = fake_servers.start_hbase_rest(cluster, latency=args.latency)
+        try:
+            rest_url = fake_servers.url_of(hbase_rest)
+            results.append({
+                'servers': servers,
+                'regions': len(cluster.regions),
+                'status_pages': refresh(cluster, fake_servers.url_of(hbase_ui), None, args.workers),
+                'meta_scan': refresh(cluster, fake_servers.url_of(hbase_ui),
+                                     lambda transport: MetaScanSource(rest_url, 'tsdb', transport, batch_size=args.batch_size), args.workers),
+            })
+        finally:
+            hbase_ui.shutdown()
+            hbase_rest.shutdown()
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Compares bytes rowkeys with the uppercase hexstring rowkeys used by earlier versions: memory held by the rowkeys of
+#   one metric, the time to build them from TSUIDs, and region lookup throughput over the in-memory and memory-mapped
+#   indexes. Peak memory is measured with tracemalloc, so it needs Python 3.
+#
+#   python benchmarks/rowkeys.py --tsuids 1000000 --regions 10000
+
+import argparse
+import binascii
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import fake_servers
+from regionfinder.range_cache import MappedRegionIndex, write_range_cache
+from regionfinder.region_index import RegionIndex
+from regionfinder.rowkey import KEY_MAX, KEY_MIN, LEGACY_BLANK_START, LEGACY_BLANK_STOP, to_hex
+
+TIMESTAMP = 1514764800
+
+def hex_rowkeys(tsuids, pretag_length):
+    ets = '{0:08X}'.format(TIMESTAMP)
+    return [uid[:pretag_length * 2] + ets + uid[pretag_length * 2:] for uid in tsuids]
+
+def bytes_rowkeys(tsuids, pretag_length):
+    ets = binascii.unhexlify('{0:08X}'.format(TIMESTAMP))
+    rowkeys = []
+    for tsuid in tsuids:
+        uid = binascii.unhexlify(tsuid)
+        rowkeys.append(uid[:pretag_length] + ets + uid[pretag_length:])
+    return rowkeys
+
+def build(function, tsuids, pretag_length):
+    started = time.time()
+    function(tsuids, pretag_length)
+    seconds = time.time() - started
+    # Built a second time under tracemalloc, which slows allocations down too much to time them
+    tracemalloc.start()
+    rowkeys = function(tsuids, pretag_length)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return rowkeys, {'build_seconds': round(seconds, 3), 'rowkeys_mb': round(size / 1048576.0, 1)}
+
+def throughput(index, rowkeys):
+    results = {}
+    started = time.time()
+    index.lookup_many(rowkeys)
+    results['lookup_many_per_second'] = int(len(rowkeys) / (time.time() - started))
+    started = time.time()
+    set(index.lookup(rowkey) for rowkey in rowkeys)
+    results['lookup_per_second'] = int(len(rowkeys) / (time.time() - started))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare memory and lookup throughput of bytes and hexstring rowkeys')
+    parser.add_argument('--tsuids', type=int, default=1000000, help='series of the metric')
+    parser.add_argument('--regions', type=int, default=10000, help='regions of the table')
+    args = parser.parse_args()
+
+    cluster = fake_servers.FakeCluster(servers=10, regions=args.regions, tsuids=args.tsuids, metrics=1)
+    tsuids = cluster.tsuids_of('metric.benchmark')
+    rows = [['rs{}'.format(server), name, start or KEY_MIN, stop or KEY_MAX] for server, name, start, stop in cluster.regions]
+    hex_rows = [[server, name, to_hex(start) if start else LEGACY_BLANK_START, LEGACY_BLANK_STOP if stop is KEY_MAX else to_hex(stop)]
+                for server, name, start, stop in rows]
+
+    hex_keys, hex_result = build(hex_rowkeys, tsuids, cluster.metric_width)
+    hex_result.update(throughput(RegionIndex(hex_rows), hex_keys))
+    del hex_keys
+    byte_keys, bytes_result = build(bytes_rowkeys, tsuids, cluster.metric_width)
+    bytes_result.update(throughput(RegionIndex(rows), byte_keys))
+
+    directory = tempfile.mkdtemp(prefix='rf-rowkeys-')
+    try:
+        path = os.path.join(directory, 'ranges.cache')
+        write_range_cache(path, 'tsdb', time.time(), rows)
+        mapped = MappedRegionIndex(path)
+        mapped_result = throughput(mapped, byte_keys[:100000])
+        mapped.close()
+    finally:
+        shutil.rmtree(directory)
+    print(json.dumps({'tsuids': args.tsuids, 'regions': args.regions, 'hex': hex_result, 'bytes': bytes_result,
+                      'bytes_mapped_100k': mapped_result}, indent=2))
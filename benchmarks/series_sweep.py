@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Compares two ways of counting the series of each region over a multi-hour window: building every series x hour
+#   rowkey and looking each one up, and the sorted sweep of region_index.count_series, which cuts the sorted series
+#   of every row hour at the region boundaries. Region boundaries are drawn from the rows of the window, so that
+#   regions split row hours the way they do in a table that holds the metric.
+#
+#   python benchmarks/series_sweep.py --tsuids 100000 --hours 24 --regions 2000
+
+import argparse
+import binascii
+import json
+import os
+import random
+import shutil
+import struct
+import tempfile
+import time
+import fake_servers
+from regionfinder.range_cache import MappedRegionIndex, write_range_cache
+from regionfinder.region_index import RegionIndex, count_series
+from regionfinder.rowkey import KEY_MAX, KEY_MIN
+
+FIRST_HOUR = 1514764800
+
+def row_groups_of(tsuids, pretag_length, hours):
+    groups = {}
+    for tsuid in tsuids:
+        uid = binascii.unhexlify(tsuid)
+        groups.setdefault(uid[:pretag_length], set()).add(uid[pretag_length:])
+    row_times = [struct.pack('>I', FIRST_HOUR + hour * 3600) for hour in range(hours)]
+    return [(prefix, row_times, sorted(groups[prefix])) for prefix in sorted(groups)]
+
+def region_rows(row_groups, regions, seed=42):
+    rng = random.Random(seed)
+    boundaries = set()
+    while len(boundaries) < regions - 1:
+        prefix, row_times, suffixes = rng.choice(row_groups)
+        boundaries.add(prefix + rng.choice(row_times) + rng.choice(suffixes))
+    boundaries = [KEY_MIN] + sorted(boundaries) + [KEY_MAX]
+    return [['rs{}'.format(i % 10), 'tsdb,{}'.format(i), boundaries[i], boundaries[i + 1]] for i in range(regions)]
+
+# Every rowkey is built and looked up, and the series of each region are collected in sets
+def count_per_rowkey(index, row_groups):
+    series = {}
+    for prefix, row_times, suffixes in row_groups:
+        for row_time in row_times:
+            row_prefix = prefix + row_time
+            for suffix in suffixes:
+                series.setdefault(index.lookup(row_prefix + suffix), set()).add(prefix + suffix)
+    return dict((rs_info, len(members)) for rs_info, members in series.items())
+
+def timed(function, *args):
+    started = time.time()
+    result = function(*args)
+    return result, round(time.time() - started, 3)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare per-rowkey lookups with the sorted sweep of count_series')
+    parser.add_argument('--tsuids', type=int, default=100000, help='series of the metric')
+    parser.add_argument('--hours', type=int, default=24, help='row hours of the window')
+    parser.add_argument('--regions', type=int, default=2000, help='regions of the table')
+    args = parser.parse_args()
+
+    cluster = fake_servers.FakeCluster(servers=10, regions=2, tsuids=args.tsuids, metrics=1)
+    row_groups = row_groups_of(cluster.tsuids_of('metric.benchmark'), cluster.metric_width, args.hours)
+    rows = region_rows(row_groups, args.regions)
+    index = RegionIndex(rows)
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'range.cache')
+        write_range_cache(path, 'tsdb', 0, rows)
+        mapped = MappedRegionIndex(path)
+        expected, per_rowkey = timed(count_per_rowkey, index, row_groups)
+        swept, sweep = timed(count_series, index, row_groups)
+        mapped_swept, mapped_sweep = timed(count_series, mapped, row_groups)
+        mapped.close()
+    finally:
+        shutil.rmtree(directory)
+    assert swept == expected and mapped_swept == expected
+    print(json.dumps({
+        'rowkeys': args.tsuids * args.hours,
+        'regions_with_series': len(expected),
+        'per_rowkey_seconds': per_rowkey,
+        'sweep_seconds': sweep,
+        'mapped_sweep_seconds': mapped_sweep,
+    }, indent=2))
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Benchmark suite of the phases that grow with the size of the cluster, run against local stand-in HBase UI and TSDB
+#   servers:
+#   - refresh: HBaseUIClient._create_rs_range_list over /master-status and every /rs-status, for the 3 column
+#     (older HBase) and 4 column (ReplicaID) region tables
+#   - load_cache: HBaseUIClient._load_ranges_from_file of the cache the refresh flushed
+#   - lookup: HBaseUIClient.get_rs_of_rowkey over rowkeys built from the series of the cluster, with the index built
+#     by a refresh and the one opened from the cache file
+#   - region: end-to-end /region requests to bin/server, first for distinct metrics (result cache misses), then the
+#     same ones again (hits)
+#
+# Durations are the best of --repeat runs. Results are printed as JSON, and written to --output. With --baseline, the
+#   ratio of every result to the one of an earlier run is printed too, eg. to compare two versions:
+#
+#   python benchmarks/suite.py --servers 500 --regions 100000 --tsuids 1000000 --output before.json
+#   python benchmarks/suite.py --servers 500 --regions 100000 --tsuids 1000000 --baseline before.json
+
+import argparse
+import binascii
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import requests
+import fake_servers
+import load_test
+from regionfinder import HBaseUIClient
+
+def best_of(repeat, function, *args):
+    durations = []
+    for _ in range(repeat):
+        started = time.time()
+        function(*args)
+        durations.append(time.time() - started)
+    return round(min(durations), 6)
+
+def rowkeys_of(cluster, count):
+    rowkeys = []
+    timestamp = binascii.unhexlify('5A497A00')
+    pretag_length = cluster.salt_width + cluster.metric_width
+    metric = 0
+    while len(rowkeys) < count:
+        for tsuid in cluster.tsuids_of('metric.{}'.format(metric))[:count - len(rowkeys)]:
+            uid = binascii.unhexlify(tsuid)
+            rowkeys.append(uid[:pretag_length] + timestamp + uid[pretag_length:])
+        metric += 1
+    return rowkeys
+
+def lookups_per_second(client, rowkeys):
+    started = time.time()
+    for rowkey in rowkeys:
+        client.get_rs_of_rowkey(rowkey)
+    return int(len(rowkeys) / (time.time() - started))
+
+def bench_cluster(cluster, columns, rowkeys, repeat, directory):
+    hbase_ui = fake_servers.start_hbase_ui(cluster, columns)
+    try:
+        client = HBaseUIClient(fake_servers.url_of(hbase_ui), 'tsdb', directory, autorefresh=False)
+        results = {'refresh_seconds': best_of(repeat, client._create_rs_range_list)}
+        results['lookup_in_memory_per_second'] = lookups_per_second(client, rowkeys)
+        client._flush_ranges_to_file()
+        results['cache_mb'] = round(os.path.getsize(client.cache_file) / 1048576.0, 2)
+        results['load_cache_seconds'] = best_of(repeat, client._load_ranges_from_file)
+        results['lookup_mapped_per_second'] = lookups_per_second(client, rowkeys)
+        client.transport.close()
+    finally:
+        hbase_ui.shutdown()
+    return results
+
+def bench_region(cluster, requests_count, directory):
+    hbase_ui = fake_servers.start_hbase_ui(cluster)
+    tsdb = fake_servers.start_tsdb(cluster)
+    try:
+        config_path = load_test.write_config(directory, fake_servers.url_of(tsdb), fake_servers.url_of(hbase_ui), 64, 300)
+        process, url = load_test.start_server(config_path, 1, directory)
+        try:
+            session = requests.Session()
+            results = {}
+            for phase in ('miss', 'hit'):
+                latencies = []
+                statuses = {}
+                started = time.time()
+                for i in range(requests_count):
+                    request_started = time.time()
+                    status = str(session.get('{}/region?q=metric.{}&t=1h-ago'.format(url, i), timeout=300).status_code)
+                    latencies.append(time.time() - request_started)
+                    statuses[status] = statuses.get(status, 0) + 1
+                summary = load_test.summarize(latencies, statuses, time.time() - started)
+                results[phase] = {'latency_ms': summary['latency_ms'], 'statuses': summary['statuses']}
+        finally:
+            process.terminate()
+            process.wait()
+    finally:
+        hbase_ui.shutdown()
+        tsdb.shutdown()
+    return results
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=load_test.ROOT,
+                                       stderr=open(os.devnull, 'w')).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# {"a": {"b": 1}} -> {"a.b": 1}, for the numbers of a result
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, prefix + key + '.'))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix[:-1]: value}
+    return {}
+
+def compare(baseline, current):
+    baseline = flatten(baseline['results'])
+    comparison = {}
+    for key, value in sorted(flatten(current['results']).items()):
+        if baseline.get(key):
+            comparison[key] = {'baseline': baseline[key], 'current': value, 'ratio': round(value / float(baseline[key]), 3)}
+    return comparison
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time refresh, cache load, lookups and /region against a generated cluster')
+    parser.add_argument('--servers', type=int, default=500, help='region servers in the fake cluster')
+    parser.add_argument('--regions', type=int, default=100000, help='regions in the fake cluster')
+    parser.add_argument('--tsuids', type=int, default=1000000, help='rowkeys to look up, built from the series of the cluster')
+    parser.add_argument('--columns', type=int, nargs='+', choices=[3, 4], default=[3, 4], help='region table layouts of /rs-status')
+    parser.add_argument('--requests', type=int, default=100, help='/region requests per phase, 0 to skip them')
+    parser.add_argument('--request-tsuids', type=int, default=10000, help='series the stand-in TSDB returns per /region request')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each timed phase')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    cluster = fake_servers.FakeCluster(servers=args.servers, regions=args.regions, tsuids=min(args.tsuids, 100000))
+    rowkeys = rowkeys_of(cluster, args.tsuids)
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'params': {'servers': args.servers, 'regions': args.regions, 'tsuids': args.tsuids, 'requests': args.requests,
+                   'request_tsuids': args.request_tsuids, 'repeat': args.repeat},
+        'results': {},
+    }
+    directory = tempfile.mkdtemp(prefix='rf-suite-')
+    try:
+        for columns in args.columns:
+            report['results']['columns_{}'.format(columns)] = bench_cluster(cluster, columns, rowkeys, args.repeat, directory)
+            os.remove(os.path.join(directory, HBaseUIClient.CACHE_FILENAME))
+        del rowkeys
+        if args.requests > 0:
+            # Series per metric of the stand-in TSDB, which the lookups above did not need to be served over HTTP
+            cluster.tsuid_count = args.request_tsuids
+            report['results']['region'] = bench_region(cluster, args.requests, directory)
+    finally:
+        shutil.rmtree(directory)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            report['comparison'] = compare(json.load(baseline_file), report)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    print(json.dumps(report, indent=2))
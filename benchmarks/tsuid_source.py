@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+# Compares the TSUID sources of TSDBClient against the local stand-in TSDB: how many datapoints TSDB has to read,
+#   how many bytes it sends back, and how long get_rowkeys_of takes, for a few query windows.
+#
+#   python benchmarks/tsuid_source.py --tsuids 20000 --times 1h-ago 6h-ago 24h-ago
+
+import argparse
+import json
+import time
+import fake_servers
+from regionfinder import TSDBClient
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare TSDB load of the TSUID sources of TSDBClient')
+    parser.add_argument('--tsuids', type=int, default=20000, help='series per metric')
+    parser.add_argument('--times', nargs='+', default=['1h-ago', '6h-ago', '24h-ago'], help='query start times')
+    parser.add_argument('--points-per-hour', type=int, default=360, help='datapoints per series per hour')
+    args = parser.parse_args()
+
+    cluster = fake_servers.FakeCluster(servers=1, regions=10, tsuids=args.tsuids)
+    tsdb = fake_servers.start_tsdb(cluster, points_per_hour=args.points_per_hour)
+    results = []
+    try:
+        for start_time in args.times:
+            for source in TSDBClient.TSUID_SOURCES:
+                client = TSDBClient(fake_servers.url_of(tsdb), 3, 0, tsuid_source=source)
+                cluster.reset_counters()
+                started = time.time()
+                rowkeys = client.get_rowkeys_of('metric.benchmark', start_time)
+                results.append({
+                    'source': source,
+                    'start': start_time,
+                    'rowkeys': len(rowkeys),
+                    'seconds': round(time.time() - started, 3),
+                    'tsdb_datapoints_read': cluster.tsdb_datapoints_read,
+                    'tsdb_bytes_sent': cluster.tsdb_bytes_sent,
+                })
+    finally:
+        tsdb.shutdown()
+    print(json.dumps(results, indent=2))
@@ -6,7 +6,30 @@
 
 '''
 
-from regionfinder.config import Config
-from regionfinder.tsdb_client import TSDBClient
-from regionfinder.hbase_ui_client import HBaseUIClient
-from regionfinder.error import RegionFinderError
+import sys
+
+# Public names and the modules they live in. On Python 3.7+ each module is only imported when its name is first used,
+#   so that eg. importing regionfinder.range_cache does not load the config and HTTP modules
+_EXPORTS = {
+    'Config': 'regionfinder.config',
+    'TSDBClient': 'regionfinder.tsdb_client',
+    'HBaseUIClient': 'regionfinder.hbase_ui_client',
+    'RegionFinderError': 'regionfinder.error',
+    'HTTPTransport': 'regionfinder.transport',
+}
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError("module 'regionfinder' has no attribute '{}'".format(name))
+    import importlib
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+if sys.version_info < (3, 7):
+    from regionfinder.config import Config
+    from regionfinder.tsdb_client import TSDBClient
+    from regionfinder.hbase_ui_client import HBaseUIClient
+    from regionfinder.error import RegionFinderError
+    from regionfinder.transport import HTTPTransport
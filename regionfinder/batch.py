@@ -0,0 +1,86 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import csv
+import json
+from regionfinder import error
+
+CSV_HEADER = ['metric', 'regionServer', 'regionName']
+
+# Expressions of a batch file, one per line. Blank lines and lines starting with # are skipped
+def read_expressions(lines):
+    expressions = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            expressions.append(line)
+    return expressions
+
+def resolve_expressions(tsdb_client, hbase_ui_client, expressions, start_time='1h-ago', batch_size=20, concurrency=8):
+    '''
+    Yields (expression, rs_infos, err) for every expression, in the given order, as soon as its batch is resolved.
+
+    Expressions are sent to TSDB in batches of batch_size sub-queries, concurrency batches at a time. All rowkeys
+    are looked up in the region index hbase_ui_client already holds. rs_infos is the sorted list of distinct
+    (server, region) pairs, or None when the expression failed with err.
+    '''
+    batch_size = max(1, batch_size)
+    batches = [expressions[i:i + batch_size] for i in range(0, len(expressions), batch_size)]
+
+    def query(batch):
+        try:
+            return tsdb_client.get_rowkeys_of_many(batch, start_time)
+        except Exception as err:
+            return [err] * len(batch)
+
+    # Imported here, as bin/cli imports this module for every run
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max(1, min(concurrency, len(batches))))
+    try:
+        for batch, results in zip(batches, pool.imap(query, batches)):
+            for expression, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    yield expression, None, result
+                    continue
+                try:
+                    yield expression, sorted(hbase_ui_client.get_regions_of_rowkeys(result)), None
+                except error.RegionFinderError as err:
+                    yield expression, None, err
+    finally:
+        pool.terminate()
+
+# Writers of resolve_expressions results, which return the number of failed expressions.
+# CSV has one metric,regionServer,regionName row per region and reports failures on err_out.
+#   NDJSON has one object per region, and one object with an "error" field per failed expression
+def write_csv(results, out, err_out):
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(CSV_HEADER)
+    failures = 0
+    for expression, rs_infos, err in results:
+        if err is not None:
+            failures += 1
+            err_out.write('{}: {}\n'.format(expression, err))
+            continue
+        for server, region in rs_infos:
+            writer.writerow([expression, server, region])
+        out.flush()
+    return failures
+
+def write_ndjson(results, out, err_out):
+    failures = 0
+    for expression, rs_infos, err in results:
+        if err is not None:
+            failures += 1
+            out.write(json.dumps({'metric': expression, 'error': str(err)}) + '\n')
+            continue
+        for server, region in rs_infos:
+            out.write(json.dumps({'metric': expression, 'regionServer': server, 'regionName': region}) + '\n')
+        out.flush()
+    return failures
+
+WRITERS = {'csv': write_csv, 'ndjson': write_ndjson}
@@ -18,9 +18,37 @@ tsdb:
   endpoint: http://localhost:4466
   metricWidth: 3
   saltWidth: 0
+  saltBuckets: 20 # optional, tsd.storage.salt.buckets of TSDB, used when saltWidth is not 0
+  tsuidSource: query # optional, query or hour. hour asks TSDB for a single row hour collapsed into one datapoint (OpenTSDB 2.2+)
 hbaseMaster:
   endpoint: http://localhost:60010
   tableName: tsdb
+  scrapeWorkers: 8 # optional, number of region servers scraped concurrently during a refresh
+  connectTimeout: 5 # optional, seconds, http.connectTimeout by default
+  readTimeout: 60 # optional, seconds, http.readTimeout by default
+  scrapeRetries: 2 # optional, retries per region server before it is reported as failed. http.retries does not apply to /rs-status on top of it
+  refreshMode: full # optional, full or incremental. incremental only rescrapes region servers whose /master-status row changed
+  refreshSeconds: 43200 # optional, seconds between refreshes. A full refresh still happens at least every 12 hours
+  maxStaleSeconds: 604800 # optional, how long after it expires bin/server still starts from a cache file, refreshing it in the background
+  missRescrapeSeconds: 60 # optional, a rowkey with no region rescrapes the region servers around it at most this often, 0 disables it
+  restEndpoint: # optional, eg. http://localhost:8080, an HBase REST gateway to read the regions from hbase:meta with instead of scraping every /rs-status page
+  metaBatchSize: 5000 # optional, hbase:meta rows read per REST request
+  infoPort: # optional, eg. 16030, hbase.regionserver.info.port of the region servers read from hbase:meta. Their RPC port + 10 by default
+http: # optional, connection pooling and retry policy shared by all TSDB and HBase UI requests
+  poolSize: 10 # connections kept alive per host
+  hostPools: 512 # hosts kept in the connection pool at once, should cover every region server
+  connectTimeout: 5 # seconds
+  readTimeout: 60 # seconds
+  retries: 2 # for connection errors and 502/503/504 responses
+  backoffFactor: 0.5 # seconds, doubled on every retry
+server: # optional, only used by bin/server
+  workers: 8 # requests handled concurrently, by each server process
+  processes: 1 # server processes sharing the port and one region map, refreshed by the parent process
+  queueSize: 64 # requests waiting for a worker, further requests get a 503
+  requestTimeout: 30 # seconds a request may wait for a worker, and a worker may wait on a client socket
+  resultCacheSize: 1024 # /region results kept in memory, 0 disables the cache
+  resultCacheTtl: 60 # seconds a cached /region result is served for
+  timingHeader: false # adds a Server-Timing header with the time spent in each phase to every response
 cacheDir: # optional, defaults to same dir as default config path
 """
 class Config:
@@ -45,7 +73,7 @@ class Config:
 
         self._filepath = filepath
         with open(filepath, 'r') as file:
-            self._params = yaml.load(file)
+            self._params = yaml.safe_load(file)
             try:
                 self._assertKeyIsPresent('tsdb')
                 self._assertKeyIsPresent('tsdb', 'endpoint')
@@ -61,14 +89,56 @@ class Config:
             self.tsdb_url = self._params['tsdb']['endpoint']
             self.tsdb_metric_width = int(self._params['tsdb']['metricWidth'])
             self.tsdb_salt_width = int(self._params['tsdb']['saltWidth'])
+            self.tsdb_salt_buckets = int(self._optional('tsdb', 'saltBuckets', default=20))
+            self.tsdb_tsuid_source = self._optional('tsdb', 'tsuidSource', default='query')
             self.hbase_url = self._params['hbaseMaster']['endpoint']
             self.hbase_table_name = self._params['hbaseMaster']['tableName']
+            self.hbase_scrape_workers = int(self._optional('hbaseMaster', 'scrapeWorkers', default=8))
+            self.hbase_scrape_retries = int(self._optional('hbaseMaster', 'scrapeRetries', default=2))
+            self.hbase_refresh_mode = self._optional('hbaseMaster', 'refreshMode', default='full')
+            self.hbase_refresh_seconds = int(self._optional('hbaseMaster', 'refreshSeconds', default=60*60*12))
+            self.hbase_max_stale_seconds = int(self._optional('hbaseMaster', 'maxStaleSeconds', default=60*60*24*7))
+            self.hbase_miss_rescrape_seconds = float(self._optional('hbaseMaster', 'missRescrapeSeconds', default=60))
+            self.hbase_rest_url = self._optional('hbaseMaster', 'restEndpoint')
+            self.hbase_meta_batch_size = int(self._optional('hbaseMaster', 'metaBatchSize', default=5000))
+            info_port = self._optional('hbaseMaster', 'infoPort')
+            self.hbase_info_port = int(info_port) if info_port else None
+            if self.tsdb_tsuid_source not in ('query', 'hour'):
+                logger.error('tsdb.tsuidSource must be either query or hour, got {}\nin file {}'.format(self.tsdb_tsuid_source, self._filepath))
+                sys.exit(1)
+            if self.hbase_refresh_mode not in ('full', 'incremental'):
+                logger.error('hbaseMaster.refreshMode must be either full or incremental, got {}\nin file {}'.format(self.hbase_refresh_mode, self._filepath))
+                sys.exit(1)
+            self.http_pool_size = int(self._optional('http', 'poolSize', default=10))
+            self.http_host_pools = int(self._optional('http', 'hostPools', default=512))
+            self.http_connect_timeout = float(self._optional('http', 'connectTimeout', default=5))
+            self.http_read_timeout = float(self._optional('http', 'readTimeout', default=60))
+            self.http_retries = int(self._optional('http', 'retries', default=2))
+            self.http_backoff_factor = float(self._optional('http', 'backoffFactor', default=0.5))
+            # The HBase UI and REST timeouts are those of every other request unless set
+            self.hbase_connect_timeout = float(self._optional('hbaseMaster', 'connectTimeout', default=self.http_connect_timeout))
+            self.hbase_read_timeout = float(self._optional('hbaseMaster', 'readTimeout', default=self.http_read_timeout))
+            self.server_workers = int(self._optional('server', 'workers', default=8))
+            self.server_processes = int(self._optional('server', 'processes', default=1))
+            self.server_queue_size = int(self._optional('server', 'queueSize', default=64))
+            self.server_request_timeout = float(self._optional('server', 'requestTimeout', default=30))
+            self.server_result_cache_size = int(self._optional('server', 'resultCacheSize', default=1024))
+            self.server_result_cache_ttl = float(self._optional('server', 'resultCacheTtl', default=60))
+            self.server_timing_header = bool(self._optional('server', 'timingHeader', default=False))
             if self._params.get('cacheDir') is None or len(self._params['cacheDir'].strip()) == 0:
                 self.cache_dir = os.path.dirname(filepath)
             else:
                 self.cache_dir = self._params['cacheDir']
             logger.info('Using {} as the cache directory'.format(self.cache_dir))
 
+    def _optional(self, *keys, **kwargs):
+        root = self._params
+        for key in keys:
+            if not isinstance(root, dict) or root.get(key) is None:
+                return kwargs.get('default')
+            root = root[key]
+        return root
+
     def _assertKeyIsPresent(self, *keys):
         root = self._params
         for key in keys:
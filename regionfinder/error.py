@@ -8,3 +8,9 @@
 
 class RegionFinderError(Exception):
     pass
+
+# No region of the map contains rowkey, eg. because the region was split or moved since the map was scraped
+class RegionNotFoundError(RegionFinderError):
+    def __init__(self, message, rowkey):
+        super(RegionNotFoundError, self).__init__(message)
+        self.rowkey = rowkey
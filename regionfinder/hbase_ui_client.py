@@ -6,183 +6,546 @@
 
 '''
 
-from bs4 import BeautifulSoup
-import requests
 import os.path
 import csv
 import time
-from threading import Timer
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import islice
+from threading import Lock, Timer
 try:
     from urllib.parse import urlparse
 except ImportError:
     from urlparse import urlparse
-from regionfinder import error
-from regionfinder.util import logger, open_csv_r, open_csv_w
+from regionfinder import error, metrics
+from regionfinder.range_cache import MappedRegionIndex, write_range_cache
+from regionfinder.region_index import RegionIndex, count_series
+from regionfinder.region_source import StatusPageSource
+from regionfinder.rowkey import KEY_MAX, KEY_MIN, from_legacy_hex, to_hex
+from regionfinder.transport import HTTPTransport, iter_text
+from regionfinder.util import logger, open_csv_r
+# The status page parser (and html.parser with it) and the scrape thread pool are imported by the methods that scrape,
+#   so that runs answered from the region cache do not load them
 
-class HBaseUIClient:
-    CACHE_FILENAME = 'regionfinder_ranges.cache.csv'
+class RegionMap(object):
+    '''
+    One published version of the region map: the lookup index, and the generation and scrape time that go with it.
+
+    HBaseUIClient builds every new map off to the side and publishes it by replacing its region_map in a single
+    assignment, so a reader that takes region_map once never mixes the index of one refresh with the generation or
+    rows of another, and never sees a map that is only partly built.
+    '''
+    def __init__(self, index, generation, last_updated, previous=None):
+        self.index = index
+        self.generation = generation
+        self.last_updated = last_updated
+        # The index this map replaced, to find where a region was before a refresh lost track of it
+        self.previous = previous if previous is not None else index
+        self._rs_ranges = None
+
+    # When the index was opened straight from the cache file, the rows are only materialised if something asks for them
+    @property
+    def rs_ranges(self):
+        if self._rs_ranges is None:
+            self._rs_ranges = self.index.to_rs_ranges()
+        return self._rs_ranges
+
+class HBaseUIClient(object):
+    CACHE_FILENAME = 'regionfinder_ranges.cache'
+    # Caches written by older versions are still read once, and migrated to CACHE_FILENAME
+    LEGACY_CACHE_FILENAME = 'regionfinder_ranges.cache.csv'
     EXPIRY_SECONDS = 60*60*12
+    # How long past EXPIRY_SECONDS a cache file is still served by a long-running process, while it is refreshed
+    MAX_STALE_SECONDS = 60*60*24*7
+    # A lookup miss rescrapes the region servers around the missing key at most this often
+    MISS_RESCRAPE_SECONDS = 60
+    # Rowkeys looked up at a time by get_regions_of_rowkeys
+    LOOKUP_BATCH_SIZE = 4096
+    RETRY_BACKOFF_SECONDS = 0.5
 
-    def __init__(self, instance_url, table_name, cache_dir='.', autorefresh=True):
+    def __init__(self, instance_url, table_name, cache_dir='.', autorefresh=True,
+                 scrape_workers=8, connect_timeout=None, read_timeout=None, scrape_retries=2, transport=None,
+                 incremental_refresh=False, refresh_seconds=None, max_stale_seconds=None, miss_rescrape_seconds=None,
+                 region_source=None, read_only=False):
         self.master_url = instance_url
         self.table_name = table_name
         self.cache_file = cache_dir + '/' + self.CACHE_FILENAME
-        self.rs_ranges = []
+        self.legacy_cache_file = cache_dir + '/' + self.LEGACY_CACHE_FILENAME
+        self.scrape_workers = max(1, scrape_workers)
+        self.scrape_retries = max(0, scrape_retries)
+        self.transport = transport if transport is not None else HTTPTransport(pool_size=self.scrape_workers)
+        # Timeouts of the status pages, those of the transport unless given
+        self.timeout = (self.transport.timeout[0] if connect_timeout is None else connect_timeout,
+                        self.transport.timeout[1] if read_timeout is None else read_timeout)
+        # Sources of the region map, in order of preference (see regionfinder.region_source). Scraping the status pages
+        #   is always the last resort
+        self.region_sources = ([region_source] if region_source is not None else []) + [StatusPageSource(self)]
+        # With incremental refresh, every refresh_seconds only the changed region servers are rescraped,
+        #   and a full refresh still happens every EXPIRY_SECONDS
+        self.incremental_refresh = incremental_refresh
+        self.refresh_seconds = refresh_seconds or self.EXPIRY_SECONDS
+        # How long past its expiry a cache file is still loaded, to be served while it is refreshed. Only long-running
+        #   processes refresh in the background, so by default only autorefreshing clients serve stale maps
+        if max_stale_seconds is None:
+            max_stale_seconds = self.MAX_STALE_SECONDS if autorefresh else 0
+        self.max_stale_seconds = max_stale_seconds
+        # A read-only client never scrapes. It serves the cache file another process keeps refreshing, whatever its age,
+        #   and reload_if_changed picks up every new version of it
+        self.read_only = read_only
+        # 0 disables the rescrape of lookup misses
+        self.miss_rescrape_seconds = self.MISS_RESCRAPE_SECONDS if miss_rescrape_seconds is None else miss_rescrape_seconds
+        if read_only:
+            self.miss_rescrape_seconds = 0
+        self.last_miss_rescrape = 0
+        # Region servers that could not be scraped during the last refresh
+        self.failed_region_servers = []
+        # /master-status fingerprint of each region server at the time its regions were last scraped
+        self.rs_fingerprints = {}
+        self.last_full_refresh = 0
+        # Refreshes (and rescrapes of lookup misses) run one at a time, each one publishing a new region_map when done
+        self._refresh_lock = Lock()
+        self._publish_lock = Lock()
+        self.region_map = RegionMap(RegionIndex([]), 0, 0)
+        self.active_timer = None
         # Load region servers from file if files exist
-        if self._load_ranges_from_file() is None:
+        if read_only:
+            if self._load_ranges_from_file(float('inf')) is None:
+                raise error.RegionFinderError('No region cache file at {} to serve'.format(self.cache_file))
+        elif self._load_ranges_from_file(self.EXPIRY_SECONDS + self.max_stale_seconds) is None:
             logger.info('Previous region start/stop key cache file not found, or has expired')
             logger.info('Populating region server info now...')
             self._create_rs_range_list()
+        elif self.is_stale():
+            logger.info('Previous region start/stop key cache file found. It has expired, and is served until it is refreshed')
         else:
             logger.info('Previous region start/stop key cache file found.')
-        # Start recurring cache-refresh / file-flush task for long-running processes
-        if autorefresh:
-            self.active_timer = Timer(self.EXPIRY_SECONDS, self._recurring_flush)
-            self.active_timer.start()
+        if autorefresh and not read_only:
+            self.start_autorefresh()
+
+    # Starts the recurring cache-refresh / file-flush task of long-running processes. The first refresh is due when the
+    #   current map is refresh_seconds old, which is straight away for an expired one
+    def start_autorefresh(self):
+        self.active_timer = Timer(max(0, self.last_updated + self.refresh_seconds - time.time()), self._recurring_flush)
+        self.active_timer.start()
+
+    # Reopens the cache file if another process replaced it since it was loaded. The file is always replaced by a
+    #   rename, so a new version shows as a new inode. Returns whether a new region map was published
+    def reload_if_changed(self):
+        try:
+            stat = os.stat(self.cache_file)
+        except OSError:
+            return False
+        if (stat.st_ino, stat.st_mtime, stat.st_size) == getattr(self.region_index, 'identity', None):
+            return False
+        with self._refresh_lock:
+            if (stat.st_ino, stat.st_mtime, stat.st_size) == getattr(self.region_index, 'identity', None):
+                return False
+            return self._load_ranges_from_file(float('inf')) is not None
+
+    @property
+    def region_index(self):
+        return self.region_map.index
+
+    # Incremented every time the region map is replaced, so that callers can tell whether derived results are stale
+    @property
+    def generation(self):
+        return self.region_map.generation
+
+    # Epoch time the current region map was scraped at, 0 until there is one
+    @property
+    def last_updated(self):
+        return self.region_map.last_updated
+
+    @property
+    def rs_ranges(self):
+        return self.region_map.rs_ranges
+
+    # Assigning rows publishes them as a new region map, scraped now
+    @rs_ranges.setter
+    def rs_ranges(self, rs_ranges):
+        self._publish(RegionIndex(rs_ranges), time.time())
+
+    def is_stale(self):
+        return time.time() - self.last_updated > self.EXPIRY_SECONDS
+
+    def _publish(self, index, last_updated):
+        with self._publish_lock:
+            current = self.region_map
+            self.region_map = RegionMap(index, current.generation + 1, last_updated, current.index)
+        return index
 
+    # Same as _lookup, spelled out since this is called once per rowkey
     def get_rs_of_rowkey(self, rowkey):
-        for server, region, start, stop in self.rs_ranges:
-            if rowkey < stop and start < rowkey:
-                return (server, region)
-        raise error.RegionFinderError('Could not find a region whose start/end key range contains the rowkey')
+        region_map = self.region_map
+        try:
+            return region_map.index.lookup(rowkey)
+        except error.RegionNotFoundError as err:
+            if not self._rescrape_on_miss(region_map, err.rowkey):
+                raise
+        return self.region_map.index.lookup(rowkey)
 
-    def _load_ranges_from_file(self):
+    # Returns the (server, region) of each rowkey, in the same order as the given rowkeys
+    def get_rs_of_rowkeys(self, rowkeys):
+        rowkeys = list(rowkeys)
+        return self._lookup(lambda index: index.lookup_many(rowkeys))
+
+    # Runs function on the current region index. If a rowkey is in none of its regions, the region servers around it
+    #   are rescraped (see _rescrape_on_miss) and function is run once more on the new index
+    def _lookup(self, function):
+        region_map = self.region_map
+        try:
+            return function(region_map.index)
+        except error.RegionNotFoundError as err:
+            if not self._rescrape_on_miss(region_map, err.rowkey):
+                raise
+        return function(self.region_map.index)
+
+    # Returns the set of distinct (server, region) pairs of the rowkeys
+    def get_regions_of_rowkeys(self, rowkeys):
+        regions = set()
+        for new_regions in self.iter_regions_of_rowkeys(rowkeys):
+            regions.update(new_regions)
+        return regions
+
+    # Yields, for every batch of LOOKUP_BATCH_SIZE rowkeys, the list of (server, region) pairs none of the previous
+    #   batches were in. Rowkeys are looked up as they arrive, so they can come straight from a generator without ever
+    #   being held in memory together. Producing a batch is timed as the rowkeys phase and looking it up as the lookup phase
+    def iter_regions_of_rowkeys(self, rowkeys):
+        rowkeys = iter(rowkeys)
+        regions = set()
+        while True:
+            with metrics.phase('rowkeys'):
+                batch = list(islice(rowkeys, self.LOOKUP_BATCH_SIZE))
+            if len(batch) == 0:
+                return
+            with metrics.phase('lookup'):
+                new_regions = set(self._lookup(lambda index: self._lookup_batch(index, batch))) - regions
+            if len(new_regions) > 0:
+                regions.update(new_regions)
+                yield list(new_regions)
+
+    # Bisecting a list in memory is cheap enough to look rowkeys up one by one, while the records of a mapped index are
+    #   decoded as they are read, so those are swept in key order to decode each region once
+    def _lookup_batch(self, index, rowkeys):
+        if isinstance(index, MappedRegionIndex):
+            return index.lookup_many(rowkeys)
+        return [index.lookup(rowkey) for rowkey in rowkeys]
+
+    # Returns the set of distinct (server, region) pairs of the regions that overlap any of the [start, stop) key spans
+    def get_regions_of_spans(self, spans):
+        region_index = self.region_index
+        regions = set()
+        with metrics.phase('lookup'):
+            for start, stop in spans:
+                regions.update(region_index.lookup_span(start, stop))
+        return regions
+
+    # Returns a {(server, region): series count} dict for row groups of TSDBClient.get_row_groups_of
+    def get_series_counts(self, row_groups):
+        row_groups = list(row_groups)
+        with metrics.phase('lookup'):
+            return self._lookup(lambda index: count_series(index, row_groups))
+
+    # Returns the index of the cache file, or None if there is no usable one no older than max_age seconds
+    def _load_ranges_from_file(self, max_age=None):
+        max_age = self.EXPIRY_SECONDS if max_age is None else max_age
         if not os.path.isfile(self.cache_file):
+            return self._load_ranges_from_legacy_file(max_age)
+
+        try:
+            region_index = MappedRegionIndex(self.cache_file)
+        except error.RegionFinderError as err:
+            logger.warning(str(err))
+            return None
+        if int(time.time()) - region_index.last_updated > max_age or region_index.table_name != self.table_name:
+            return None
+        # Handle empty cache file
+        if len(region_index) == 0:
             return None
+        return self._publish(region_index, region_index.last_updated)
 
-        with open_csv_r(self.cache_file) as csvfile:
+    def _load_ranges_from_legacy_file(self, max_age):
+        if not os.path.isfile(self.legacy_cache_file):
+            return None
+
+        with open_csv_r(self.legacy_cache_file) as csvfile:
             last_updated = int(csvfile.readline())
-            if int(time.time()) - last_updated > self.EXPIRY_SECONDS:
+            if int(time.time()) - last_updated > max_age:
                 return None
             reader = csv.reader(csvfile)
-            self.rs_ranges = []
+            rs_ranges = []
             for row in reader:
-                self.rs_ranges.append([row[0], row[1], row[2], row[3]])
+                rs_ranges.append([row[0], row[1], from_legacy_hex(row[2]), from_legacy_hex(row[3])])
             # Handle empty cache file
-            if len(self.rs_ranges) == 0:
+            if len(rs_ranges) == 0:
                 return None
-        return self.rs_ranges
+        region_index = self._publish(RegionIndex(rs_ranges), last_updated)
+        logger.info('Migrating {} to {}'.format(self.legacy_cache_file, self.cache_file))
+        write_range_cache(self.cache_file, self.table_name, last_updated, region_index.rows)
+        return region_index
 
     def _recurring_flush(self):
-        self._create_rs_range_list()
-        self.active_timer = Timer(self.EXPIRY_SECONDS, self._recurring_flush)
+        try:
+            if self.incremental_refresh and time.time() - self.last_full_refresh < self.EXPIRY_SECONDS:
+                self._update_rs_range_list()
+            else:
+                self._create_rs_range_list()
+        except Exception as err:
+            # Keep serving the current ranges, and try again on the next run
+            logger.error('Region refresh failed: {}'.format(err))
+            metrics.record_refresh('failure')
+        self.active_timer = Timer(self.refresh_seconds, self._recurring_flush)
         self.active_timer.start()
 
     def _flush_ranges_to_file(self):
-        with open_csv_w(self.cache_file) as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([int(time.time())])
-            writer.writerows(self.rs_ranges)
-            logger.info('Finished flush to {}'.format(self.cache_file))
+        region_map = self.region_map
+        write_range_cache(self.cache_file, self.table_name, region_map.last_updated, region_map.rs_ranges)
+        logger.info('Finished flush to {}'.format(self.cache_file))
 
     def _get_region_servers(self):
-        resp = requests.get(self.master_url + '/master-status')
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        rows = soup.select('div#tab_baseStats table tr')
+        return list(self._get_region_server_fingerprints())
+
+    # Returns the first region source that can list the region servers, and the OrderedDict of region server ->
+    #   fingerprint it listed
+    def _list_region_servers(self):
+        for region_source in self.region_sources[:-1]:
+            try:
+                return region_source, region_source.get_region_servers()
+            except Exception as err:
+                logger.warning('Could not list region servers from {}, falling back to the next region source: {}'.format(region_source.name, err))
+        region_source = self.region_sources[-1]
+        return region_source, region_source.get_region_servers()
+
+    # Returns an OrderedDict of region server href -> fingerprint, taken from the region server table of /master-status.
+    # The fingerprint combines the server name (which includes its start code), start time and number of regions,
+    #   so it changes whenever the server restarts, or a region is opened on it or closed on it (splits, merges, moves)
+    def _get_region_server_fingerprints(self):
+        from regionfinder.status_parser import StatusPageParser
+        parser = StatusPageParser('tab_baseStats')
+        region_server_hrefs = OrderedDict()
+        for row in self._iter_status_rows(self.master_url + '/master-status', parser):
+            hrefs = [href for _, href in row if href is not None]
+            # The header row has no <td> and the "Total" footer row has no link, so both are skipped here
+            if len(hrefs) > 0:
+                region_server_hrefs['http:' + hrefs[0]] = self._fingerprint(parser.header, row)
+
         # If no rows are found, it is likely that this is a backup master
-        if len(rows) == 0:
-            page_h1s = soup.select('div.page-header h1')
-            if len(page_h1s) == 0:
+        if len(region_server_hrefs) == 0:
+            if len(parser.page_headers) == 0:
                 raise error.RegionFinderError('No region servers on /master-status of {}. Unable to parse current active master.'.format(self.master_url))
 
-            if 'backup' in page_h1s[0].text.lower():
+            if 'backup' in parser.page_headers[0].lower():
                 logger.warning('The HBase endpoint {} is not the current active master'.format(self.master_url))
 
-                page_h4s = soup.select('section h4')
-                for h4 in page_h4s:
-                    if 'current active master' in h4.text.lower() and h4.find('a') is not None:
-                        active_master_url = urlparse(h4.find('a').get('href'))
+                for text, href in parser.section_headers:
+                    if 'current active master' in text.lower() and href is not None:
+                        active_master_url = urlparse(href)
                         self.master_url = 'http://{}:{}'.format(active_master_url.hostname, active_master_url.port)
                         logger.warning('Parsed current active master to be {}. Retrying with this endpoint'.format(self.master_url))
                         logger.warning('It is recommended that you update your config.yaml')
-                        return self._get_region_servers()
+                        return self._get_region_server_fingerprints()
 
             raise error.RegionFinderError('No region servers on /master-status of {}. Unable to parse current active master.'.format(self.master_url))
-
-        region_server_hrefs = []
-        # Exclude the header and footer rows
-        for row in rows[1:-1]:
-            if row.find('a') is not None:
-                region_server_hrefs.append('http:' + row.find('a').get('href'))
         return region_server_hrefs
 
+    # Returns None if the table does not have the expected columns, so that the server is always rescraped
+    def _fingerprint(self, header, row):
+        columns = [column.lower() for column in header or []]
+        if 'start time' not in columns or 'num. regions' not in columns or len(row) != len(columns):
+            return None
+        return '|'.join([row[0][0].strip(), row[columns.index('start time')][0].strip(), row[columns.index('num. regions')][0].strip()])
+
+    # Yields a (name, start, stop) tuple for every region of the table as soon as its row has been parsed.
+    # Blank start/stop keys are yielded as None
     def _get_region_ranges(self, url):
+        from regionfinder.status_parser import StatusPageParser
         urlObject = urlparse(url)
         # newer version of the UI has the path in the href while the older one didn't
         if urlObject.path != '/rs-status':
-            urlObject.path = '/rs-status';
+            urlObject = urlObject._replace(path='/rs-status')
         logger.info('Retrieving info for {}'.format(urlObject.geturl()))
-        resp = requests.get(urlObject.geturl())
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        rows = soup.select('div#tab_regionBaseInfo table tr')
-        region_names = []
-        for row in rows[1:]:
-            tds = row.find_all('td')
+        table_prefix = self.table_name + ','
+        # _scrape_region_server retries every failure scrape_retries times, the transport does not retry on top of it
+        for row in self._iter_status_rows(urlObject.geturl(), StatusPageParser('tab_regionBaseInfo'), retry=False):
+            full_name = row[0][0].strip()
             # 3 <td> per row indicates an older version of the UI where the "Region Name" format is
             #   tableName,timestamp,region
-            if len(tds) == 3:
-                if tds[0].string.strip().startswith(self.table_name + ','):
-                    region_names.append([tds[0].string, tds[1].string, tds[2].string])
-                else:
-                    continue
+            if len(row) == 3:
+                if full_name.startswith(table_prefix):
+                    yield (full_name, row[1][0] or None, row[2][0] or None)
             # 4 <td> per row indicates a newer version of the UI where the "Region Name" format is
             #   tableName,startKey,timestamp,region
-            elif len(tds) == 4:
-                full_name = tds[0].find('a').string.strip()
-                name_tokens = full_name.split(',')
-                if full_name.startswith(self.table_name + ','):
-                    name = name_tokens[0] + ',' + name_tokens[2]
-                    region_names.append([name, tds[1].string, tds[2].string])
-                else:
-                    continue
+            # The start key may itself contain commas, so the timestamp and region are taken from the end
+            elif len(row) == 4:
+                if full_name.startswith(table_prefix):
+                    yield (self.table_name + ',' + full_name.rsplit(',', 1)[1], row[1][0] or None, row[2][0] or None)
             else:
-                logger.warning('Row for {} did not have the expected 3 or 4 columns'.format(tds[0].string))
-                continue
-        return region_names
+                logger.warning('Row for {} did not have the expected 3 or 4 columns'.format(full_name))
+
+    def _iter_status_rows(self, url, parser, retry=True):
+        from regionfinder.status_parser import iter_rows
+        resp = self.transport.get(url, retry=retry, timeout=self.timeout, stream=True)
+        try:
+            resp.raise_for_status()
+            for row in iter_rows(parser, iter_text(resp)):
+                yield row
+        finally:
+            resp.close()
 
     def _create_rs_range_list(self):
-        self.rs_ranges = []
-        region_servers = self._get_region_servers()
+        with self._refresh_lock:
+            region_source, fingerprints = self._list_region_servers()
+            self._refresh_region_servers(region_source, fingerprints, list(fingerprints))
+            self.last_full_refresh = time.time()
+        return self.rs_ranges
+
+    # Rescrapes only the region servers whose /master-status fingerprint changed since they were last scraped,
+    #   and drops the regions of servers that are no longer listed
+    def _update_rs_range_list(self):
+        with self._refresh_lock:
+            region_source, fingerprints = self._list_region_servers()
+            changed = [region_server for region_server, fingerprint in fingerprints.items()
+                       if fingerprint is None or self.rs_fingerprints.get(region_server) != fingerprint]
+            removed = set(self.rs_fingerprints) - set(fingerprints)
+            if len(changed) == 0 and len(removed) == 0:
+                logger.info('No region server changed since the last refresh')
+                return self.rs_ranges
+            logger.info('Rescraping {} changed region servers, dropping {} removed region servers'.format(len(changed), len(removed)))
+            self._refresh_region_servers(region_source, fingerprints, changed)
+        return self.rs_ranges
+
+    # Called when a lookup in region_map found no region containing rowkey, typically because the region was split or
+    #   moved after its region server was last scraped. Rescrapes the region servers that held the key, or the regions
+    #   on either side of it, in region_map and in the map it replaced, together with those whose /master-status row
+    #   changed since they were scraped (which includes wherever the region went). To keep misses of keys that really
+    #   have no region from hammering the cluster, this happens at most once every miss_rescrape_seconds, and not at
+    #   all while a refresh is running.
+    # Returns whether a newer region map than region_map has been published, ie. whether the lookup is worth retrying
+    def _rescrape_on_miss(self, region_map, rowkey):
+        if self.region_map is not region_map:
+            return True
+        if not self.miss_rescrape_seconds:
+            return False
+        if not self._refresh_lock.acquire(False):
+            metrics.MISS_RESCRAPES.inc('busy')
+            return False
+        try:
+            if self.region_map is not region_map:
+                return True
+            if time.time() - self.last_miss_rescrape < self.miss_rescrape_seconds:
+                metrics.MISS_RESCRAPES.inc('throttled')
+                return False
+            self.last_miss_rescrape = time.time()
+            with metrics.phase('rescrape'):
+                owners = set(server for server, _ in region_map.index.neighbours(rowkey))
+                owners.update(server for server, _ in region_map.previous.neighbours(rowkey))
+                region_source, fingerprints = self._list_region_servers()
+                region_servers = [region_server for region_server, fingerprint in fingerprints.items()
+                                  if region_server in owners or (fingerprint is not None and self.rs_fingerprints.get(region_server) != fingerprint)]
+                logger.info('No region contains the rowkey {}, rescraping {}'.format(to_hex(rowkey), ', '.join(region_servers)))
+                if len(region_servers) > 0:
+                    self._refresh_region_servers(region_source, fingerprints, region_servers)
+        except Exception as err:
+            logger.warning('Rescrape after a lookup miss failed: {}'.format(err))
+            metrics.MISS_RESCRAPES.inc('failure')
+            return False
+        finally:
+            self._refresh_lock.release()
+        metrics.MISS_RESCRAPES.inc('refreshed' if self.region_map is not region_map else 'unchanged')
+        return self.region_map is not region_map
+
+    # Reads the regions of region_servers from region_source, and publishes them together with the ones of every other
+    #   server in fingerprints from the current map. Callers hold _refresh_lock
+    def _refresh_region_servers(self, region_source, fingerprints, region_servers):
+        scraped = region_source.get_regions(region_servers)
+        failed = [region_server for region_server in region_servers if region_server not in scraped]
+        if len(failed) > 0 and len(failed) == len(fingerprints):
+            raise error.RegionFinderError('Could not retrieve regions from any of the {} region servers'.format(len(fingerprints)))
+
+        fresh = []
         for region_server in region_servers:
-            region_ranges = self._get_region_ranges(region_server)
-            for name, start, stop in region_ranges:
-                start_hexstring = '0'
-                stop_hexstring = 'Z'
-                if start is None:
-                    logger.info('Start key for {} in server {} was blank'.format(name, region_server))
-                else:
-                    if not isinstance(start, str):
-                        start = start.decode('string-escape')
-                    else:
-                        start = start.encode('utf-8').decode('unicode-escape')
-                    start_hexstring = self._dirtystring_to_rowkey(start)
-
-                if stop is None:
-                    logger.info('End key for {} in server {} was blank'.format(name, region_server))
-                else:
-                    if not isinstance(stop, str):
-                        stop = stop.decode('string-escape')
-                    else:
-                        stop = stop.encode('utf-8').decode('unicode-escape')
-                    stop_hexstring = self._dirtystring_to_rowkey(stop)
-
-                self.rs_ranges.append([
-                    region_server,
-                    name,
-                    start_hexstring,
-                    stop_hexstring
-                ])
-        # Sort this by stop key
-        self.rs_ranges = sorted(self.rs_ranges, key=lambda info: info[3])
+            if region_server in scraped:
+                fresh.extend(scraped[region_server])
+        # Keep the regions of servers that were not rescraped. That includes unreachable servers, rather than leaving
+        #   holes in the key space, but not the regions that overlap a scraped one: those moved, split or merged since
+        #   they were last seen, and the scraped rows are the current ones
+        fresh_index = RegionIndex(fresh)
+        kept = []
+        for row in self.region_map.rs_ranges:
+            if row[0] in fingerprints and row[0] not in scraped:
+                position = bisect_right(fresh_index.stops, row[2])
+                if position < len(fresh) and fresh_index.starts[position] < row[3]:
+                    logger.info('Dropping region {} of {}, which overlaps a region that was scraped since'.format(row[1], row[0]))
+                    continue
+                kept.append(row)
+        # Both runs are already sorted by stop key, so sorting their concatenation only merges them
+        rs_ranges = kept + fresh_index.rows
+        if len(failed) > 0:
+            logger.warning('Refresh finished without {} of {} region servers: {}'.format(len(failed), len(region_servers), ', '.join(failed)))
+        self.failed_region_servers = failed
+        # Failed servers get no fingerprint, so that the next incremental refresh retries them
+        self.rs_fingerprints = dict((region_server, fingerprint) for region_server, fingerprint in fingerprints.items()
+                                    if region_server not in failed and (region_server in scraped or region_server in self.rs_fingerprints))
+        # RegionIndex sorts the rows by stop key. Requests keep using the current map until this one replaces it
+        self._publish(RegionIndex(rs_ranges), time.time())
         self._flush_ranges_to_file()
-        return self.rs_ranges
+        metrics.record_refresh('partial' if len(failed) > 0 else 'success')
+
+    # Scrapes all region servers on a pool of worker threads, so a refresh takes about as long as the slowest server.
+    # Returns a dict of region server -> [server, region, start, stop] rows that only contains the servers that were scraped successfully
+    def _scrape_region_servers(self, region_servers):
+        if len(region_servers) == 0:
+            return {}
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(self.scrape_workers, len(region_servers)))
+        try:
+            results = pool.map(self._scrape_region_server, region_servers)
+        finally:
+            pool.close()
+            pool.join()
+        return dict((region_server, sorted(region_ranges, key=lambda info: info[3])) for region_server, region_ranges in results if region_ranges is not None)
+
+    def _scrape_region_server(self, region_server):
+        started = time.time()
+        for attempt in range(self.scrape_retries + 1):
+            try:
+                region_ranges = self._to_rs_ranges(region_server, self._get_region_ranges(region_server))
+                metrics.SCRAPE_SECONDS.observe(time.time() - started, region_server)
+                return region_server, region_ranges
+            except Exception as err:
+                logger.warning('Attempt {} of {} to retrieve regions from {} failed: {}'.format(attempt + 1, self.scrape_retries + 1, region_server, err))
+                if attempt < self.scrape_retries:
+                    time.sleep(self.RETRY_BACKOFF_SECONDS * 2 ** attempt)
+        metrics.SCRAPE_SECONDS.observe(time.time() - started, region_server)
+        metrics.SCRAPE_FAILURES.inc(region_server)
+        return region_server, None
+
+    def _to_rs_ranges(self, region_server, region_ranges):
+        rs_ranges = []
+        for name, start, stop in region_ranges:
+            start_key = KEY_MIN
+            stop_key = KEY_MAX
+            if start is None:
+                logger.info('Start key for {} in server {} was blank'.format(name, region_server))
+            else:
+                start_key = self._dirtystring_to_rowkey(start)
+
+            if stop is None:
+                logger.info('End key for {} in server {} was blank'.format(name, region_server))
+            else:
+                stop_key = self._dirtystring_to_rowkey(stop)
+
+            rs_ranges.append([
+                region_server,
+                name,
+                start_key,
+                stop_key
+            ])
+        return rs_ranges
 
     # The HBase UI displays keys as "\x"-prefixed hex bytes alongside ASCII characters (if the underlying hex byte can convert to an ASCII char),
     #   eg. "\x00\x12M\xCEW" (M and W are converted ASCII here)
-    # This method converts the key string into a full hexstring eg. "00124DCE57" for the above example
-    # FIXME: this is not tolerant of an actual ASCII "\" followed by an ASCII "x", eg. "5C78" in hex, appearing in the HTML string
+    # This method converts the key string into its raw bytes eg. b"\x00\x12M\xceW" for the above example
     def _dirtystring_to_rowkey(self, dirty_string):
-        return ''.join(map(self._char_to_hexbyte, list(dirty_string)))
-
-    def _char_to_hexbyte(self, char):
-        return '{:02X}'.format(ord(char))
+        from regionfinder.status_parser import dirtystring_to_bytes
+        return dirtystring_to_bytes(dirty_string)
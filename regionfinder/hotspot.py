@@ -0,0 +1,36 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+def _skew(values):
+    if len(values) == 0:
+        return 0.0
+    return round(max(values) * len(values) / float(sum(values)), 3)
+
+def build_report(counts, top=10):
+    '''
+    Summarises how the series of a metric are spread over regions and region servers.
+
+    counts is a {(server, region): series count} dict, as returned by HBaseUIClient.get_series_counts. A server's
+    count is the sum of its regions' counts, so a series with rows in two regions of one server is counted twice
+    there, as it is read twice. Skew is max / mean over the regions and servers that hold any of the series.
+    '''
+    servers = {}
+    for (server, _), count in counts.items():
+        regions, series = servers.get(server, (0, 0))
+        servers[server] = (regions + 1, series + count)
+    regions = [{'regionServer': server, 'regionName': region, 'series': counts[(server, region)]} for server, region in sorted(counts)]
+    return {
+        'regionCount': len(counts),
+        'serverCount': len(servers),
+        'regionSkew': _skew(list(counts.values())),
+        'serverSkew': _skew([series for _, series in servers.values()]),
+        'topRegions': sorted(regions, key=lambda region: -region['series'])[:max(0, top)],
+        'servers': [{'regionServer': server, 'regions': servers[server][0], 'series': servers[server][1]}
+                    for server in sorted(servers, key=lambda server: (-servers[server][1], server))],
+        'regions': regions,
+    }
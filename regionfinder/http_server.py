@@ -0,0 +1,100 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import socket
+import time
+from threading import Thread
+try:
+    from http.server import HTTPServer
+    from queue import Queue, Full
+except ImportError:
+    from BaseHTTPServer import HTTPServer
+    from Queue import Queue, Full
+from regionfinder.util import logger
+
+BUSY_RESPONSE = (b'HTTP/1.0 503 Service Unavailable\r\n'
+                 b'Content-Type: text/plain\r\n'
+                 b'Retry-After: 1\r\n'
+                 b'Connection: close\r\n\r\n'
+                 b'region-finder is busy, please retry later')
+
+class BoundedThreadPoolHTTPServer(HTTPServer):
+    '''
+    HTTPServer that serves requests on a fixed pool of worker threads.
+
+    Accepted connections wait in a queue of at most queue_size entries. When the queue is full, or a connection waited
+    longer than request_timeout seconds for a worker, the client gets a 503 right away instead of piling up in the
+    listen backlog. request_timeout also bounds how long a worker waits on a client socket.
+
+    A listener that is already bound and listening, eg. one shared by several processes, is served instead of binding
+    server_address.
+    '''
+    def __init__(self, server_address, handler_class, workers=8, queue_size=64, request_timeout=30, listener=None):
+        if listener is None:
+            HTTPServer.__init__(self, server_address, handler_class)
+        else:
+            HTTPServer.__init__(self, server_address, handler_class, bind_and_activate=False)
+            self.socket.close()
+            self.socket = listener
+            self.server_address = listener.getsockname()
+            host, port = self.server_address[:2]
+            self.server_name = socket.getfqdn(host)
+            self.server_port = port
+        self.request_timeout = request_timeout
+        self._requests = Queue(maxsize=max(1, queue_size))
+        self._workers = []
+        for i in range(max(1, workers)):
+            worker = Thread(target=self._work, name='region-finder-worker-{}'.format(i))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def process_request(self, request, client_address):
+        try:
+            self._requests.put_nowait((request, client_address, time.time()))
+        except Full:
+            logger.warning('Request queue is full, rejecting request from {}'.format(client_address[0]))
+            self._reject(request)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join(self.request_timeout)
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address, queued_at = item
+            if time.time() - queued_at > self.request_timeout:
+                logger.warning('Request from {} waited more than {}s for a worker, rejecting it'.format(client_address[0], self.request_timeout))
+                self._reject(request)
+                continue
+            try:
+                request.settimeout(self.request_timeout)
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def _reject(self, request):
+        try:
+            # Read what the client already sent, so that closing the socket does not reset the connection before the 503 arrives
+            request.settimeout(0.1)
+            request.recv(65536)
+        except socket.error:
+            pass
+        try:
+            request.sendall(BUSY_RESPONSE)
+        except socket.error:
+            pass
+        self.shutdown_request(request)
@@ -0,0 +1,165 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import json
+import re
+from regionfinder import error
+
+# One JSON token, after optional whitespace: punctuation, a complete string (raw, still escaped), a scalar
+#   (number, true, false, null) or any other character. The last alternative catches the opening quote of a string
+#   that is not complete yet, as well as garbage
+TOKEN = re.compile(r'\s*(?:([\[\]{}:,])|"([^"\\]*(?:\\.[^"\\]*)*)"|([^\s\[\]{}:,"]+)|(\S))', re.DOTALL)
+# Runs of array elements and object members that can be handed to the C decoder in one go: strings without
+#   escapes, and members whose value is such a string or a scalar, each followed by a comma
+STRING_RUN = re.compile(r'(?:\s*"[^"\\]*"\s*,)+')
+MEMBER_RUN = re.compile(r'(?:\s*"[^"\\]*"\s*:\s*(?:"[^"\\]*"|[^\s\[\]{}:,"]+)\s*,)+')
+END = (None, None)
+
+class JSONReader(object):
+    '''
+    Pull reader over the JSON text chunks of a streamed response, so that a large document can be walked without
+    decoding it as a whole. Only the unread part of the current chunk is kept.
+
+    next_token returns (kind, value) tuples: kind is the punctuation character itself for "[", "]", "{", "}", ":"
+    and "," (with value None), '"' for a string and "v" for a scalar, whose value is its source text. END is returned
+    after the last token.
+    '''
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ''
+        self._position = 0
+
+    def next_token(self):
+        while True:
+            match = TOKEN.match(self._buffer, self._position)
+            if match is None:
+                # Only whitespace is left
+                if not self._fill():
+                    return END
+                continue
+            punctuation, string, scalar, other = match.groups()
+            if punctuation is not None:
+                self._position = match.end()
+                return (punctuation, None)
+            if string is not None:
+                self._position = match.end()
+                return ('"', json.loads('"' + string + '"') if '\\' in string else string)
+            if scalar is not None and match.end() < len(self._buffer):
+                self._position = match.end()
+                return ('v', scalar)
+            if other is not None and other != '"':
+                raise error.RegionFinderError('Malformed JSON: unexpected {!r}'.format(other))
+            # A scalar that ends with the buffer may continue in the next chunk, and a string may not be closed yet
+            if not self._fill():
+                if scalar is None:
+                    raise error.RegionFinderError('Malformed JSON: truncated string')
+                self._position = match.end()
+                return ('v', scalar)
+
+    # Yields the keys of the object whose "{" was just read. The caller must consume each value before asking for the next key
+    def iter_members(self):
+        kind, key = self.next_token()
+        while kind != '}':
+            if kind != '"' or self.next_token()[0] != ':':
+                raise error.RegionFinderError('Malformed JSON: expected an object member')
+            yield key
+            kind, _ = self.next_token()
+            if kind == ',':
+                kind, key = self.next_token()
+            elif kind != '}':
+                raise error.RegionFinderError('Malformed JSON: expected "," or "}"')
+
+    # Yields the first token of every element of the array whose "[" was just read. The caller must consume the rest
+    #   of nested elements, eg. with skip_value, before asking for the next one
+    def iter_elements(self):
+        token = self.next_token()
+        while token[0] != ']':
+            if token[0] is None:
+                raise error.RegionFinderError('Malformed JSON: truncated array')
+            yield token
+            kind, _ = self.next_token()
+            if kind == ']':
+                return
+            if kind != ',':
+                raise error.RegionFinderError('Malformed JSON: expected "," or "]"')
+            token = self.next_token()
+
+    # Yields the elements of the array whose "[" was just read, which must all be strings
+    def iter_strings(self):
+        while True:
+            run = STRING_RUN.match(self._buffer, self._position)
+            if run is not None:
+                self._position = run.end()
+                for value in json.loads('[' + run.group()[:-1] + ']'):
+                    yield value
+            # The last element, and those that are escaped or straddle a chunk boundary
+            kind, value = self.next_token()
+            if kind == ']':
+                return
+            if kind != '"':
+                raise error.RegionFinderError('Malformed JSON: expected a string')
+            yield value
+            kind, _ = self.next_token()
+            if kind == ']':
+                return
+            if kind != ',':
+                raise error.RegionFinderError('Malformed JSON: expected "," or "]"')
+
+    # Yields the keys of the object whose "{" was just read and skips its values, which must not be objects or arrays
+    def iter_keys(self):
+        while True:
+            run = MEMBER_RUN.match(self._buffer, self._position)
+            if run is not None:
+                self._position = run.end()
+                for key, _ in json.loads('{' + run.group()[:-1] + '}', object_pairs_hook=list):
+                    yield key
+            kind, key = self.next_token()
+            if kind == '}':
+                return
+            if kind != '"' or self.next_token()[0] != ':' or self.next_token()[0] not in ('"', 'v'):
+                raise error.RegionFinderError('Malformed JSON: expected an object member without nested values')
+            yield key
+            kind, _ = self.next_token()
+            if kind == '}':
+                return
+            if kind != ',':
+                raise error.RegionFinderError('Malformed JSON: expected "," or "}"')
+
+    # Decodes the value that starts with token. Meant for small values, the whole value is held in memory
+    def read_value(self, token):
+        kind, value = token
+        if kind == '{':
+            return dict((key, self.read_value(self.next_token())) for key in self.iter_members())
+        if kind == '[':
+            return [self.read_value(element) for element in self.iter_elements()]
+        if kind == '"':
+            return value
+        if kind == 'v':
+            return json.loads(value)
+        raise error.RegionFinderError('Malformed JSON: expected a value')
+
+    # Consumes the value that starts with token, including everything nested in it
+    def skip_value(self, token):
+        kind = token[0]
+        if kind == '{':
+            for _ in self.iter_members():
+                self.skip_value(self.next_token())
+        elif kind == '[':
+            for element in self.iter_elements():
+                self.skip_value(element)
+        elif kind not in ('"', 'v'):
+            raise error.RegionFinderError('Malformed JSON: expected a value')
+
+    # Appends the next chunk to the unread text. Returns False once the chunks are exhausted
+    def _fill(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+        return True
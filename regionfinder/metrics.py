@@ -0,0 +1,238 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Instrumentation of bin/server, rendered in the Prometheus text exposition format by REGISTRY.render.
+#
+# Phases of a request (TSDB, rowkeys, lookup, render) are timed with phase(), which only records anything on threads
+#   that called start_timings, so the CLI pays nothing. Phases nest: time spent in an inner phase is not counted in
+#   the outer one, eg. reading the TSDB response while rowkeys are being built counts as tsdb only
+
+_replace = getattr(os, 'replace', os.rename)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+def _format_labels(pairs):
+    if len(pairs) == 0:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append('{}="{}"'.format(name, value))
+    return '{' + ','.join(escaped) + '}'
+
+class _Metric(object):
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError('{} takes the labels {}'.format(self.name, ', '.join(self.labelnames)))
+        return tuple(str(label) for label in labels)
+
+    # Drops every value, and the lock that guards them, which may have been held by another thread when this process forked
+    def reset(self):
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.TYPE)]
+        with self._lock:
+            samples = list(self._samples())
+        for suffix, pairs, value in samples:
+            lines.append('{}{}{} {}'.format(self.name, suffix, _format_labels(pairs), _format_value(value)))
+        return '\n'.join(lines)
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield '', list(zip(self.labelnames, key)), value
+
+class Counter(_Metric):
+    TYPE = 'counter'
+
+    def inc(self, *labels, **kwargs):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + kwargs.get('amount', 1)
+
+class Gauge(_Metric):
+    '''Either set explicitly, or read from function when rendered. A function returning None leaves the gauge out'''
+    TYPE = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super(Gauge, self).__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        if self.function is not None:
+            value = self.function()
+            if value is not None:
+                yield '', [], value
+            return
+        for sample in super(Gauge, self)._samples():
+            yield sample
+
+class Histogram(_Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, then the sum of the observed values
+                counts = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += value
+
+    def _samples(self):
+        for key, counts in self._values.items():
+            pairs = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield '_bucket', pairs + [('le', _format_value(bound))], count
+            yield '_sum', pairs, counts[-1]
+            yield '_count', pairs, counts[len(self.buckets) - 1]
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = OrderedDict()
+
+    # Returns the metric, so that it can be defined and registered in one go
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name):
+        self._metrics.pop(name, None)
+
+    # Starts every metric over, in a freshly forked process
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    # Renders every metric, or only those named in names
+    def render(self, names=None):
+        return '\n'.join(metric.render() for metric in list(self._metrics.values()) if names is None or metric.name in names) + '\n'
+
+    # Writes render(names) to path, replacing it at once so that readers never see a partly written file
+    def write(self, path, names=None):
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'w') as metrics_file:
+            metrics_file.write(self.render(names))
+        _replace(temp_path, path)
+
+REGISTRY = Registry()
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    'regionfinder_phase_seconds', 'Time spent per request in each phase: tsdb, rowkeys, lookup, rescrape and render', ('phase',)))
+SCRAPE_SECONDS = REGISTRY.register(Histogram(
+    'regionfinder_region_server_scrape_seconds', 'Time taken to scrape the regions of a region server, retries included', ('region_server',)))
+SCRAPE_FAILURES = REGISTRY.register(Counter(
+    'regionfinder_region_server_scrape_failures_total', 'Region server scrapes that failed after every retry', ('region_server',)))
+REFRESHES = REGISTRY.register(Counter(
+    'regionfinder_refreshes_total', 'Region map refreshes by outcome: success, partial (some region servers failed) or failure', ('outcome',)))
+LAST_REFRESH = REGISTRY.register(Gauge(
+    'regionfinder_last_refresh_timestamp_seconds', 'Time of the last region map refresh of each outcome', ('outcome',)))
+MISS_RESCRAPES = REGISTRY.register(Counter(
+    'regionfinder_miss_rescrapes_total', 'Lookup misses that asked for a rescrape, by outcome: refreshed, unchanged, '
+    'throttled, busy (a refresh was running) or failure', ('outcome',)))
+
+# Metrics that only the process refreshing the region map records. In pre-fork mode that is the parent process, which
+#   writes them to a file for the server processes to expose
+REFRESH_METRIC_NAMES = (SCRAPE_SECONDS.name, SCRAPE_FAILURES.name, REFRESHES.name, LAST_REFRESH.name, MISS_RESCRAPES.name,
+                        'regionfinder_failed_region_servers')
+
+def record_refresh(outcome):
+    REFRESHES.inc(outcome)
+    LAST_REFRESH.set(time.time(), outcome)
+
+_local = threading.local()
+
+# Starts collecting the phase timings of the current thread, and returns the {phase: seconds} dict they go to
+def start_timings():
+    _local.timings = OrderedDict()
+    _local.stack = []
+    return _local.timings
+
+# {phase: seconds} collected so far on the current thread, or None when it is not collecting
+def current_timings():
+    return getattr(_local, 'timings', None)
+
+# Stops collecting, and observes every phase of the finished request in PHASE_SECONDS
+def stop_timings():
+    timings = getattr(_local, 'timings', None)
+    _local.timings = None
+    if timings is not None:
+        for name, seconds in timings.items():
+            PHASE_SECONDS.observe(seconds, name)
+    return timings
+
+@contextmanager
+def phase(name):
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        yield
+        return
+    stack = _local.stack
+    now = time.time()
+    if len(stack) > 0:
+        # Pause the enclosing phase
+        outer, since = stack[-1]
+        timings[outer] = timings.get(outer, 0.0) + now - since
+    stack.append((name, now))
+    try:
+        yield
+    finally:
+        now = time.time()
+        _, since = stack.pop()
+        timings[name] = timings.get(name, 0.0) + now - since
+        if len(stack) > 0:
+            stack[-1] = (stack[-1][0], now)
+
+# Yields the items of iterable, counting the time spent getting each one as phase name. Meant for coarse items,
+#   like the chunks of a response
+def timed_iter(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+_END = object()
+
+# Server-Timing header value of collected timings, in milliseconds
+def server_timing(timings):
+    return ', '.join('{};dur={:.2f}'.format(name, seconds * 1000) for name, seconds in timings.items())
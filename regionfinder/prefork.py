@@ -0,0 +1,115 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import errno
+import os
+import signal
+import socket
+import time
+from regionfinder import error
+from regionfinder.util import logger
+
+# Pre-fork mode of bin/server. The parent process binds the listening socket, owns the HBaseUIClient that refreshes
+#   the region map and writes it to the cache file, and forks worker processes that accept connections on the inherited
+#   socket. Every worker maps the cache file read-only, so the region index is held once in the page cache whatever the
+#   number of workers, and maps it again when the parent replaces it.
+
+# A worker that dies is replaced, at most this often per worker slot
+RESPAWN_SECONDS = 1
+
+def listen(server_address, backlog=128):
+    '''Returns a bound and listening TCP socket, to be shared by the worker processes'''
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(server_address)
+    listener.listen(backlog)
+    return listener
+
+class WorkerProcesses(object):
+    '''
+    Forks processes children that each run serve(index), index being the worker slot from 0 to processes - 1, and
+    exit when it returns. supervise() then keeps that many children running until stop() is called.
+    '''
+    def __init__(self, processes, serve):
+        if not hasattr(os, 'fork'):
+            raise error.RegionFinderError('Running more than one server process requires os.fork')
+        self.processes = max(1, processes)
+        self.serve = serve
+        # pid -> worker slot
+        self.workers = {}
+        self._started = {}
+        self._stopping = False
+
+    def start(self):
+        for index in range(self.processes):
+            self._fork(index)
+        return self
+
+    def supervise(self):
+        '''Waits on the children, forking a new one in the slot of any that exits, until stop() is called'''
+        while not self._stopping and len(self.workers) > 0:
+            try:
+                pid, status = os.wait()
+            except OSError as err:
+                if err.errno == errno.EINTR:
+                    continue
+                if err.errno == errno.ECHILD:
+                    return
+                raise
+            index = self.workers.pop(pid, None)
+            if index is None or self._stopping:
+                continue
+            logger.warning('Server process {} exited with status {}, starting another one'.format(pid, status))
+            # Do not spin if workers die as soon as they start
+            time.sleep(max(0, self._started[index] + RESPAWN_SECONDS - time.time()))
+            self._fork(index)
+
+    def stop(self, timeout=10):
+        self._stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                self.workers.pop(pid, None)
+        deadline = time.time() + timeout
+        while len(self.workers) > 0 and time.time() < deadline:
+            for pid in list(self.workers):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0] != 0:
+                        self.workers.pop(pid)
+                except OSError:
+                    self.workers.pop(pid, None)
+            time.sleep(0.05)
+        for pid in list(self.workers):
+            logger.warning('Server process {} did not stop, killing it'.format(pid))
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        self.workers = {}
+
+    def _fork(self, index):
+        self._started[index] = time.time()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                self.serve(index)
+            except SystemExit:
+                pass
+            except BaseException as err:
+                logger.error('Server process {} failed: {}'.format(os.getpid(), err))
+                status = 1
+            finally:
+                # Never return into the code of the parent
+                os._exit(status)
+        self.workers[pid] = index
+        return pid
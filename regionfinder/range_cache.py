@@ -0,0 +1,251 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import mmap
+import os
+import struct
+import tempfile
+from regionfinder import error
+from regionfinder.rowkey import KEY_MAX, to_hex
+
+# Binary region cache, version 1. All integers are big-endian.
+#
+#   header    magic "RFRC", version u16, reserved u16, last updated u64 (epoch seconds),
+#             region count u32, string count u32, table name length u16, table name (UTF-8)
+#   strings   (string count + 1) u32 offsets into the string blob, then the blob. Server and region names are
+#             interned here, so a server carrying 1000 regions is stored once
+#   regions   region count records of: start offset, start length, stop offset, stop length, server index,
+#             region name index, flags (u32 each), sorted by stop key. Offsets point into the key blob
+#   keys      raw start and stop key bytes
+#
+# A blank start key is KEY_MIN, the empty key. A blank stop key (KEY_MAX, the last region of the table) is stored as an
+#   empty key with FLAG_OPEN_STOP set
+MAGIC = b'RFRC'
+VERSION = 1
+HEADER = struct.Struct('>4sHHQII')
+TABLE_NAME_LENGTH = struct.Struct('>H')
+OFFSET = struct.Struct('>I')
+RECORD = struct.Struct('>IIIIIII')
+FLAG_OPEN_STOP = 1
+
+_replace = getattr(os, 'replace', os.rename)
+
+def write_range_cache(path, table_name, last_updated, rs_ranges):
+    '''
+    Writes [server, region, start, stop] rows with bytes keys to path.
+    The file is written to a temporary file in the same directory first and then renamed over path, so readers
+    only ever see either the previous or the new cache.
+    '''
+    rs_ranges = sorted(rs_ranges, key=lambda info: info[3])
+    strings = []
+    string_ids = {}
+    def intern(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value.encode('utf-8'))
+        return string_ids[value]
+
+    keys = bytearray()
+    records = []
+    for server, region, start, stop in rs_ranges:
+        flags = 0
+        if stop is KEY_MAX:
+            flags |= FLAG_OPEN_STOP
+            stop = b''
+        start_offset = len(keys)
+        keys.extend(start)
+        stop_offset = len(keys)
+        keys.extend(stop)
+        records.append(RECORD.pack(start_offset, len(start), stop_offset, len(stop),
+                                   intern(server), intern(region), flags))
+
+    encoded_table_name = table_name.encode('utf-8')
+    chunks = [HEADER.pack(MAGIC, VERSION, 0, int(last_updated), len(records), len(strings)),
+              TABLE_NAME_LENGTH.pack(len(encoded_table_name)), encoded_table_name]
+    offset = 0
+    for value in strings:
+        chunks.append(OFFSET.pack(offset))
+        offset += len(value)
+    chunks.append(OFFSET.pack(offset))
+    chunks.extend(strings)
+    chunks.extend(records)
+    chunks.append(bytes(keys))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            for chunk in chunks:
+                temp_file.write(chunk)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        _replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class MappedRegionIndex:
+    '''
+    Region index that bisects directly over a memory-mapped binary cache file.
+
+    Only the header is decoded when the file is opened. Keys and names are read from the mapping when a lookup
+    needs them, so opening the index does not depend on the number of regions.
+    '''
+    def __init__(self, path):
+        with open(path, 'rb') as cache_file:
+            stat = os.fstat(cache_file.fileno())
+            if stat.st_size < HEADER.size:
+                raise error.RegionFinderError('Region cache {} is truncated'.format(path))
+            # Tells this version of the file apart from the ones that replace it
+            self.identity = (stat.st_ino, stat.st_mtime, stat.st_size)
+            self._map = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.last_updated, self._count, string_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise error.RegionFinderError('Region cache {} has an unsupported format'.format(path))
+        position = HEADER.size
+        (name_length,) = TABLE_NAME_LENGTH.unpack_from(self._map, position)
+        position += TABLE_NAME_LENGTH.size
+        self.table_name = self._map[position:position + name_length].decode('utf-8')
+        position += name_length
+
+        self._offsets_start = position
+        self._strings_start = position + (string_count + 1) * OFFSET.size
+        if len(self._map) < self._strings_start:
+            raise error.RegionFinderError('Region cache {} is truncated'.format(path))
+        self._records_start = self._strings_start + self._offset(string_count)
+        self._keys_start = self._records_start + self._count * RECORD.size
+        if len(self._map) < self._keys_start:
+            raise error.RegionFinderError('Region cache {} is truncated'.format(path))
+
+    def __len__(self):
+        return self._count
+
+    def lookup(self, rowkey):
+        return self._match(self._bisect_stop(rowkey, 0), rowkey)
+
+    # Same contract as RegionIndex.lookup_many: one sort, then a single forward pass over the mapped regions.
+    # Reading a record costs far more than comparing keys, so the keys and names of the region the last rowkey fell in
+    #   are kept, and the following rowkeys only search the mapping once they are past its stop key
+    def lookup_many(self, rowkeys):
+        keys = list(rowkeys)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        results = [None] * len(keys)
+        position = 0
+        start = stop = names = None
+        for i in order:
+            key = keys[i]
+            if stop is None or not key < stop:
+                position = self._gallop_stop(key, position)
+                if position < self._count:
+                    start_offset, start_length, stop_offset, stop_length, server, region, flags = self._record(position)
+                    start = self._key(start_offset, start_length)
+                    stop = KEY_MAX if flags & FLAG_OPEN_STOP else self._key(stop_offset, stop_length)
+                    names = (self._string(server), self._string(region))
+                else:
+                    start = names = None
+                    stop = KEY_MAX
+            if start is None or key < start:
+                raise error.RegionNotFoundError('Could not find a region whose start/end key range contains the rowkey {}'.format(to_hex(key)), key)
+            results[i] = names
+        return results
+
+    # Same contract as RegionIndex.neighbours
+    def neighbours(self, rowkey):
+        position = self._bisect_stop(rowkey, 0)
+        try:
+            return [self._match(position, rowkey)]
+        except error.RegionNotFoundError:
+            positions = [p for p in (position - 1, position) if 0 <= p < self._count]
+        return [self._names(p) for p in positions]
+
+    # Same contract as RegionIndex.lookup_span
+    def lookup_span(self, start, stop):
+        return [(server, region) for server, region, _, _ in self.iter_span(start, stop)]
+
+    # Same contract as RegionIndex.iter_span
+    def iter_span(self, start, stop):
+        position = self._bisect_stop(start, 0)
+        while position < self._count:
+            start_offset, start_length, stop_offset, stop_length, server, region, flags = self._record(position)
+            region_start = self._key(start_offset, start_length)
+            if not region_start < stop:
+                return
+            region_stop = KEY_MAX if flags & FLAG_OPEN_STOP else self._key(stop_offset, stop_length)
+            yield (self._string(server), self._string(region), region_start, region_stop)
+            position += 1
+
+    def to_rs_ranges(self):
+        rs_ranges = []
+        for position in range(self._count):
+            start_offset, start_length, stop_offset, stop_length, server, region, flags = self._record(position)
+            rs_ranges.append([
+                self._string(server),
+                self._string(region),
+                self._key(start_offset, start_length),
+                KEY_MAX if flags & FLAG_OPEN_STOP else self._key(stop_offset, stop_length)
+            ])
+        return rs_ranges
+
+    def close(self):
+        self._map.close()
+
+    def _record(self, position):
+        return RECORD.unpack_from(self._map, self._records_start + position * RECORD.size)
+
+    def _offset(self, i):
+        return OFFSET.unpack_from(self._map, self._offsets_start + i * OFFSET.size)[0]
+
+    def _string(self, i):
+        return self._map[self._strings_start + self._offset(i):self._strings_start + self._offset(i + 1)].decode('utf-8')
+
+    def _key(self, offset, length):
+        return self._map[self._keys_start + offset:self._keys_start + offset + length]
+
+    # Returns the position of the first region whose stop key is greater than key, searching from lo onwards
+    def _bisect_stop(self, key, lo):
+        hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            _, _, stop_offset, stop_length, _, _, flags = self._record(mid)
+            if flags & FLAG_OPEN_STOP or key < self._key(stop_offset, stop_length):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    # Same as _bisect_stop, for a key expected to be a few regions past lo: the search range grows from lo until it
+    #   holds the key, and only that range is bisected
+    def _gallop_stop(self, key, lo):
+        step = 1
+        while lo + step < self._count:
+            _, _, stop_offset, stop_length, _, _, flags = self._record(lo + step - 1)
+            if flags & FLAG_OPEN_STOP or key < self._key(stop_offset, stop_length):
+                break
+            lo += step
+            step *= 2
+        hi = min(lo + step, self._count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            _, _, stop_offset, stop_length, _, _, flags = self._record(mid)
+            if flags & FLAG_OPEN_STOP or key < self._key(stop_offset, stop_length):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _names(self, position):
+        _, _, _, _, server, region, _ = self._record(position)
+        return (self._string(server), self._string(region))
+
+    def _match(self, position, key):
+        if position < self._count:
+            start_offset, start_length, _, _, server, region, _ = self._record(position)
+            if not key < self._key(start_offset, start_length):
+                return (self._string(server), self._string(region))
+        raise error.RegionNotFoundError('Could not find a region whose start/end key range contains the rowkey {}'.format(to_hex(key)), key)
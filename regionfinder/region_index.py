@@ -0,0 +1,116 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+from bisect import bisect_left, bisect_right
+from regionfinder import error
+from regionfinder.rowkey import prefix_successor, to_hex
+
+class RegionIndex:
+    '''
+    Sorted interval index over [server, region, start, stop] rows with bytes keys, KEY_MIN and KEY_MAX standing in for
+    blank start and stop keys.
+
+    Regions of a table never overlap, so ordering them by stop key also orders them by start key. A rowkey belongs
+    to the first region whose stop key is greater than it, as long as that region's start key is not greater than it
+    (HBase start keys are inclusive and stop keys are exclusive).
+    '''
+    def __init__(self, rs_ranges):
+        self.rows = sorted(rs_ranges, key=lambda info: info[3])
+        self.starts = [row[2] for row in self.rows]
+        self.stops = [row[3] for row in self.rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_rs_ranges(self):
+        return self.rows
+
+    def lookup(self, rowkey):
+        position = bisect_right(self.stops, rowkey)
+        if position == len(self.rows) or rowkey < self.starts[position]:
+            raise error.RegionNotFoundError('Could not find a region whose start/end key range contains the rowkey {}'.format(to_hex(rowkey)), rowkey)
+        return (self.rows[position][0], self.rows[position][1])
+
+    # Returns the (server, region) of the region containing rowkey, or of the regions on either side of the gap it
+    #   falls in when there is none
+    def neighbours(self, rowkey):
+        position = bisect_right(self.stops, rowkey)
+        if position < len(self.rows) and not rowkey < self.starts[position]:
+            rows = [self.rows[position]]
+        else:
+            rows = self.rows[max(0, position - 1):position + 1]
+        return [(row[0], row[1]) for row in rows]
+
+    # Returns the (server, region) of every region that overlaps the key span [start, stop), in key order
+    def lookup_span(self, start, stop):
+        return [(server, region) for server, region, _, _ in self.iter_span(start, stop)]
+
+    # Yields the (server, region, start, stop) of every region that overlaps the key span [start, stop), in key order
+    def iter_span(self, start, stop):
+        position = bisect_right(self.stops, start)
+        while position < len(self.rows) and self.starts[position] < stop:
+            row = self.rows[position]
+            yield (row[0], row[1], row[2], row[3])
+            position += 1
+
+    # Resolves every rowkey with one sort plus a single forward pass over the regions.
+    # The returned (server, region) tuples are in the same order as the given rowkeys.
+    def lookup_many(self, rowkeys):
+        rowkeys = list(rowkeys)
+        order = sorted(range(len(rowkeys)), key=rowkeys.__getitem__)
+        results = [None] * len(rowkeys)
+        position = 0
+        region_count = len(self.rows)
+        for i in order:
+            rowkey = rowkeys[i]
+            # Rowkeys are visited in ascending order, so the search never has to look behind the previous match
+            position = bisect_right(self.stops, rowkey, position)
+            if position == region_count or rowkey < self.starts[position]:
+                raise error.RegionNotFoundError('Could not find a region whose start/end key range contains the rowkey {}'.format(to_hex(rowkey)), rowkey)
+            results[i] = (self.rows[position][0], self.rows[position][1])
+        return results
+
+def count_series(region_index, row_groups):
+    '''
+    Counts the distinct series that have rows in each region of region_index (a RegionIndex or MappedRegionIndex).
+
+    row_groups is an iterable of (prefix, row_times, suffixes): every series of a group has the rowkeys
+    <prefix><row time><suffix> for each of the row times, and suffixes is sorted and unique. Rowkeys are never built:
+    each region overlapping <prefix><row time> cuts the suffixes at its start and stop keys, so the work per row time
+    depends on the number of regions it spans rather than the number of series. The slices a region gets are merged
+    across row times, so that a series with several rows in one region is counted once.
+
+    Returns a {(server, region): series count} dict.
+    '''
+    slices = {}
+    for prefix, row_times, suffixes in row_groups:
+        for row_time in row_times:
+            row_prefix = prefix + row_time
+            row_stop = prefix_successor(row_prefix)
+            covered = 0
+            for server, region, start, stop in region_index.iter_span(row_prefix, row_stop):
+                # Keys strictly inside the span all start with row_prefix, so they cut the suffixes directly
+                first = 0 if start <= row_prefix else bisect_left(suffixes, start[len(row_prefix):])
+                last = len(suffixes) if stop >= row_stop else bisect_left(suffixes, stop[len(row_prefix):])
+                if first < last:
+                    slices.setdefault((server, region), {}).setdefault(prefix, []).append((first, last))
+                    covered += last - first
+            if covered < len(suffixes):
+                raise error.RegionNotFoundError('Could not find a region for every row starting with {}'.format(to_hex(row_prefix)), row_prefix)
+
+    counts = {}
+    for rs_info, prefix_slices in slices.items():
+        count = 0
+        for ranges in prefix_slices.values():
+            end = 0
+            for first, last in sorted(ranges):
+                if last > end:
+                    count += last - max(first, end)
+                    end = last
+        counts[rs_info] = count
+    return counts
@@ -0,0 +1,242 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import base64
+import binascii
+import hashlib
+import json
+from collections import OrderedDict
+from regionfinder import error
+from regionfinder.rowkey import KEY_MAX, KEY_MIN, prefix_successor
+from regionfinder.util import binary_type, logger
+
+# Where HBaseUIClient gets the regions of the table from. A region source has a name, and two methods:
+#   - get_region_servers(): an OrderedDict of region server -> fingerprint of every region server of the cluster.
+#     The fingerprint changes whenever the regions of the server change, or is None when that cannot be told
+#   - get_regions(region_servers): a dict of region server -> [server, region, start, stop] rows sorted by stop key, for
+#     the given region servers whose regions could be read. Servers that are left out count as failed
+# A refresh calls get_region_servers once, then get_regions with the servers that need to be read again.
+
+class StatusPageSource(object):
+    '''Scrapes /master-status for the region servers, then the /rs-status page of each region server'''
+    name = 'status pages'
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_region_servers(self):
+        return self.client._get_region_server_fingerprints()
+
+    def get_regions(self, region_servers):
+        return self.client._scrape_region_servers(region_servers)
+
+class MetaScanSource(object):
+    '''
+    Reads the regions of the table from hbase:meta through the scanner of an HBase REST gateway, batch_size rows per
+    request, so that a refresh costs a few paged requests instead of one per region server.
+
+    Regions are listed under the region server hosting them, named like StatusPageSource names it, by the URL of its
+    web UI (eg. http://host:16030/), so that falling back to the status pages neither renames the servers nor changes
+    the output. hbase:meta only has the RPC port of a server (info:server, eg. host:16020): the web UI is taken to be on
+    info_port, or when it is None, INFO_PORT_OFFSET above the RPC port like the HBase defaults. Split parents, offline
+    regions, read replicas and regions that are not assigned anywhere are left out. get_region_servers scans
+    hbase:meta, and get_regions answers from that scan.
+    '''
+    name = 'hbase:meta'
+    META_TABLE = 'hbase:meta'
+    COLUMNS = (b'info:regioninfo', b'info:server', b'info:serverstartcode')
+    # hbase.regionserver.info.port defaults to 16030 for the RPC port 16020, and to 60030 for 60020 before HBase 1.0
+    INFO_PORT_OFFSET = 10
+
+    def __init__(self, rest_url, table_name, transport, timeout=(5, 30), batch_size=5000, info_port=None):
+        self.rest_url = rest_url.rstrip('/')
+        self.table_name = table_name
+        self.transport = transport
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.info_port = info_port
+        self._regions = {}
+        # Requests made by the last scan, to tell what a refresh cost
+        self.last_scan_requests = 0
+
+    def get_region_servers(self):
+        regions = {}
+        fingerprints = {}
+        for row in self._iter_region_rows():
+            server = row.get(b'info:server')
+            region_info = parse_region_info(row[b'info:regioninfo'])
+            if region_info['offline'] or region_info['split'] or region_info['replica_id'] != 0:
+                continue
+            name = self.table_name + ',' + row['key'].rsplit(b',', 1)[-1].decode('utf-8')
+            if server is None:
+                logger.warning('Region {} is not assigned to any region server in {}'.format(name, self.META_TABLE))
+                continue
+            server = self._server_url(server.decode('utf-8'))
+            regions.setdefault(server, []).append([server, name, region_info['start_key'] or KEY_MIN, region_info['end_key'] or KEY_MAX])
+            fingerprints.setdefault(server, hashlib.sha1(row.get(b'info:serverstartcode', b''))).update(binary_type(name))
+        if len(regions) == 0:
+            raise error.RegionFinderError('No regions of table {} in {} of {}'.format(self.table_name, self.META_TABLE, self.rest_url))
+        for server in regions:
+            regions[server].sort(key=lambda info: info[3])
+        self._regions = regions
+        logger.info('Read {} regions of {} region servers from {} in {} requests'.format(
+            sum(len(rows) for rows in regions.values()), len(regions), self.META_TABLE, self.last_scan_requests))
+        return OrderedDict((server, fingerprints[server].hexdigest()) for server in sorted(regions))
+
+    def get_regions(self, region_servers):
+        return dict((server, self._regions[server]) for server in region_servers if server in self._regions)
+
+    # The web UI URL of a region server, from its host:port in info:server
+    def _server_url(self, server):
+        host, _, port = server.rpartition(':')
+        try:
+            info_port = self.info_port or int(port) + self.INFO_PORT_OFFSET
+        except ValueError:
+            raise error.RegionFinderError('info:server {} is not a host:port'.format(server))
+        return 'http://{}:{}/'.format(host, info_port)
+
+    # Yields a {'key': row, column: value} dict for every row of the table in hbase:meta, in row order.
+    # A page holds batch_size rows worth of cells, and may end in the middle of a row, so the cells of a row are
+    #   collected until a page starts another row
+    def _iter_region_rows(self):
+        self.last_scan_requests = 0
+        prefix = binary_type(self.table_name + ',')
+        scanner = {
+            'startRow': _encode(prefix),
+            'endRow': _encode(prefix_successor(prefix)),
+            'column': [_encode(column) for column in self.COLUMNS],
+            'batch': self.batch_size * len(self.COLUMNS),
+        }
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        resp = self.transport.post('{}/{}/scanner'.format(self.rest_url, self.META_TABLE), data=json.dumps(scanner),
+                                   headers=headers, timeout=self.timeout)
+        self.last_scan_requests += 1
+        if resp.status_code != 201 or 'Location' not in resp.headers:
+            raise error.RegionFinderError('Could not open a scanner of {} on {}: HTTP {}'.format(self.META_TABLE, self.rest_url, resp.status_code))
+        scanner_url = resp.headers['Location']
+        # Every cell names its column, and there are only a few of them
+        columns = {}
+        try:
+            row = None
+            while True:
+                resp = self.transport.get(scanner_url, headers={'Accept': 'application/json'}, timeout=self.timeout)
+                self.last_scan_requests += 1
+                # The scanner is exhausted
+                if resp.status_code == 204:
+                    break
+                resp.raise_for_status()
+                for cell_row in resp.json().get('Row', []):
+                    key = _decode(cell_row['key'])
+                    if row is not None and row['key'] != key:
+                        if b'info:regioninfo' in row:
+                            yield row
+                        row = None
+                    if row is None:
+                        row = {'key': key}
+                    for cell in cell_row.get('Cell', []):
+                        column = columns.get(cell['column'])
+                        if column is None:
+                            column = columns[cell['column']] = _decode(cell['column'])
+                        row[column] = _decode(cell['$'])
+            if row is not None and b'info:regioninfo' in row:
+                yield row
+        finally:
+            self.last_scan_requests += 1
+            try:
+                self.transport.delete(scanner_url, timeout=self.timeout)
+            except Exception as err:
+                # The gateway drops idle scanners by itself
+                logger.warning('Could not close scanner {}: {}'.format(scanner_url, err))
+
+def _encode(value):
+    return base64.b64encode(value).decode('ascii')
+
+def _decode(value):
+    return binascii.a2b_base64(value)
+
+# Serialized HBase protobuf messages start with this
+PB_MAGIC = b'PBUF'
+
+def parse_region_info(value):
+    '''
+    Decodes the info:regioninfo cell of hbase:meta, the RegionInfo message of HBase.proto after the PB_MAGIC prefix:
+    region_id = 1, table_name = 2, start_key = 3, end_key = 4, offline = 5, split = 6, replica_id = 7.
+    Returns a dict of those fields but table_name, which the row key of hbase:meta already tells, with blank keys as b''.
+    '''
+    if not value.startswith(PB_MAGIC):
+        raise error.RegionFinderError('info:regioninfo is not a protobuf RegionInfo, HBase 0.96 or later is required')
+    region_info = {'region_id': None, 'start_key': b'', 'end_key': b'', 'offline': False, 'split': False, 'replica_id': 0}
+    for number, field in _iter_fields(bytearray(value[len(PB_MAGIC):])):
+        if number == 1:
+            region_info['region_id'] = field
+        elif number == 3:
+            region_info['start_key'] = field
+        elif number == 4:
+            region_info['end_key'] = field
+        elif number == 5:
+            region_info['offline'] = bool(field)
+        elif number == 6:
+            region_info['split'] = bool(field)
+        elif number == 7:
+            region_info['replica_id'] = field
+    return region_info
+
+# Yields the (field number, value) pairs of a protobuf message. Varints are ints, length-delimited fields bytes
+def _iter_fields(data):
+    position = 0
+    end = len(data)
+    while position < end:
+        # Field keys and most lengths are single byte varints
+        key = data[position]
+        if key < 0x80:
+            position += 1
+        else:
+            key, position = _read_varint(data, position)
+        wire_type = key & 7
+        if wire_type == 0:
+            value, position = _read_varint(data, position)
+        elif wire_type == 2:
+            length = data[position] if position < end else 0x80
+            if length < 0x80:
+                position += 1
+            else:
+                length, position = _read_varint(data, position)
+            value = bytes(data[position:position + length])
+            position += length
+        elif wire_type == 1:
+            value = bytes(data[position:position + 8])
+            position += 8
+        elif wire_type == 5:
+            value = bytes(data[position:position + 4])
+            position += 4
+        else:
+            raise error.RegionFinderError('Unsupported protobuf wire type {}'.format(wire_type))
+        if position > end:
+            raise error.RegionFinderError('Truncated protobuf message')
+        yield key >> 3, value
+
+def _read_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise error.RegionFinderError('Truncated protobuf message')
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+# The region source configured with hbaseMaster.restEndpoint, or None to only scrape the status pages
+def from_config(config, transport):
+    if not config.hbase_rest_url:
+        return None
+    return MetaScanSource(config.hbase_rest_url, config.hbase_table_name, transport,
+                          timeout=(config.hbase_connect_timeout, config.hbase_read_timeout), batch_size=config.hbase_meta_batch_size,
+                          info_port=config.hbase_info_port)
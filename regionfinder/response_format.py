@@ -0,0 +1,131 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import hashlib
+import json
+import zlib
+from regionfinder import error
+
+# Response formats of /region, /range and /series: the HTML table, one JSON document, or NDJSON with one object per
+#   region, streamed as the regions are resolved
+CONTENT_TYPES = {
+    'html': 'text/html',
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+MEDIA_TYPES = {
+    'text/html': 'html',
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    '*/*': 'html',
+}
+
+# Splits an Accept or Accept-Encoding header into its values, most preferred first. Values with q=0 are left out
+def _parse_quality_list(header):
+    values = []
+    for position, item in enumerate((header or '').split(',')):
+        parts = item.strip().split(';')
+        quality = 1.0
+        for parameter in parts[1:]:
+            name, _, value = parameter.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if parts[0] and quality > 0:
+            values.append((-quality, position, parts[0].strip().lower()))
+    return [value for _, _, value in sorted(values)]
+
+def choose_format(requested, accept):
+    '''
+    Returns the format of a response: the format= parameter when given, otherwise the most preferred media type of the
+    Accept header that is served, and html when there is none
+    '''
+    if requested:
+        if requested not in CONTENT_TYPES:
+            raise error.RegionFinderError('Unknown format {}, expected one of {}'.format(requested, ', '.join(sorted(CONTENT_TYPES))))
+        return requested
+    for media_type in _parse_quality_list(accept):
+        if media_type in MEDIA_TYPES:
+            return MEDIA_TYPES[media_type]
+    return 'html'
+
+def accepts_gzip(accept_encoding):
+    return 'gzip' in _parse_quality_list(accept_encoding)
+
+def etag(region_map_updated, response_format, rs_infos):
+    '''
+    Weak ETag of a result: it changes with the region map it was looked up in, and with the regions themselves, so a
+    result that is looked up again with the same outcome keeps its ETag
+    '''
+    digest = hashlib.sha1(json.dumps([region_map_updated, response_format, rs_infos]).encode('utf-8')).hexdigest()
+    return 'W/"{}"'.format(digest[:32])
+
+def etag_matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    # If-None-Match uses the weak comparison
+    return '*' in candidates or any(candidate.replace('W/', '', 1) == tag.replace('W/', '', 1) for candidate in candidates)
+
+def to_json_object(rs_info):
+    row = {'regionServer': rs_info[0], 'regionName': rs_info[1]}
+    if len(rs_info) > 2:
+        row['series'] = rs_info[2]
+    return row
+
+def to_json(rs_infos, query):
+    return json.dumps({'query': query, 'regions': [to_json_object(rs_info) for rs_info in rs_infos]})
+
+def to_ndjson(rs_infos):
+    return ''.join(json.dumps(to_json_object(rs_info)) + '\n' for rs_info in rs_infos)
+
+class ChunkedWriter(object):
+    '''Writes a body of unknown length to out, in HTTP/1.1 chunks when chunked, as is otherwise'''
+    def __init__(self, out, chunked):
+        self.out = out
+        self.chunked = chunked
+
+    def write(self, data):
+        if len(data) == 0:
+            return
+        if self.chunked:
+            self.out.write('{:x}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+        else:
+            self.out.write(data)
+
+    def flush(self):
+        self.out.flush()
+
+    def close(self):
+        if self.chunked:
+            self.out.write(b'0\r\n\r\n')
+        self.out.flush()
+
+class GzipWriter(object):
+    '''Gzips what is written to another writer. flush() sends everything written so far, so that a stream never stalls'''
+    def __init__(self, out, level=6):
+        self.out = out
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, data):
+        self.out.write(self._compressor.compress(data))
+
+    def flush(self):
+        self.out.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.out.flush()
+
+    def close(self):
+        self.out.write(self._compressor.flush())
+        self.out.close()
+
+def gzip_bytes(data, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
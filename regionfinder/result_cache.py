@@ -0,0 +1,67 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+class ResultCache(object):
+    '''
+    Thread-safe LRU cache with a size bound and a TTL.
+
+    Every entry is tagged with the region map generation it was computed from. Looking it up with any other
+    generation counts as a miss and drops the entry, so a region map refresh invalidates every older answer.
+    '''
+    def __init__(self, max_entries=1024, ttl_seconds=60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, entry_generation, expires_at = entry
+            if entry_generation != generation or time.time() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            # Move the entry to the most recently used end
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            return value
+
+    def put(self, key, generation, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, generation, time.time() + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRatio': float(self.hits) / lookups if lookups > 0 else 0.0,
+            }
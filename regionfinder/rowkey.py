@@ -0,0 +1,73 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import binascii
+
+# Rowkeys and region keys are raw bytes, compared the way HBase compares them. Hex only appears where keys enter
+#   (TSUIDs from TSDB, legacy caches) or leave (messages) the process
+
+class _KeyMax(object):
+    '''Greater than every bytes key. Stands for the blank stop key of the last region of a table'''
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return other is self
+
+    def __gt__(self, other):
+        return other is not self
+
+    def __ge__(self, other):
+        return True
+
+    def __eq__(self, other):
+        return other is self
+
+    def __ne__(self, other):
+        return other is not self
+
+    def __hash__(self):
+        return hash(_KeyMax)
+
+    def __reduce__(self):
+        return 'KEY_MAX'
+
+    def __repr__(self):
+        return 'KEY_MAX'
+
+# A blank start key sorts before every rowkey, and a blank stop key after every rowkey
+KEY_MIN = b''
+KEY_MAX = _KeyMax()
+
+# Keys of caches written by older versions, which stored them as uppercase hexstrings with these sentinels
+LEGACY_BLANK_START = '0'
+LEGACY_BLANK_STOP = 'Z'
+
+def from_legacy_hex(hexstring):
+    if hexstring == LEGACY_BLANK_START:
+        return KEY_MIN
+    if hexstring == LEGACY_BLANK_STOP:
+        return KEY_MAX
+    return binascii.unhexlify(hexstring)
+
+# Smallest key that is greater than every key starting with prefix
+def prefix_successor(prefix):
+    successor = bytearray(prefix)
+    while len(successor) > 0 and successor[-1] == 0xFF:
+        successor.pop()
+    if len(successor) == 0:
+        return KEY_MAX
+    successor[-1] += 1
+    return bytes(successor)
+
+def to_hex(key):
+    if key is KEY_MAX:
+        return repr(KEY_MAX)
+    return binascii.hexlify(key).decode('ascii').upper()
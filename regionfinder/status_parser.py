@@ -0,0 +1,165 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import binascii
+import re
+from collections import deque
+try:
+    from html.parser import HTMLParser
+    from html.entities import name2codepoint
+except ImportError:
+    from HTMLParser import HTMLParser
+    from htmlentitydefs import name2codepoint
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'])
+
+# HBase renders keys with Bytes.toStringBinary, which keeps [A-Za-z0-9] and " `~!@#$%^&*()-_=+[]{}|;:'\",.<>/?" as-is
+#   and writes every other byte as "\x" followed by two hex digits. A literal "\" (0x5C) is therefore always shown as "\x5C",
+#   so a "\x" followed by two hex digits is never ambiguous.
+ESCAPED_BYTE = re.compile(r'\\x([0-9A-Fa-f]{2})')
+
+class StatusPageParser(HTMLParser):
+    '''
+    Incremental parser for the HBase master and region server status pages.
+
+    Only the table inside div#<table_div_id> is collected, one row at a time, without building a DOM. Completed rows
+    are appended to `rows` as lists of (text, href) cells, where href is the first link inside the cell. <th> cells are
+    kept apart: the first row made of them becomes `header`, and rows without any <td> are not emitted. The h1 of
+    div.page-header and any h4 inside a <section> are kept as well, since that is where a backup master links to the
+    active one.
+    '''
+    def __init__(self, table_div_id):
+        HTMLParser.__init__(self)
+        self.table_div_id = table_div_id
+        self.rows = deque()
+        self.header = None
+        self.page_headers = []
+        self.section_headers = []
+        self._stack = []
+        self._table_depth = None
+        self._row = None
+        self._row_header = None
+        self._cell = None
+        self._heading = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'a':
+            for target in (self._cell, self._heading):
+                if target is not None and target[1] is None:
+                    target[1] = attrs.get('href')
+        if tag in VOID_TAGS:
+            return
+        # Cells and rows are not always closed explicitly
+        if tag in ('td', 'th', 'tr') and self._cell is not None:
+            self._end_cell()
+        if tag == 'tr' and self._row is not None:
+            self._end_row()
+
+        if tag == 'div' and self._table_depth is None and attrs.get('id') == self.table_div_id:
+            self._table_depth = len(self._stack)
+        elif self._table_depth is not None:
+            if tag == 'tr':
+                self._row = []
+                self._row_header = []
+            elif tag in ('td', 'th') and self._row is not None:
+                self._cell = ['', None, tag]
+        if tag == 'h1' and self._inside('div', 'page-header') or tag == 'h4' and self._inside('section'):
+            self._heading = ['', None, tag]
+        self._stack.append((tag, attrs.get('class', '') or ''))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag not in [open_tag for open_tag, _ in self._stack]:
+            return
+        while len(self._stack) > 0:
+            open_tag, _ = self._stack.pop()
+            self._close(open_tag)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell[0] += data
+        if self._heading is not None:
+            self._heading[0] += data
+
+    # Only called when the parser does not convert character references itself (Python 2)
+    def handle_entityref(self, name):
+        if name in name2codepoint:
+            self.handle_data(unichr(name2codepoint[name]))
+        else:
+            self.handle_data('&' + name + ';')
+
+    def handle_charref(self, name):
+        if name.lower().startswith('x'):
+            self.handle_data(unichr(int(name[1:], 16)))
+        else:
+            self.handle_data(unichr(int(name)))
+
+    def _close(self, tag):
+        if tag in ('td', 'th') and self._cell is not None:
+            self._end_cell()
+        elif tag == 'tr' and self._row is not None:
+            self._end_row()
+        elif tag in ('h1', 'h4') and self._heading is not None and self._heading[2] == tag:
+            text, href, _ = self._heading
+            if tag == 'h1':
+                self.page_headers.append(text)
+            else:
+                self.section_headers.append((text, href))
+            self._heading = None
+        if self._table_depth is not None and len(self._stack) <= self._table_depth:
+            self._table_depth = None
+
+    def _end_cell(self):
+        text, href, tag = self._cell
+        if tag == 'td':
+            self._row.append((text, href))
+        else:
+            self._row_header.append(text.strip())
+        self._cell = None
+
+    def _end_row(self):
+        if len(self._row) > 0:
+            self.rows.append(self._row)
+        elif len(self._row_header) > 0 and self.header is None:
+            self.header = self._row_header
+        self._row = None
+
+    def _inside(self, tag, css_class=None):
+        for open_tag, classes in self._stack:
+            if open_tag == tag and (css_class is None or css_class in classes.split()):
+                return True
+        return False
+
+# Feeds text chunks to the parser and yields each table row as soon as it is complete
+def iter_rows(parser, chunks):
+    for chunk in chunks:
+        parser.feed(chunk)
+        while len(parser.rows) > 0:
+            yield parser.rows.popleft()
+    parser.close()
+    while len(parser.rows) > 0:
+        yield parser.rows.popleft()
+
+# Converts a key as displayed by the HBase UI into its raw bytes, eg. "\x00\x12M\xCEW" into b"\x00\x12M\xceW".
+# Runs of unescaped characters are encoded in one call rather than one character at a time
+def dirtystring_to_bytes(dirty_string):
+    pieces = ESCAPED_BYTE.split(dirty_string)
+    for i in range(0, len(pieces), 2):
+        pieces[i] = pieces[i].encode('latin-1')
+    for i in range(1, len(pieces), 2):
+        pieces[i] = binascii.unhexlify(pieces[i])
+    return b''.join(pieces)
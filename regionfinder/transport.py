@@ -0,0 +1,104 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import codecs
+from threading import Lock
+
+CHUNK_SIZE = 64*1024
+
+class HTTPTransport(object):
+    '''
+    Pooled keep-alive HTTP session shared by TSDBClient and HBaseUIClient.
+
+    Connection failures and 502/503/504 responses are retried here with exponential backoff. Read timeouts are not,
+    since a server that is slow to answer is usually still slow on the next attempt; callers decide whether to retry those.
+    Callers that retry every failure themselves pass retry=False, so that the two retry counts do not multiply.
+
+    requests is only imported, and the session only built, when the first request is sent, so that a run answered
+    from the region cache alone never loads the HTTP stack.
+    '''
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(self, pool_size=10, host_pools=512, connect_timeout=5, read_timeout=30, retries=2, backoff_factor=0.5):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.host_pools = host_pools
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._session = None
+        self._session_without_retries = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(pool_size=config.http_pool_size, host_pools=config.http_host_pools,
+                   connect_timeout=config.http_connect_timeout, read_timeout=config.http_read_timeout,
+                   retries=config.http_retries, backoff_factor=config.http_backoff_factor)
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session(self.retries)
+        return self._session
+
+    # Session that sends every request once, for callers that retry on their own
+    @property
+    def session_without_retries(self):
+        if self._session_without_retries is None:
+            with self._lock:
+                if self._session_without_retries is None:
+                    self._session_without_retries = self._create_session(0)
+        return self._session_without_retries
+
+    def get(self, url, retry=True, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.session if retry else self.session_without_retries
+        return session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.delete(url, **kwargs)
+
+    def close(self):
+        for session in (self._session, self._session_without_retries):
+            if session is not None:
+                session.close()
+
+    def _create_session(self, retries):
+        import requests
+        from requests.adapters import HTTPAdapter
+        try:
+            from urllib3.util.retry import Retry
+        except ImportError:
+            from requests.packages.urllib3.util.retry import Retry
+        retry = Retry(total=retries, connect=retries, read=0, status=retries,
+                      backoff_factor=self.backoff_factor, status_forcelist=self.RETRY_STATUSES, raise_on_status=False)
+        # host_pools is the number of per-host connection pools kept alive at once, pool_size the connections kept per host
+        adapter = HTTPAdapter(pool_connections=self.host_pools, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+# Decodes the streamed body of a requests response without holding all of it in memory
+def iter_text(resp, chunk_size=CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder(resp.encoding or 'utf-8')(errors='replace')
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', True)
+    if text:
+        yield text
@@ -6,42 +6,331 @@
 
 '''
 
-import requests
-from regionfinder import error
+import binascii
+import re
+import struct
+import time
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+from regionfinder import error, json_stream, metrics
+from regionfinder.rowkey import prefix_successor
+from regionfinder.transport import HTTPTransport, iter_text
+from regionfinder.util import logger
+
+# Relative time units of OpenTSDB, see http://opentsdb.net/docs/build/html/user_guide/query/dates.html
+TIME_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 60*60, 'd': 60*60*24, 'w': 60*60*24*7, 'n': 60*60*24*30, 'y': 60*60*24*365}
+RELATIVE_TIME = re.compile(r'^(\d+)(ms|s|m|h|d|w|n|y)-ago$')
+# Absolute date formats of OpenTSDB, yyyy/MM/dd[-HH:mm[:ss]] with a dash or a space before the time
+ABSOLUTE_TIME_FORMATS = ('%Y/%m/%d-%H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d-%H:%M', '%Y/%m/%d %H:%M', '%Y/%m/%d')
+
+# Resolves a TSDB relative time-string ("1h-ago", "now"), absolute epoch time (in seconds or milliseconds) or
+#   absolute date ("2018/01/01-00:00:00", in local time like OpenTSDB does by default) to epoch seconds
+def parse_tsdb_time(time_string, now=None):
+    now = int(time.time()) if now is None else now
+    time_string = str(time_string).strip()
+    if time_string == 'now':
+        return now
+    relative = RELATIVE_TIME.match(time_string)
+    if relative is not None:
+        return int(now - int(relative.group(1)) * TIME_UNITS[relative.group(2)])
+    if time_string.isdigit():
+        # 13 digit epochs are in milliseconds
+        return int(time_string) // 1000 if len(time_string) > 10 else int(time_string)
+    for time_format in ABSOLUTE_TIME_FORMATS:
+        try:
+            return int(time.mktime(time.strptime(time_string, time_format)))
+        except ValueError:
+            pass
+    raise error.RegionFinderError('Unsupported TSDB time: {}'.format(time_string))
+
+# Normalises a metric expression so that equivalent spellings compare equal: without surrounding whitespace, and with
+#   the tag filters in braces sorted. The expression must already be URL-decoded, eg. by parse_qsl
+def normalize_expression(expression):
+    expression = expression.strip()
+    normalized = []
+    for part in re.split(r'(\{[^}]*\})', expression):
+        if part.startswith('{') and part.endswith('}'):
+            part = '{' + ','.join(sorted(tag.strip() for tag in part[1:-1].split(',') if tag.strip())) + '}'
+        normalized.append(part.strip())
+    return ''.join(normalized)
 
 class TSDBClient:
     PARAMS = {
         'show_tsuids': 'true'
     }
-    def __init__(self, instance_url, metric_width, salt_width):
+    ROW_SECONDS = 60*60
+    # query: sums the metric from the start time until now, and uses the row hour of the earliest returned datapoint
+    #   as the rowkey time
+    # hour: only asks for the single row hour that contains the start time, collapsed into one datapoint per query.
+    #   The row base time is computed locally, so TSDB reads at most an hour of datapoints and returns no timeline
+    TSUID_SOURCES = ('query', 'hour')
+
+    def __init__(self, instance_url, metric_width, salt_width, transport=None, tsuid_source='query', salt_buckets=20):
+        if tsuid_source not in self.TSUID_SOURCES:
+            raise error.RegionFinderError('Unknown TSUID source {}, expected one of: {}'.format(tsuid_source, ', '.join(self.TSUID_SOURCES)))
         self.instance_url = instance_url
-        self.pretag_length = salt_width*2 + metric_width*2
+        self.transport = transport if transport is not None else HTTPTransport()
+        self.metric_width = metric_width
+        self.salt_width = salt_width
+        self.salt_buckets = salt_buckets
+        self.pretag_length = salt_width + metric_width
+        self.tsuid_source = tsuid_source
+        # Metric name -> UID bytes. UIDs never change once assigned, so each name is only looked up once
+        self.metric_uids = {}
 
-    # Rowkey format: <metric_uid 6B><timestamp 4B><tagk1><tagv1>[...<tagkN><tagvN>]
+    # Rowkey format: [<salt>]<metric_uid><timestamp 4B><tagk1><tagv1>[...<tagkN><tagvN>], as bytes.
+    #   TSUIDs are the same without the timestamp, as hexstrings
     def get_rowkeys_of(self, metric_name, start_time='1h-ago'):
-        timestamp, tsuids = self._query(metric_name, start_time)
-        ets = self._get_encoded_timestamp(timestamp)
-        return [uid[:self.pretag_length] + ets + uid[self.pretag_length:] for uid in tsuids]
+        return list(self.iter_rowkeys_of(metric_name, start_time))
+
+    # Same rowkeys as get_rowkeys_of, generated while the TSDB response is still being read. Errors are raised
+    #   when the generator is consumed
+    def iter_rowkeys_of(self, metric_name, start_time='1h-ago'):
+        if self.tsuid_source == 'hour':
+            return self._iter_row_hour(metric_name, start_time)
+        return self._iter_query(metric_name, start_time)
+
+    # Every row of a metric between two times lies, in each salt bucket, in the key span
+    #   [<salt><metric_uid><first row hour>, <salt><metric_uid><last row hour + 1>)
+    # Returns those [start, stop) spans without querying any datapoints. The metric UID is looked up by name unless it
+    #   is given as a hexstring. Tags come after the timestamp in rowkeys, so spans always cover every series of the metric
+    def get_key_spans_of(self, metric_name, start_time='1h-ago', end_time='now', metric_uid=None):
+        if metric_uid is not None:
+            try:
+                uid = binascii.unhexlify(metric_uid)
+            except (TypeError, ValueError):
+                # binascii.Error is a ValueError, py27 raises a TypeError
+                raise error.RegionFinderError('Metric UID {} is not a hexstring'.format(metric_uid))
+            if len(uid) != self.metric_width:
+                raise error.RegionFinderError('Metric UID {} is not {} bytes wide'.format(metric_uid, self.metric_width))
+        elif '{' in metric_name:
+            raise error.RegionFinderError('Key spans cover every series of a metric, tag filters are not supported: {}'.format(metric_name))
+        else:
+            uid = self.get_metric_uid(metric_name)
+        first_hour, last_hour, _ = self._row_hours(start_time, end_time)
+        spans = []
+        for salt in self._salts():
+            prefix = salt + uid
+            spans.append((prefix + self._get_encoded_timestamp(first_hour), prefix_successor(prefix + self._get_encoded_timestamp(last_hour))))
+        return spans
+
+    # Series of a metric between two times, as the (prefix, row_times, suffixes) groups region_index.count_series
+    #   takes: prefix is the salt and metric UID, row_times the encoded base time of every row hour of the window and
+    #   suffixes the sorted tags of the series with that prefix. A single datapoint per series is asked for, so the
+    #   response size does not depend on the length of the window
+    def get_row_groups_of(self, metric_name, start_time='1h-ago', end_time='now'):
+        first_hour, last_hour, end = self._row_hours(start_time, end_time)
+        qs_dict = self.PARAMS.copy()
+        qs_dict['start'] = str(first_hour)
+        qs_dict['end'] = str(end)
+        qs_dict['no_annotations'] = 'true'
+        qs_dict['m'] = 'sum:0all-count:' + metric_name
+        groups = {}
+        for kind, value in self._iter_query_result(metric_name, qs_dict):
+            if kind == 'tsuid':
+                uid = binascii.unhexlify(value)
+                groups.setdefault(uid[:self.pretag_length], set()).add(uid[self.pretag_length:])
+        if len(groups) == 0:
+            raise error.RegionFinderError('No TSUIDs found in TSDB response')
+        row_times = [self._get_encoded_timestamp(hour) for hour in range(first_hour, last_hour + 1, self.ROW_SECONDS)]
+        return [(prefix, row_times, sorted(groups[prefix])) for prefix in sorted(groups)]
+
+    # Resolves a metric name to its UID with a lookup limited to the first matching series
+    def get_metric_uid(self, metric_name):
+        uid = self.metric_uids.get(metric_name)
+        if uid is not None:
+            return uid
+        with metrics.phase('tsdb'):
+            resp = self.transport.get(self.instance_url + '/api/search/lookup?' + urlencode([('limit', '1'), ('m', metric_name)]))
+        try:
+            results = resp.json().get('results')
+        except (ValueError, AttributeError):
+            results = None
+        if not results:
+            raise error.RegionFinderError('Could not resolve the UID of metric {}'.format(metric_name))
+        uid = binascii.unhexlify(results[0]['tsuid'])[:self.metric_width]
+        self.metric_uids[metric_name] = uid
+        return uid
 
-    def _query(self, metric_name, start_time):
+    # Returns the base times of the first and last rows between two times, and the end time itself
+    def _row_hours(self, start_time, end_time):
+        start = parse_tsdb_time(start_time)
+        end = parse_tsdb_time(end_time)
+        if end < start:
+            raise error.RegionFinderError('End time {} is before start time {}'.format(end_time, start_time))
+        return start - start % self.ROW_SECONDS, end - end % self.ROW_SECONDS, end
+
+    # Salt prefixes of every bucket, see RowKey.getSaltBytes of OpenTSDB
+    def _salts(self):
+        if self.salt_width == 0:
+            return [b'']
+        return [struct.pack('>Q', bucket)[-self.salt_width:] for bucket in range(self.salt_buckets)]
+
+    # Queries several metrics at once, with one m= sub-query per metric in each request. Returns, in the same order as
+    #   metric_names, either the rowkeys of each metric or the error its query ran into. TSDB rejects a whole request
+    #   when one sub-query is invalid (eg. an unknown metric), in which case every metric is queried on its own
+    def get_rowkeys_of_many(self, metric_names, start_time='1h-ago'):
+        metric_names = list(metric_names)
+        if len(metric_names) > 1:
+            try:
+                return self._query_many(metric_names, start_time)
+            except error.RegionFinderError as err:
+                logger.info('Querying {} metrics one at a time: {}'.format(len(metric_names), err))
+        results = []
+        for metric_name in metric_names:
+            try:
+                results.append(self.get_rowkeys_of(metric_name, start_time))
+            except error.RegionFinderError as err:
+                results.append(err)
+        return results
+
+    def _iter_query(self, metric_name, start_time):
         qs_dict = self.PARAMS.copy()
         qs_dict['start'] = start_time
         qs_dict['m'] = 'sum:' + metric_name
-        qs = '&'.join([k + '=' + qs_dict[k] for k in qs_dict])
-        resp = requests.get(self.instance_url + '/api/query?' + qs)
-        query_result = resp.json()
-        if isinstance(query_result, dict) or len(query_result) == 0:
-            raise error.RegionFinderError('No results from TSDB for metric: {}'.format(metric_name))
-        metric = query_result[0]
-        if metric.get('dps') is None or len(metric.get('dps')) == 0:
-            raise error.RegionFinderError('No datapoints for metric {} at time {}'.format(metric, start_time))
-        if metric.get('tsuids') is None or len(metric.get('tsuids')) == 0:
+        # TSDB writes the TSUIDs before the datapoints, so they are held (as strings) until the earliest timestamp is known.
+        #   The datapoints themselves are only compared, never kept
+        tsuids = []
+        timestamp = None
+        for kind, value in self._iter_query_result(metric_name, qs_dict):
+            if kind == 'tsuid':
+                tsuids.append(value)
+            elif timestamp is None or int(value) < timestamp:
+                timestamp = int(value)
+        if timestamp is None:
+            raise error.RegionFinderError('No datapoints for metric {} at time {}'.format(metric_name, start_time))
+        if len(tsuids) == 0:
+            raise error.RegionFinderError('No TSUIDs found in TSDB response')
+        for rowkey in self._iter_rowkeys(tsuids, timestamp):
+            yield rowkey
+
+    # Rows of OpenTSDB hold one hour of a series, starting at a multiple of an hour. Querying exactly that hour
+    #   returns the series that have a row there. The row base time is known up front, so every TSUID is turned into
+    #   a rowkey as soon as it is read
+    def _iter_row_hour(self, metric_name, start_time):
+        timestamp, qs_dict = self._row_hour_params(start_time)
+        qs_dict['m'] = 'sum:0all-count:' + metric_name
+        found = False
+        for kind, value in self._iter_query_result(metric_name, qs_dict):
+            if kind == 'tsuid':
+                found = True
+                for rowkey in self._iter_rowkeys([value], timestamp):
+                    yield rowkey
+        if not found:
             raise error.RegionFinderError('No TSUIDs found in TSDB response')
 
-        timestamp = min(metric['dps'])
-        tsuids = metric['tsuids']
-        return timestamp, tsuids
+    def _row_hour_params(self, start_time):
+        timestamp = parse_tsdb_time(start_time)
+        timestamp -= timestamp % self.ROW_SECONDS
+        qs_dict = self.PARAMS.copy()
+        qs_dict['start'] = str(timestamp)
+        qs_dict['end'] = str(timestamp + self.ROW_SECONDS - 1)
+        qs_dict['no_annotations'] = 'true'
+        return timestamp, qs_dict
+
+    # Datapoints are stored in the row of their hour, so the timestamp is rounded down to the row base time
+    def _iter_rowkeys(self, tsuids, timestamp):
+        ets = self._get_encoded_timestamp(timestamp - timestamp % self.ROW_SECONDS)
+        for tsuid in tsuids:
+            uid = binascii.unhexlify(tsuid)
+            yield uid[:self.pretag_length] + ets + uid[self.pretag_length:]
+
+    # show_query makes TSDB echo each result's sub-query, whose index says which m= the result belongs to. As for a
+    #   single metric, the TSUIDs of every result of a sub-query are used, with its earliest datapoint
+    def _query_many(self, metric_names, start_time):
+        if self.tsuid_source == 'hour':
+            timestamp, qs_dict = self._row_hour_params(start_time)
+            sub_queries = ['sum:0all-count:' + metric_name for metric_name in metric_names]
+        else:
+            timestamp = None
+            qs_dict = self.PARAMS.copy()
+            qs_dict['start'] = start_time
+            sub_queries = ['sum:' + metric_name for metric_name in metric_names]
+        qs_dict['show_query'] = 'true'
+        qs_items = sorted(qs_dict.items()) + [('m', sub_query) for sub_query in sub_queries]
+        found = [None] * len(metric_names)
+        with metrics.phase('tsdb'):
+            resp = self.transport.get(self.instance_url + '/api/query?' + urlencode(qs_items), stream=True)
+        try:
+            reader = json_stream.JSONReader(metrics.timed_iter(iter_text(resp), 'tsdb'))
+            if reader.next_token()[0] != '[':
+                raise error.RegionFinderError('TSDB rejected the query of metrics: {}'.format(', '.join(metric_names)))
+            for token in reader.iter_elements():
+                if token[0] != '{':
+                    reader.skip_value(token)
+                    continue
+                index, tsuids, first_timestamp = None, [], None
+                for key in reader.iter_members():
+                    token = reader.next_token()
+                    if key == 'query' and token[0] == '{':
+                        index = reader.read_value(token).get('index')
+                    elif key == 'tsuids' and token[0] == '[':
+                        tsuids = list(reader.iter_strings())
+                    elif key == 'dps' and token[0] == '{':
+                        for dps_timestamp in reader.iter_keys():
+                            if first_timestamp is None or int(dps_timestamp) < first_timestamp:
+                                first_timestamp = int(dps_timestamp)
+                    else:
+                        reader.skip_value(token)
+                if isinstance(index, int) and 0 <= index < len(found):
+                    # A sub-query that groups by a tag has one result per group
+                    if found[index] is None:
+                        found[index] = (tsuids, first_timestamp)
+                    else:
+                        earliest = found[index][1]
+                        if earliest is None or (first_timestamp is not None and first_timestamp < earliest):
+                            earliest = first_timestamp
+                        found[index] = (found[index][0] + tsuids, earliest)
+        finally:
+            resp.close()
+
+        results = []
+        for metric_name, result in zip(metric_names, found):
+            if result is None:
+                results.append(error.RegionFinderError('No results from TSDB for metric: {}'.format(metric_name)))
+            elif timestamp is None and result[1] is None:
+                results.append(error.RegionFinderError('No datapoints for metric {} at time {}'.format(metric_name, start_time)))
+            elif len(result[0]) == 0:
+                results.append(error.RegionFinderError('No TSUIDs found in TSDB response'))
+            else:
+                results.append(list(self._iter_rowkeys(result[0], result[1] if timestamp is None else timestamp)))
+        return results
+
+    # Walks every result of a query while it is streamed, yielding ('tsuid', tsuid) for their TSUIDs and
+    #   ('dps', timestamp) for their datapoint timestamps in document order. Everything else is skipped
+    def _iter_query_result(self, metric_name, qs_dict):
+        # Time spent waiting on TSDB counts as the tsdb phase, decoding the response as the phase of the caller
+        with metrics.phase('tsdb'):
+            resp = self.transport.get(self.instance_url + '/api/query?' + urlencode(sorted(qs_dict.items())), stream=True)
+        try:
+            reader = json_stream.JSONReader(metrics.timed_iter(iter_text(resp), 'tsdb'))
+            # Errors come back as an object rather than an array of results
+            if reader.next_token()[0] != '[':
+                raise error.RegionFinderError('No results from TSDB for metric: {}'.format(metric_name))
+            # An expression that groups by a tag (eg. host=*) has one result per group, each with its own series
+            results = 0
+            for token in reader.iter_elements():
+                if token[0] != '{':
+                    reader.skip_value(token)
+                    continue
+                results += 1
+                for key in reader.iter_members():
+                    token = reader.next_token()
+                    if key == 'tsuids' and token[0] == '[':
+                        for tsuid in reader.iter_strings():
+                            yield ('tsuid', tsuid)
+                    elif key == 'dps' and token[0] == '{':
+                        for timestamp in reader.iter_keys():
+                            yield ('dps', timestamp)
+                    else:
+                        reader.skip_value(token)
+            if results == 0:
+                raise error.RegionFinderError('No results from TSDB for metric: {}'.format(metric_name))
+        finally:
+            resp.close()
 
     # Timestamp component of HB row key is a Unix epoch value in seconds encoded on 4 bytes
     def _get_encoded_timestamp(self, ts):
-        return "{0:08X}".format(int(ts))
+        return struct.pack('>I', int(ts))
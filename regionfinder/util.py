@@ -12,7 +12,8 @@ import os
 
 logger = logging.getLogger('regionfinder')
 logger.setLevel(logging.INFO)
-file_logger = logging.FileHandler(os.environ.get('REGION_FINDER_LOG', 'rf.log'))
+# The log file is only opened (and created) by the first record written to it, not when this module is imported
+file_logger = logging.FileHandler(os.environ.get('REGION_FINDER_LOG', 'rf.log'), delay=True)
 file_logger.setLevel(logging.INFO)
 stream_logger = logging.StreamHandler()
 stream_logger.setLevel(logging.WARNING)
@@ -0,0 +1,29 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import json
+
+# Streamed TSDB response of the tests that mock HTTPTransport.get
+class MockTSDBResponse:
+    encoding = 'utf-8'
+
+    def __init__(self, json_data):
+        self.json_data = json_data
+        self.closed = False
+
+    def json(self):
+        return self.json_data
+
+    # Small chunks, so that tokens straddle chunk boundaries
+    def iter_content(self, chunk_size=1):
+        body = json.dumps(self.json_data).encode('utf-8')
+        for i in range(0, len(body), 5):
+            yield body[i:i + 5]
+
+    def close(self):
+        self.closed = True
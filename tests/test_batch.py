@@ -0,0 +1,58 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import json
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+from regionfinder import batch, error
+
+class FakeTSDBClient:
+    def __init__(self):
+        self.batches = []
+
+    def get_rowkeys_of_many(self, metric_names, start_time='1h-ago'):
+        self.batches.append(list(metric_names))
+        if 'broken' in metric_names:
+            raise IOError('Connection refused')
+        return [error.RegionFinderError('No results') if name.startswith('missing') else [name.encode('ascii')] for name in metric_names]
+
+class FakeHBaseUIClient:
+    def get_regions_of_rowkeys(self, rowkeys):
+        return set(('rs-' + rowkey.decode('ascii')[0], 'region-' + rowkey.decode('ascii')) for rowkey in rowkeys)
+
+class TestBatch:
+    def test_read_expressions(self):
+        lines = ['sys.cpu.user\n', '\n', '# comment\n', '  sys.mem{host=a}  \n']
+        assert batch.read_expressions(lines) == ['sys.cpu.user', 'sys.mem{host=a}']
+
+    def test_resolve_expressions(self):
+        tsdb_client = FakeTSDBClient()
+        expressions = ['a1', 'missing.b', 'c1', 'd1', 'broken', 'e1']
+        results = list(batch.resolve_expressions(tsdb_client, FakeHBaseUIClient(), expressions, batch_size=2, concurrency=3))
+        assert sorted(tsdb_client.batches) == [['a1', 'missing.b'], ['broken', 'e1'], ['c1', 'd1']]
+        # Results come out in the order of the expressions, failures included
+        assert [expression for expression, _, _ in results] == expressions
+        assert results[0] == ('a1', [('rs-a', 'region-a1')], None)
+        assert results[1][1] is None and isinstance(results[1][2], error.RegionFinderError)
+        assert isinstance(results[4][2], IOError) and isinstance(results[5][2], IOError)
+
+    def test_writers(self):
+        results = [('a', [('rs1', 'r1'), ('rs2', 'r2')], None), ('b', None, error.RegionFinderError('No results'))]
+        out, err_out = StringIO(), StringIO()
+        assert batch.write_csv(results, out, err_out) == 1
+        assert out.getvalue() == 'metric,regionServer,regionName\na,rs1,r1\na,rs2,r2\n'
+        assert err_out.getvalue() == 'b: No results\n'
+
+        out, err_out = StringIO(), StringIO()
+        assert batch.write_ndjson(results, out, err_out) == 1
+        assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+            {'metric': 'a', 'regionServer': 'rs1', 'regionName': 'r1'},
+            {'metric': 'a', 'regionServer': 'rs2', 'regionName': 'r2'},
+            {'metric': 'b', 'error': 'No results'}]
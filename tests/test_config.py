@@ -23,3 +23,12 @@ class TestConfig:
         assert config.hbase_url is not None
         assert config.hbase_table_name is not None
         os.remove(self.FILEPATH)
+
+    def test_hbase_timeouts_default_to_http_ones(self):
+        with open(self.FILEPATH, 'w') as f:
+            f.write('tsdb:\n  endpoint: http://localhost:4242\n  metricWidth: 3\n  saltWidth: 0\n'
+                    'hbaseMaster:\n  endpoint: http://localhost:60010\n  tableName: tsdb\n  readTimeout: 10\n'
+                    'http:\n  connectTimeout: 2\n  readTimeout: 20\n')
+        config = Config(self.FILEPATH)
+        assert (config.hbase_connect_timeout, config.hbase_read_timeout) == (2, 10)
+        os.remove(self.FILEPATH)
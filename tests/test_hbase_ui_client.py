@@ -8,8 +8,11 @@
 
 import pytest
 import os
-from time import sleep
-from regionfinder import HBaseUIClient
+from time import sleep, time
+from collections import OrderedDict
+from regionfinder import HBaseUIClient, error
+from regionfinder.range_cache import write_range_cache
+from regionfinder.rowkey import KEY_MAX, KEY_MIN
 
 class MockHBaseUIResponse:
     master_status_html = r"""
@@ -37,11 +40,40 @@ class MockHBaseUIResponse:
             </table>
         </div>
         """
+    rs_status_4_column_html = r"""
+        <div class="tab-pane active" id="tab_regionBaseInfo">
+            <table class="table table-striped">
+            <tr><th>Region Name</th><th>Start Key</th><th>End Key</th><th>ReplicaID</th></tr>
+            <tr><td><a href="region.jsp?name=1">tsdb,,time.test1</a></td><td></td><td>\x00,\x10</td><td>0</td></tr>
+            <tr><td><a href="region.jsp?name=2">tsdb,\x00,\x10,time.test2</a></td><td>\x00,\x10</td><td></td><td>0</td></tr>
+            <tr><td><a href="region.jsp?name=3">other,,time.test3</a></td><td></td><td></td><td>0</td></tr>
+            </table>
+        </div>
+        """
+    backup_master_status_html = r"""
+        <div class="container-fluid content">
+            <div class="row inner_header"><div class="page-header"><h1>Backup Master <small>localhost</small></h1></div></div>
+            <section><h4>Current Active Master: <a href="//active-host:60010/master-status">active-host</a></h4></section>
+        </div>
+        """
 
     def __init__(self, text):
         self.text = text
+        self.encoding = 'utf-8'
+
+    # Hands out the body in small chunks so that rows and keys get split across chunk boundaries
+    def iter_content(self, chunk_size=1):
+        body = self.text.encode('utf-8')
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
 
-def get_side_effect(arg):
+def get_side_effect(arg, **kwargs):
     if 'master-status' in arg:
         return MockHBaseUIResponse(MockHBaseUIResponse.master_status_html)
     return MockHBaseUIResponse(MockHBaseUIResponse.rs_status_html)
@@ -50,18 +82,22 @@ class TestHBaseUIClient:
     @pytest.fixture
     def client(self, mocker):
         mocker.patch.object(HBaseUIClient, '_load_ranges_from_file', return_value=[])
-        mocker.patch('regionfinder.tsdb_client.requests.get', side_effect=get_side_effect)
+        mocker.patch('regionfinder.transport.HTTPTransport.get', side_effect=get_side_effect)
         return HBaseUIClient('', 'tsdb', autorefresh=False)
 
     def test_dirtystring_to_rowkey(self, client):
         dirty_and_clean_pairs = [
-            (u'x\x00\\','78005C'),
-            (u'\\\x00x','5C0078'),
-            (u'AA\x00\x00','41410000'),
-            (u'\x00\x00\x00\x00','00000000'),
-            (u'\x00AA\x00','00414100'),
-            (u'\x00\x00AA','00004141'),
-            (u'A\x00\x00A','41000041'),
+            (u'x\x00\\', b'x\x00\\'),
+            (u'\\\x00x', b'\\\x00x'),
+            (u'AA\x00\x00', b'AA\x00\x00'),
+            (u'\x00\x00\x00\x00', b'\x00\x00\x00\x00'),
+            (u'\x00AA\x00', b'\x00AA\x00'),
+            (u'\x00\x00AA', b'\x00\x00AA'),
+            (u'A\x00\x00A', b'A\x00\x00A'),
+            (r'\x00\x12M\xCEW', b'\x00\x12M\xceW'),
+            (r'\x5Cx41', b'\\x41'),
+            (r'\x5C\x78', b'\\x'),
+            (r'a\xzz', b'a\\xzz'),
         ]
         for dirty, clean in dirty_and_clean_pairs:
             assert client._dirtystring_to_rowkey(dirty) == clean
@@ -70,21 +106,96 @@ class TestHBaseUIClient:
         assert client._get_region_servers() == ['http://localhost:60030/']
 
     def test_get_and_query_region_ranges(self, mocker, client):
-        client._get_region_servers = mocker.MagicMock(return_value=[''])
+        client._get_region_server_fingerprints = mocker.MagicMock(return_value=OrderedDict([('', None)]))
+        client._flush_ranges_to_file = mocker.MagicMock(return_value=None)
+        assert list(client._get_region_ranges('')) == [
+            ('tsdb,time.test1', r'\x00\x00', r'ee'),
+            ('tsdb,time.test2', r'ee', r'\xAA\xAA'),
+            ('tsdb,time.test3', r'\xAA\xAA', r'\xFF\xFF')]
+        client._create_rs_range_list()
+        assert ('', 'tsdb,time.test1') == client.get_rs_of_rowkey(b'\x33\x33')
+        assert ('', 'tsdb,time.test2') == client.get_rs_of_rowkey(b'\xA1\xA1')
+        assert ('', 'tsdb,time.test3') == client.get_rs_of_rowkey(b'\xBB\xBB')
+
+    def test_get_region_ranges_of_4_column_layout(self, mocker, client):
+        client.transport.get = mocker.MagicMock(return_value=MockHBaseUIResponse(MockHBaseUIResponse.rs_status_4_column_html))
+        assert list(client._get_region_ranges('')) == [
+            ('tsdb,time.test1', None, r'\x00,\x10'),
+            ('tsdb,time.test2', r'\x00,\x10', None)]
+        # Scrapes are retried by _scrape_region_server only, with the timeouts of the transport
+        assert client.transport.get.call_args[1]['retry'] is False
+        assert client.transport.get.call_args[1]['timeout'] == client.transport.timeout
+
+    def test_get_region_server_fingerprints(self, client):
+        assert client._get_region_server_fingerprints() == OrderedDict([
+            ('http://localhost:60030/', 'localhost,60020,1544258234698|Sat Dec 08 08:37:14 GMT 2018|200')])
+
+    def test_update_rs_range_list(self, mocker, client):
+        client._flush_ranges_to_file = mocker.MagicMock(return_value=None)
+        regions = {
+            'rs1': [('tsdb,1.a', None, r'\x10')],
+            'rs2': [('tsdb,2.b', r'\x10', r'\x20')],
+            'rs3': [('tsdb,3.c', r'\x20', None)],
+        }
+        client._get_region_ranges = mocker.MagicMock(side_effect=lambda region_server: regions[region_server])
+        client._get_region_server_fingerprints = mocker.MagicMock(return_value=OrderedDict([('rs1', 'a'), ('rs2', 'b'), ('rs3', 'c')]))
+        client._create_rs_range_list()
+        assert client._get_region_ranges.call_count == 3
+
+        # rs2 split its region and rs3 went away
+        regions['rs2'] = [('tsdb,2.d', r'\x10', r'\x18'), ('tsdb,2.e', r'\x18', None)]
+        client._get_region_server_fingerprints = mocker.MagicMock(return_value=OrderedDict([('rs1', 'a'), ('rs2', 'b2')]))
+        client._get_region_ranges.reset_mock()
+        generation = client.generation
+        client._update_rs_range_list()
+        client._get_region_ranges.assert_called_once_with('rs2')
+        assert client.generation == generation + 1
+        assert [row[1] for row in client.rs_ranges] == ['tsdb,1.a', 'tsdb,2.d', 'tsdb,2.e']
+        assert client.get_rs_of_rowkey(b'\x1F') == ('rs2', 'tsdb,2.e')
+
+        # Nothing changed
+        generation = client.generation
+        client._get_region_ranges.reset_mock()
+        client._update_rs_range_list()
+        assert client._get_region_ranges.call_count == 0
+        assert client.generation == generation
+
+    def test_get_region_servers_from_backup_master(self, mocker, client):
+        def backup_side_effect(arg, **kwargs):
+            if 'active-host' in arg:
+                return MockHBaseUIResponse(MockHBaseUIResponse.master_status_html)
+            return MockHBaseUIResponse(MockHBaseUIResponse.backup_master_status_html)
+        client.transport.get = mocker.MagicMock(side_effect=backup_side_effect)
+        assert client._get_region_servers() == ['http://localhost:60030/']
+        assert client.master_url == 'http://active-host:60010'
+
+    def test_create_rs_range_list_with_failed_region_server(self, mocker, client):
+        client.RETRY_BACKOFF_SECONDS = 0
         client._flush_ranges_to_file = mocker.MagicMock(return_value=None)
-        assert client._get_region_ranges('') == [
-            ['tsdb,time.test1', r'\x00\x00', r'ee'],
-            ['tsdb,time.test2', r'ee', r'\xAA\xAA'],
-            ['tsdb,time.test3', r'\xAA\xAA', r'\xFF\xFF']]
+        client._get_region_server_fingerprints = mocker.MagicMock(return_value=OrderedDict([('rs1', None), ('rs2', None)]))
+        # tsdb,time.moved has moved from rs2 to rs1 since rs2 was last scraped
+        client.rs_ranges = [['rs2', 'tsdb,time.moved', KEY_MIN, b'\x50'], ['rs2', 'tsdb,time.old', b'\x50', KEY_MAX]]
+        def get_region_ranges(region_server):
+            if region_server == 'rs2':
+                raise IOError('Connection refused')
+            return [['tsdb,time.moved', None, r'\x50']]
+        client._get_region_ranges = mocker.MagicMock(side_effect=get_region_ranges)
         client._create_rs_range_list()
-        assert ('', 'tsdb,time.test1') == client.get_rs_of_rowkey('3333')
-        assert ('', 'tsdb,time.test2') == client.get_rs_of_rowkey('A1A1')
-        assert ('', 'tsdb,time.test3') == client.get_rs_of_rowkey('BBBB')
+        # The failed server is retried, and its previously known regions are kept, but for those overlapping a
+        #   region that was just scraped
+        assert client._get_region_ranges.call_count == 1 + client.scrape_retries + 1
+        assert client.failed_region_servers == ['rs2']
+        assert client.rs_ranges == [['rs1', 'tsdb,time.moved', KEY_MIN, b'\x50'], ['rs2', 'tsdb,time.old', b'\x50', KEY_MAX]]
+        assert client.get_rs_of_rowkey(b'\x10') == ('rs1', 'tsdb,time.moved')
+
+        client._get_region_ranges = mocker.MagicMock(side_effect=IOError('Connection refused'))
+        with pytest.raises(error.RegionFinderError):
+            client._create_rs_range_list()
 
     def test_load_and_flush_cache(self, mocker):
         rs_ranges = [
-            ['rs1', 'r1', '00', '88'],
-            ['rs2', 'r1', '88', 'FF']
+            ['rs1', 'r1', KEY_MIN, b'\x88'],
+            ['rs2', 'r1', b'\x88', KEY_MAX]
         ]
         HBaseUIClient.CACHE_FILENAME = mocker.PropertyMock(return_value='rf-test.csv')
         load_function = HBaseUIClient._load_ranges_from_file
@@ -99,6 +210,124 @@ class TestHBaseUIClient:
         assert client2.rs_ranges == rs_ranges
         os.remove(HBaseUIClient.CACHE_FILENAME)
 
+    def test_migrate_legacy_cache(self, mocker):
+        mocker.patch.object(HBaseUIClient, 'CACHE_FILENAME', 'rf-test.cache')
+        mocker.patch.object(HBaseUIClient, 'LEGACY_CACHE_FILENAME', 'rf-test-legacy.csv')
+        with open('rf-test-legacy.csv', 'w') as f:
+            f.write('{}\nrs1,r1,0,88\nrs2,r2,88,Z\n'.format(int(time())))
+        client = HBaseUIClient('', 'tsdb', autorefresh=False)
+        assert client.get_rs_of_rowkey(b'\x99') == ('rs2', 'r2')
+        assert client.rs_ranges == [['rs1', 'r1', KEY_MIN, b'\x88'], ['rs2', 'r2', b'\x88', KEY_MAX]]
+        # The migrated binary cache is used from now on
+        os.remove('rf-test-legacy.csv')
+        client2 = HBaseUIClient('', 'tsdb', autorefresh=False)
+        assert client2.get_rs_of_rowkey(b'\x00') == ('rs1', 'r1')
+        os.remove('rf-test.cache')
+
+    def test_refresh_publishes_the_new_map_at_once(self, mocker, client):
+        client._flush_ranges_to_file = mocker.MagicMock(return_value=None)
+        client.rs_ranges = [['rs1', 'tsdb,old', KEY_MIN, KEY_MAX]]
+        generation = client.generation
+        seen = []
+        regions = {'rs1': [('tsdb,new.1', None, r'\x50')], 'rs2': [('tsdb,new.2', r'\x50', None)]}
+        def get_region_ranges(region_server):
+            # Lookups made while the refresh is scraping still get the complete previous map
+            seen.append((client.get_rs_of_rowkey(b'\x50'), client.generation))
+            return regions[region_server]
+        client._get_region_ranges = mocker.MagicMock(side_effect=get_region_ranges)
+        client._get_region_server_fingerprints = mocker.MagicMock(return_value=OrderedDict([('rs1', 'a'), ('rs2', 'b')]))
+        client._create_rs_range_list()
+        assert seen == [(('rs1', 'tsdb,old'), generation)] * 2
+        assert client.generation == generation + 1
+        assert client.get_rs_of_rowkey(b'\x50') == ('rs2', 'tsdb,new.2')
+
+    def test_lookup_miss_rescrapes_the_servers_around_the_key(self, mocker, client):
+        client._flush_ranges_to_file = mocker.MagicMock(return_value=None)
+        client.rs_fingerprints = {'rs1': 'a', 'rs2': 'b', 'rs3': 'c', 'rs4': 'd'}
+        # The region [\x10, \x20) split and its daughters moved to rs2, which has not been rescraped since
+        client.rs_ranges = [['rs1', 'tsdb,1.a', KEY_MIN, b'\x10'], ['rs3', 'tsdb,3.c', b'\x20', b'\x30'], ['rs4', 'tsdb,4.d', b'\x30', KEY_MAX]]
+        regions = {
+            'rs1': [('tsdb,1.a', None, r'\x10')],
+            'rs2': [('tsdb,2.e', r'\x10', r'\x18'), ('tsdb,2.f', r'\x18', r'\x20')],
+            'rs3': [('tsdb,3.c', r'\x20', r'\x30')],
+        }
+        client._get_region_ranges = mocker.MagicMock(side_effect=lambda region_server: regions[region_server])
+        client._get_region_server_fingerprints = mocker.MagicMock(return_value=OrderedDict([('rs1', 'a'), ('rs2', 'b2'), ('rs3', 'c'), ('rs4', 'd')]))
+        assert client.get_rs_of_rowkey(b'\x1F') == ('rs2', 'tsdb,2.f')
+        # The servers on either side of the missing key, and the one whose /master-status row changed
+        assert sorted(call[0][0] for call in client._get_region_ranges.call_args_list) == ['rs1', 'rs2', 'rs3']
+        assert client.get_rs_of_rowkey(b'\x30') == ('rs4', 'tsdb,4.d')
+
+        # Another miss within miss_rescrape_seconds is not rescraped
+        client._get_region_ranges.reset_mock()
+        client.rs_ranges = [['rs1', 'tsdb,1.a', KEY_MIN, b'\x10']]
+        with pytest.raises(error.RegionNotFoundError):
+            client.get_rs_of_rowkeys([b'\x00', b'\x20'])
+        assert client._get_region_ranges.call_count == 0
+
+        client.last_miss_rescrape = 0
+        assert client.get_rs_of_rowkeys([b'\x00', b'\x20']) == [('rs1', 'tsdb,1.a'), ('rs3', 'tsdb,3.c')]
+
+    def test_serve_expired_cache_while_refreshing(self, mocker):
+        mocker.patch.object(HBaseUIClient, 'CACHE_FILENAME', 'rf-test-stale.cache')
+        mocker.patch.object(HBaseUIClient, '_load_ranges_from_file', return_value=[])
+        client = HBaseUIClient('', 'tsdb', autorefresh=False)
+        client.rs_ranges = [['rs1', 'r1', KEY_MIN, KEY_MAX]]
+        client.region_map.last_updated = time() - HBaseUIClient.EXPIRY_SECONDS - 60
+        client._flush_ranges_to_file()
+        mocker.stopall()
+        mocker.patch.object(HBaseUIClient, 'CACHE_FILENAME', 'rf-test-stale.cache')
+        timer = mocker.patch('regionfinder.hbase_ui_client.Timer')
+        create_rs_range_list = mocker.patch.object(HBaseUIClient, '_create_rs_range_list')
+        try:
+            # A one-off run does not use the expired file
+            HBaseUIClient('', 'tsdb', autorefresh=False)
+            assert create_rs_range_list.call_count == 1
+            # A long-running one serves it, and refreshes straight away in the background
+            client = HBaseUIClient('', 'tsdb', autorefresh=True)
+            assert create_rs_range_list.call_count == 1
+            assert client.is_stale()
+            assert client.get_rs_of_rowkey(b'\x00') == ('rs1', 'r1')
+            timer.assert_called_once_with(0, client._recurring_flush)
+        finally:
+            os.remove('rf-test-stale.cache')
+
+    def test_iter_regions_of_rowkeys(self, mocker, client):
+        mocker.patch.object(HBaseUIClient, 'LOOKUP_BATCH_SIZE', 2)
+        client.rs_ranges = [['rs1', 'r1', KEY_MIN, b'\x40'], ['rs2', 'r2', b'\x40', KEY_MAX]]
+        # Every batch only yields the regions that are new
+        batches = list(client.iter_regions_of_rowkeys([b'\x00', b'\x01', b'\x02', b'\x50', b'\x03']))
+        assert batches == [[('rs1', 'r1')], [('rs2', 'r2')]]
+        assert client.get_regions_of_rowkeys([b'\x00', b'\x50']) == set([('rs1', 'r1'), ('rs2', 'r2')])
+
+    def test_read_only_client_follows_the_cache_file(self, mocker, tmpdir):
+        cache_dir = str(tmpdir)
+        create_rs_range_list = mocker.patch.object(HBaseUIClient, '_create_rs_range_list')
+        with pytest.raises(error.RegionFinderError):
+            HBaseUIClient('', 'tsdb', cache_dir, autorefresh=False, read_only=True)
+        write_range_cache(os.path.join(cache_dir, HBaseUIClient.CACHE_FILENAME), 'tsdb', time() - 2 * HBaseUIClient.EXPIRY_SECONDS,
+                          [['rs1', 'r1', KEY_MIN, KEY_MAX]])
+        # However old the file is, it is served as is
+        client = HBaseUIClient('', 'tsdb', cache_dir, autorefresh=True, read_only=True)
+        assert client.active_timer is None
+        assert client.get_rs_of_rowkey(b'\x50') == ('rs1', 'r1')
+        assert not client.reload_if_changed()
+        generation = client.generation
+
+        write_range_cache(os.path.join(cache_dir, HBaseUIClient.CACHE_FILENAME), 'tsdb', time(),
+                          [['rs1', 'r1', KEY_MIN, b'\x40'], ['rs2', 'r2', b'\x40', KEY_MAX]])
+        assert client.reload_if_changed()
+        assert client.generation == generation + 1
+        assert client.get_rs_of_rowkeys([b'\x50', b'\x00']) == [('rs2', 'r2'), ('rs1', 'r1')]
+        assert client.get_regions_of_rowkeys([b'\x50', b'\x51', b'\x00']) == set([('rs1', 'r1'), ('rs2', 'r2')])
+        assert not client.reload_if_changed()
+        # Misses are left to the process refreshing the file
+        write_range_cache(os.path.join(cache_dir, HBaseUIClient.CACHE_FILENAME), 'tsdb', time(), [['rs1', 'r1', KEY_MIN, b'\x40']])
+        client.reload_if_changed()
+        with pytest.raises(error.RegionNotFoundError):
+            client.get_rs_of_rowkey(b'\x50')
+        assert create_rs_range_list.call_count == 0
+
     def test_autorefresh(self, mocker):
         mocker.patch.object(HBaseUIClient, '_load_ranges_from_file', return_value=[])
         HBaseUIClient.EXPIRY_SECONDS = 1
@@ -0,0 +1,54 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+from regionfinder import TSDBClient
+from regionfinder.hotspot import build_report
+from regionfinder.region_index import RegionIndex, count_series
+from regionfinder.rowkey import KEY_MAX, KEY_MIN
+from tests.mocks import MockTSDBResponse
+
+class TestHotspot:
+    counts = {
+        ('rs1', 'r1'): 10,
+        ('rs1', 'r2'): 50,
+        ('rs2', 'r3'): 20,
+        ('rs3', 'r4'): 0,
+    }
+
+    def test_build_report(self):
+        report = build_report(self.counts, top=2)
+        assert report['regionCount'] == 4 and report['serverCount'] == 3
+        assert report['topRegions'] == [{'regionServer': 'rs1', 'regionName': 'r2', 'series': 50},
+                                        {'regionServer': 'rs2', 'regionName': 'r3', 'series': 20}]
+        assert report['servers'] == [{'regionServer': 'rs1', 'regions': 2, 'series': 60},
+                                     {'regionServer': 'rs2', 'regions': 1, 'series': 20},
+                                     {'regionServer': 'rs3', 'regions': 1, 'series': 0}]
+        assert [region['regionName'] for region in report['regions']] == ['r1', 'r2', 'r3', 'r4']
+        # max / mean: 50 / 20 over regions, 60 / 26.67 over servers
+        assert report['regionSkew'] == 2.5
+        assert report['serverSkew'] == 2.25
+
+    def test_build_report_of_nothing(self):
+        report = build_report({})
+        assert report['regionSkew'] == 0.0 and report['serverSkew'] == 0.0
+        assert report['topRegions'] == [] and report['servers'] == []
+
+    def test_report_of_a_group_by_expression(self, mocker):
+        # metric{host=*}: one result per host. Hosts a and b have their rows in r1, host c in r2
+        mocker.patch('regionfinder.transport.HTTPTransport.get', return_value=MockTSDBResponse([
+            {'metric': 'm', 'tags': {'host': 'a'}, 'tsuids': ['000001000001000001'], 'dps': {'1514764800': 1}},
+            {'metric': 'm', 'tags': {'host': 'b'}, 'tsuids': ['000001000001000002'], 'dps': {'1514764800': 1}},
+            {'metric': 'm', 'tags': {'host': 'c'}, 'tsuids': ['000001000001000003', '000001000002000003'], 'dps': {'1514764800': 2}},
+        ]))
+        row_groups = TSDBClient('', 3, 0).get_row_groups_of('m{host=*}', '1514764800', '1514764800')
+        index = RegionIndex([['rs1', 'r1', KEY_MIN, b'\x00\x00\x01\x5A\x49\x7A\x00\x00\x00\x01\x00\x00\x03'],
+                             ['rs2', 'r2', b'\x00\x00\x01\x5A\x49\x7A\x00\x00\x00\x01\x00\x00\x03', KEY_MAX]])
+        report = build_report(count_series(index, row_groups))
+        assert report['regions'] == [{'regionServer': 'rs1', 'regionName': 'r1', 'series': 2},
+                                     {'regionServer': 'rs2', 'regionName': 'r2', 'series': 2}]
+        assert report['regionSkew'] == 1.0
@@ -0,0 +1,80 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import pytest
+import socket
+import threading
+import time
+try:
+    from http.server import BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+from regionfinder.http_server import BoundedThreadPoolHTTPServer
+
+release = threading.Event()
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        release.wait(5)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+def get_status(port):
+    sock = socket.create_connection(('127.0.0.1', port), 5)
+    sock.sendall(b'GET / HTTP/1.0\r\n\r\n')
+    status_line = sock.makefile('rb').readline()
+    sock.close()
+    return int(status_line.split()[1])
+
+class TestBoundedThreadPoolHTTPServer:
+    @pytest.fixture
+    def server(self):
+        release.clear()
+        server = BoundedThreadPoolHTTPServer(('127.0.0.1', 0), SlowHandler, workers=1, queue_size=1, request_timeout=5)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        yield server
+        release.set()
+        server.shutdown()
+        server.server_close()
+
+    def test_rejects_requests_beyond_the_queue(self, server):
+        port = server.server_address[1]
+        statuses = []
+        def request():
+            statuses.append(get_status(port))
+        # One request is being handled and one waits in the queue
+        waiting = [threading.Thread(target=request) for _ in range(2)]
+        for thread in waiting:
+            thread.start()
+            time.sleep(0.2)
+        assert get_status(port) == 503
+        release.set()
+        for thread in waiting:
+            thread.join()
+        assert statuses == [200, 200]
+
+    def test_rejects_requests_that_waited_too_long(self, server):
+        server.request_timeout = 0.2
+        port = server.server_address[1]
+        statuses = []
+        first = threading.Thread(target=lambda: statuses.append(get_status(port)))
+        first.start()
+        time.sleep(0.1)
+        second = threading.Thread(target=lambda: statuses.append(get_status(port)))
+        second.start()
+        time.sleep(0.5)
+        release.set()
+        first.join()
+        second.join()
+        assert sorted(statuses) == [200, 503]
@@ -0,0 +1,34 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFERRED_MODULES = ['requests', 'html.parser', 'multiprocessing.pool']
+
+class TestImports:
+    # A fresh interpreter, since this one has loaded everything already
+    def test_import_has_no_side_effects(self, tmpdir):
+        script = ('import json, sys; from regionfinder import Config, TSDBClient, HBaseUIClient, HTTPTransport, batch; '
+                  'print(json.dumps([name for name in {} if name in sys.modules]))'.format(DEFERRED_MODULES))
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        env.pop('REGION_FINDER_LOG', None)
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=str(tmpdir), env=env)
+        assert json.loads(output.decode('utf-8')) == []
+        assert not tmpdir.join('rf.log').exists()
+
+    def test_session_created_on_first_use(self):
+        from regionfinder import HTTPTransport
+        transport = HTTPTransport()
+        transport.close()
+        assert transport._session is None
+        assert transport.session is transport.session
+        transport.close()
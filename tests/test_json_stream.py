@@ -0,0 +1,78 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import pytest
+from regionfinder import error
+from regionfinder.json_stream import JSONReader, END
+
+document = ('[{"metric": "sys.cpu", "tags": {"host": "a\\"b"}, "aggregateTags": [], '
+            '"tsuids": ["000001000001000001", "0000010000\\u00310000002", "000001000001000003"], '
+            '"dps": {"10": 1.5e3, "20": null, "30" : "-1"}}, true]')
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def tokens_of(reader):
+    tokens = []
+    token = reader.next_token()
+    while token != END:
+        tokens.append(token)
+        token = reader.next_token()
+    return tokens
+
+def walk(reader):
+    walked = []
+    assert reader.next_token() == ('[', None)
+    elements = reader.iter_elements()
+    assert next(elements) == ('{', None)
+    for key in reader.iter_members():
+        token = reader.next_token()
+        if key == 'tsuids':
+            walked.append(list(reader.iter_strings()))
+        elif key == 'dps':
+            walked.append(list(reader.iter_keys()))
+        else:
+            reader.skip_value(token)
+            walked.append(key)
+    walked.append(list(elements))
+    assert reader.next_token() == END
+    return walked
+
+class TestJSONReader:
+    def test_next_token(self):
+        expected = tokens_of(JSONReader([document]))
+        assert expected[:4] == [('[', None), ('{', None), ('"', 'metric'), (':', None)]
+        assert ('"', 'a"b') in expected and ('"', '000001000010000002') in expected
+        assert ('v', '1.5e3') in expected and expected[-2:] == [('v', 'true'), (']', None)]
+        # Tokens straddling chunk boundaries come out the same
+        for size in range(1, 8):
+            assert tokens_of(JSONReader(chunked(document, size))) == expected
+        assert tokens_of(JSONReader(['12', '34'])) == [('v', '1234')]
+
+    def test_malformed(self):
+        with pytest.raises(error.RegionFinderError):
+            tokens_of(JSONReader(['["abc']))
+        reader = JSONReader(['{"a" 1}'])
+        reader.next_token()
+        with pytest.raises(error.RegionFinderError):
+            list(reader.iter_members())
+        reader = JSONReader(['["a", 1]'])
+        reader.next_token()
+        with pytest.raises(error.RegionFinderError):
+            list(reader.iter_strings())
+
+    def test_walk(self):
+        expected = ['metric', 'tags', 'aggregateTags', ['000001000001000001', '000001000010000002', '000001000001000003'],
+                    ['10', '20', '30'], [('v', 'true')]]
+        for size in (1, 3, 7, len(document)):
+            assert walk(JSONReader(chunked(document, size))) == expected
+        reader = JSONReader(['[] {}'])
+        reader.next_token()
+        assert list(reader.iter_strings()) == []
+        reader.next_token()
+        assert list(reader.iter_keys()) == []
@@ -0,0 +1,90 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import pytest
+import time
+from regionfinder import metrics
+
+class TestMetrics:
+    def test_render(self):
+        registry = metrics.Registry()
+        histogram = registry.register(metrics.Histogram('rf_seconds', 'Seconds', ('phase',), buckets=(0.1, 1.0)))
+        counter = registry.register(metrics.Counter('rf_total', 'Total', ('server',)))
+        registry.register(metrics.Gauge('rf_age', 'Age', function=lambda: 12))
+        registry.register(metrics.Gauge('rf_unknown', 'Unknown', function=lambda: None))
+        histogram.observe(0.05, 'tsdb')
+        histogram.observe(0.5, 'tsdb')
+        counter.inc('rs "1"')
+        counter.inc('rs "1"', amount=2)
+        lines = registry.render().splitlines()
+        assert '# TYPE rf_seconds histogram' in lines
+        assert 'rf_seconds_bucket{phase="tsdb",le="0.1"} 1.0' in lines
+        assert 'rf_seconds_bucket{phase="tsdb",le="1.0"} 2.0' in lines
+        assert 'rf_seconds_bucket{phase="tsdb",le="+Inf"} 2.0' in lines
+        assert 'rf_seconds_sum{phase="tsdb"} 0.55' in lines
+        assert 'rf_seconds_count{phase="tsdb"} 2.0' in lines
+        assert 'rf_total{server="rs \\"1\\""} 3.0' in lines
+        assert 'rf_age 12.0' in lines
+        assert not any(line.startswith('rf_unknown') for line in lines)
+        with pytest.raises(ValueError):
+            counter.inc()
+
+    def test_reset(self):
+        registry = metrics.Registry()
+        counter = registry.register(metrics.Counter('rf_total', 'Total'))
+        counter.inc()
+        counter._lock.acquire()
+        registry.reset()
+        counter.inc()
+        assert 'rf_total 1.0' in registry.render().splitlines()
+
+    def test_write_some_metrics(self, tmpdir):
+        registry = metrics.Registry()
+        registry.register(metrics.Counter('rf_total', 'Total')).inc()
+        registry.register(metrics.Gauge('rf_age', 'Age', function=lambda: 12))
+        path = str(tmpdir) + '/metrics.prom'
+        registry.write(path, ('rf_total',))
+        with open(path) as metrics_file:
+            lines = metrics_file.read().splitlines()
+        assert 'rf_total 1.0' in lines
+        assert not any(line.startswith('rf_age') for line in lines)
+        assert tmpdir.listdir() == [tmpdir.join('metrics.prom')]
+
+    def test_phases_are_exclusive(self, mocker):
+        clock = mocker.patch('regionfinder.metrics.time.time')
+        clock.return_value = 0.0
+        timings = metrics.start_timings()
+        with metrics.phase('rowkeys'):
+            clock.return_value = 1.0
+            with metrics.phase('tsdb'):
+                clock.return_value = 3.0
+            clock.return_value = 3.5
+        with metrics.phase('lookup'):
+            clock.return_value = 4.0
+        assert metrics.stop_timings() is timings
+        assert timings == {'rowkeys': 1.5, 'tsdb': 2.0, 'lookup': 0.5}
+        assert metrics.server_timing(timings) == 'rowkeys;dur=1500.00, tsdb;dur=2000.00, lookup;dur=500.00'
+
+    def test_phases_without_timings(self):
+        # Nothing is collected on threads that did not start timings, like the CLI's
+        assert metrics.current_timings() is None
+        with metrics.phase('tsdb'):
+            pass
+        assert list(metrics.timed_iter(iter(['a', 'b']), 'tsdb')) == ['a', 'b']
+        assert metrics.current_timings() is None
+
+    def test_timed_iter(self):
+        def chunks():
+            time.sleep(0.01)
+            yield 'a'
+            time.sleep(0.01)
+            yield 'b'
+        timings = metrics.start_timings()
+        assert list(metrics.timed_iter(chunks(), 'tsdb')) == ['a', 'b']
+        metrics.stop_timings()
+        assert timings['tsdb'] >= 0.02
@@ -0,0 +1,84 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import os
+import signal
+import socket
+import threading
+import time
+import pytest
+from regionfinder import prefork
+from regionfinder.http_server import BoundedThreadPoolHTTPServer
+try:
+    from http.server import BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='pre-fork mode requires os.fork')
+
+class PidHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = str(os.getpid()).encode('ascii')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def get_pid(port):
+    sock = socket.create_connection(('127.0.0.1', port), 5)
+    try:
+        sock.sendall(b'GET / HTTP/1.0\r\n\r\n')
+        response = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            response += chunk
+    finally:
+        sock.close()
+    return int(response.split(b'\r\n\r\n', 1)[1])
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+class TestPrefork:
+    def test_processes_serve_the_shared_listener(self):
+        listener = prefork.listen(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        def serve(index):
+            BoundedThreadPoolHTTPServer(None, PidHandler, workers=1, listener=listener).serve_forever()
+        processes = prefork.WorkerProcesses(2, serve).start()
+        try:
+            assert len(processes.workers) == 2
+            # Nothing in this process accepts connections, so a server process answers
+            assert get_pid(port) in processes.workers
+        finally:
+            processes.stop()
+            listener.close()
+        assert processes.workers == {}
+
+    def test_supervise_replaces_exited_processes(self):
+        processes = prefork.WorkerProcesses(2, lambda index: time.sleep(60)).start()
+        supervisor = threading.Thread(target=processes.supervise)
+        supervisor.start()
+        try:
+            pid = next(iter(processes.workers))
+            index = processes.workers[pid]
+            os.kill(pid, signal.SIGKILL)
+            wait_for(lambda: pid not in processes.workers and len(processes.workers) == 2)
+            assert index in processes.workers.values()
+        finally:
+            processes.stop()
+            supervisor.join(10)
+        assert not supervisor.is_alive()
@@ -0,0 +1,80 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import pytest
+import os
+from regionfinder import error
+from regionfinder.range_cache import MappedRegionIndex, write_range_cache
+from regionfinder.region_index import RegionIndex, count_series
+from regionfinder.rowkey import KEY_MAX, KEY_MIN
+
+class TestRangeCache:
+    FILEPATH = './rf-test-range.cache'
+    rs_ranges = [
+        ['http://rs1:60030/', 'tsdb,1.a', KEY_MIN, b'\x40\x00'],
+        ['http://rs2:60030/', 'tsdb,2.b', b'\x80\x00\x00', KEY_MAX],
+        ['http://rs1:60030/', 'tsdb,3.c', b'\x40\x00', b'\x80\x00\x00'],
+    ]
+
+    @pytest.fixture
+    def index(self):
+        write_range_cache(self.FILEPATH, 'tsdb', 1514764800, self.rs_ranges)
+        index = MappedRegionIndex(self.FILEPATH)
+        yield index
+        index.close()
+        os.remove(self.FILEPATH)
+
+    def test_round_trip(self, index):
+        assert index.last_updated == 1514764800
+        assert index.table_name == 'tsdb'
+        assert len(index) == 3
+        assert index.to_rs_ranges() == sorted(self.rs_ranges, key=lambda info: info[3])
+
+    def test_lookups_match_in_memory_index(self, index):
+        rowkeys = [b'\x00', b'\x3F\xFF', b'\x40\x00', b'\x7F\xFF\xFF', b'\x80\x00\x00', b'\xFF\xFF\xFF\xFF', b'\x40\x00', b'']
+        in_memory = RegionIndex(self.rs_ranges)
+        assert index.lookup_many(rowkeys) == in_memory.lookup_many(rowkeys)
+        for rowkey in rowkeys:
+            assert index.lookup(rowkey) == in_memory.lookup(rowkey)
+
+    def test_lookup_span_matches_in_memory_index(self, index):
+        in_memory = RegionIndex(self.rs_ranges)
+        spans = [(KEY_MIN, KEY_MAX), (b'\x10', b'\x40\x00'), (b'\x40\x00', b'\x80\x00\x01'), (b'\x90', KEY_MAX), (b'\x50', b'\x60')]
+        for start, stop in spans:
+            assert index.lookup_span(start, stop) == in_memory.lookup_span(start, stop)
+
+    def test_neighbours_match_in_memory_index(self):
+        rs_ranges = [self.rs_ranges[0], self.rs_ranges[1]]
+        write_range_cache(self.FILEPATH, 'tsdb', 0, rs_ranges)
+        index = MappedRegionIndex(self.FILEPATH)
+        in_memory = RegionIndex(rs_ranges)
+        for rowkey in [b'\x00', b'\x40\x00', b'\x7F', b'\x90']:
+            assert index.neighbours(rowkey) == in_memory.neighbours(rowkey)
+        index.close()
+        os.remove(self.FILEPATH)
+
+    def test_count_series_matches_in_memory_index(self, index):
+        row_groups = [(b'\x3F', [b'\xFF', b'\x00'], [b'\x00', b'\x01']), (b'\x80\x00', [b'\x00', b'\xFF'], [b'', b'\x10'])]
+        assert count_series(index, row_groups) == count_series(RegionIndex(self.rs_ranges), row_groups)
+
+    def test_lookup_outside_of_ranges(self):
+        write_range_cache(self.FILEPATH, 'tsdb', 0, [['rs1', 'tsdb,1.a', b'\x40\x00', b'\x80\x00']])
+        index = MappedRegionIndex(self.FILEPATH)
+        with pytest.raises(error.RegionFinderError):
+            index.lookup(b'\x3F\xFF')
+        with pytest.raises(error.RegionFinderError):
+            index.lookup(b'\x80\x00')
+        index.close()
+        os.remove(self.FILEPATH)
+
+    def test_rejects_corrupt_file(self):
+        with open(self.FILEPATH, 'wb') as f:
+            f.write(b'1514764800\n')
+        with pytest.raises(error.RegionFinderError):
+            MappedRegionIndex(self.FILEPATH)
+        os.remove(self.FILEPATH)
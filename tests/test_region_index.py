@@ -0,0 +1,95 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import pickle
+import pytest
+from regionfinder import error
+from regionfinder.region_index import RegionIndex, count_series
+from regionfinder.rowkey import KEY_MAX, KEY_MIN
+
+class TestRegionIndex:
+    rs_ranges = [
+        ['rs2', 'r2', b'\x40\x00', b'\x80\x00'],
+        ['rs1', 'r1', KEY_MIN, b'\x40\x00'],
+        ['rs3', 'r3', b'\x80\x00', KEY_MAX],
+    ]
+
+    def test_lookup(self):
+        index = RegionIndex(self.rs_ranges)
+        assert index.lookup(b'\x00\x00') == ('rs1', 'r1')
+        assert index.lookup(b'\x3F\xFF') == ('rs1', 'r1')
+        assert index.lookup(b'\x70\x00') == ('rs2', 'r2')
+        assert index.lookup(b'\xFF\xFF') == ('rs3', 'r3')
+
+    def test_lookup_on_region_boundaries(self):
+        index = RegionIndex(self.rs_ranges)
+        # Start keys are inclusive and stop keys are exclusive
+        assert index.lookup(b'\x40\x00') == ('rs2', 'r2')
+        assert index.lookup(b'\x80\x00') == ('rs3', 'r3')
+
+    def test_lookup_outside_of_ranges(self):
+        index = RegionIndex([['rs2', 'r2', b'\x40\x00', b'\x80\x00']])
+        with pytest.raises(error.RegionFinderError):
+            index.lookup(b'\x3F\xFF')
+        with pytest.raises(error.RegionFinderError):
+            index.lookup(b'\x80\x00')
+        with pytest.raises(error.RegionFinderError):
+            RegionIndex([]).lookup(b'\x00')
+
+    def test_neighbours(self):
+        index = RegionIndex([self.rs_ranges[0], ['rs4', 'r4', b'\x90\x00', KEY_MAX]])
+        assert index.neighbours(b'\x50') == [('rs2', 'r2')]
+        # The key falls in a gap, between two regions or before the first or after the last one
+        assert index.neighbours(b'\x85') == [('rs2', 'r2'), ('rs4', 'r4')]
+        assert index.neighbours(b'\x10') == [('rs2', 'r2')]
+        assert RegionIndex([self.rs_ranges[0]]).neighbours(b'\x85') == [('rs2', 'r2')]
+        assert RegionIndex([]).neighbours(b'\x00') == []
+        with pytest.raises(error.RegionNotFoundError) as err:
+            index.lookup(b'\x85')
+        assert err.value.rowkey == b'\x85'
+
+    def test_key_sentinels(self):
+        assert KEY_MIN < b'\x00' < b'\xFF' * 64 < KEY_MAX
+        assert sorted([KEY_MAX, b'\xFF', KEY_MIN]) == [KEY_MIN, b'\xFF', KEY_MAX]
+        assert pickle.loads(pickle.dumps(KEY_MAX)) is KEY_MAX
+        assert RegionIndex(self.rs_ranges).lookup(KEY_MIN) == ('rs1', 'r1')
+
+    def test_lookup_many(self):
+        index = RegionIndex(self.rs_ranges)
+        rowkeys = [b'\xFF\xFF', b'\x00\x00', b'\x40\x00', b'\x3F\xFF', b'\x80\x00', b'\x00\x00']
+        assert index.lookup_many(iter(rowkeys)) == [index.lookup(rowkey) for rowkey in rowkeys]
+        assert index.lookup_many([]) == []
+        with pytest.raises(error.RegionFinderError):
+            RegionIndex([['rs2', 'r2', b'\x40\x00', b'\x80\x00']]).lookup_many([b'\x50\x00', b'\x90\x00'])
+
+    def test_lookup_span(self):
+        index = RegionIndex(self.rs_ranges)
+        assert index.lookup_span(b'\x10', b'\x20') == [('rs1', 'r1')]
+        # Stop keys are exclusive on both sides
+        assert index.lookup_span(b'\x10', b'\x40\x00') == [('rs1', 'r1')]
+        assert index.lookup_span(b'\x40\x00', b'\x80\x00\x01') == [('rs2', 'r2'), ('rs3', 'r3')]
+        assert index.lookup_span(KEY_MIN, KEY_MAX) == [('rs1', 'r1'), ('rs2', 'r2'), ('rs3', 'r3')]
+        assert index.lookup_span(b'\x90', KEY_MAX) == [('rs3', 'r3')]
+
+    def test_count_series(self):
+        index = RegionIndex(self.rs_ranges)
+        suffixes = [b'\x00', b'\x10', b'\x20', b'\xFF']
+        # Rows of hour \x3F are split by the \x40\x00 boundary: \x3F\x?? rows stay in r1 and all of hour \x40 is in r2
+        counts = count_series(index, [(b'', [b'\x3F', b'\x40'], suffixes)])
+        assert counts == {('rs1', 'r1'): 4, ('rs2', 'r2'): 4}
+        counts = count_series(index, [(b'\x7F', [b'\xFF', b'\x80'], suffixes), (b'\x80', [b'\x00'], suffixes[1:])])
+        # The \x7F\xFF row hour fits in r2; \x80\x00 starts r3, so every \x80 row hour lies in it
+        assert counts == {('rs2', 'r2'): 4, ('rs3', 'r3'): 3}
+        # Series are counted once per region, however many of their row hours it holds
+        assert count_series(index, [(b'\x10', [b'\x00', b'\x01', b'\x02'], suffixes)]) == {('rs1', 'r1'): 4}
+        # A boundary inside a row hour splits its series
+        counts = count_series(RegionIndex([['rs1', 'r1', KEY_MIN, b'\x40\x00\x10'], ['rs2', 'r2', b'\x40\x00\x10', KEY_MAX]]),
+                              [(b'\x40', [b'\x00', b'\x01'], suffixes)])
+        assert counts == {('rs1', 'r1'): 1, ('rs2', 'r2'): 4}
+        with pytest.raises(error.RegionFinderError):
+            count_series(RegionIndex([['rs2', 'r2', b'\x40\x00', b'\x80\x00']]), [(b'\x3F', [b'\xFF'], suffixes)])
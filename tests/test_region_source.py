@@ -0,0 +1,123 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import base64
+import json
+import pytest
+from collections import OrderedDict
+from regionfinder import HBaseUIClient, error
+from regionfinder.region_source import MetaScanSource, parse_region_info
+from regionfinder.rowkey import KEY_MAX, KEY_MIN
+
+def varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def field(number, value):
+    if isinstance(value, bytes):
+        return varint(number << 3 | 2) + varint(len(value)) + value
+    return varint(number << 3) + varint(value)
+
+def region_info(start, stop, region_id=1544258234698, split=False):
+    message = field(1, region_id) + field(2, field(1, b'default') + field(2, b'tsdb')) + field(3, start) + field(4, stop)
+    return b'PBUF' + message + (field(6, 1) if split else b'')
+
+def b64(value):
+    return base64.b64encode(value).decode('ascii')
+
+class MockRESTResponse:
+    def __init__(self, status_code, rows=None, headers=None):
+        self.status_code = status_code
+        self.rows = rows
+        self.headers = headers or {}
+
+    def json(self):
+        return {'Row': [{'key': b64(key), 'Cell': [{'column': b64(column), '$': b64(value)} for column, value in cells]}
+                        for key, cells in self.rows]}
+
+    def raise_for_status(self):
+        pass
+
+class TestRegionSource:
+    def test_parse_region_info(self):
+        parsed = parse_region_info(region_info(b'\x00\x01', b'', split=True))
+        assert parsed['region_id'] == 1544258234698
+        assert parsed['start_key'] == b'\x00\x01'
+        assert parsed['end_key'] == b''
+        assert parsed['split'] and not parsed['offline']
+        assert parsed['replica_id'] == 0
+        with pytest.raises(error.RegionFinderError):
+            parse_region_info(b'\x00\x00\x00\x01')
+        with pytest.raises(error.RegionFinderError):
+            parse_region_info(region_info(b'\x00\x01', b'')[:-3])
+
+    def test_meta_scan(self, mocker):
+        transport = mocker.MagicMock()
+        transport.post.return_value = MockRESTResponse(201, headers={'Location': 'http://rest:8080/hbase:meta/scanner/1'})
+        transport.get.side_effect = [
+            MockRESTResponse(200, [
+                (b'tsdb,,1.a.', [(b'info:regioninfo', region_info(b'', b'\x10')), (b'info:server', b'rs1:16020')]),
+                # A split parent, still in hbase:meta until its daughters are compacted
+                (b'tsdb,\x10,2.b.', [(b'info:regioninfo', region_info(b'\x10', b'\x30', split=True)), (b'info:server', b'rs2:16020')]),
+                (b'tsdb,\x10,3.c.', [(b'info:regioninfo', region_info(b'\x10', b'\x20'))]),
+            ]),
+            # The page ended in the middle of the row
+            MockRESTResponse(200, [
+                (b'tsdb,\x10,3.c.', [(b'info:server', b'rs2:16020')]),
+                (b'tsdb,\x20,4.d.', [(b'info:regioninfo', region_info(b'\x20', b'\x30'))]),
+                (b'tsdb,\x30,5.e.', [(b'info:regioninfo', region_info(b'\x30', b'')), (b'info:server', b'rs1:16020')]),
+            ]),
+            MockRESTResponse(204),
+        ]
+        source = MetaScanSource('http://rest:8080/', 'tsdb', transport, batch_size=2)
+        fingerprints = source.get_region_servers()
+        # Region servers are named by the URL of their web UI, like the status pages name them
+        assert list(fingerprints) == ['http://rs1:16030/', 'http://rs2:16030/']
+        assert source.get_regions(['http://rs1:16030/', 'http://rs3:16030/']) == {'http://rs1:16030/': [
+            ['http://rs1:16030/', 'tsdb,1.a.', KEY_MIN, b'\x10'],
+            ['http://rs1:16030/', 'tsdb,5.e.', b'\x30', KEY_MAX],
+        ]}
+        # The unassigned region 4.d is left out
+        assert source.get_regions(['http://rs2:16030/'])['http://rs2:16030/'] == [['http://rs2:16030/', 'tsdb,3.c.', b'\x10', b'\x20']]
+        assert source.last_scan_requests == 5
+
+        url = transport.post.call_args[0][0]
+        scanner = json.loads(transport.post.call_args[1]['data'])
+        assert url == 'http://rest:8080/hbase:meta/scanner'
+        assert base64.b64decode(scanner['startRow']) == b'tsdb,'
+        assert base64.b64decode(scanner['endRow']) == b'tsdb-'
+        assert scanner['batch'] == 6
+        transport.delete.assert_called_once_with('http://rest:8080/hbase:meta/scanner/1', timeout=(5, 30))
+
+    def test_meta_scan_server_names(self):
+        assert MetaScanSource('http://rest:8080', 'tsdb', None)._server_url('rs1.local:60020') == 'http://rs1.local:60030/'
+        assert MetaScanSource('http://rest:8080', 'tsdb', None, info_port=8085)._server_url('rs1.local:16020') == 'http://rs1.local:8085/'
+        with pytest.raises(error.RegionFinderError):
+            MetaScanSource('http://rest:8080', 'tsdb', None)._server_url('rs1.local')
+
+    def test_client_falls_back_to_status_pages(self, mocker):
+        mocker.patch.object(HBaseUIClient, '_load_ranges_from_file', return_value=[])
+        region_source = mocker.MagicMock()
+        region_source.name = 'hbase:meta'
+        region_source.get_region_servers.return_value = OrderedDict([('http://rs1:16030/', 'a')])
+        region_source.get_regions.return_value = {'http://rs1:16030/': [['http://rs1:16030/', 'tsdb,1.a', KEY_MIN, KEY_MAX]]}
+        client = HBaseUIClient('', 'tsdb', autorefresh=False, region_source=region_source)
+        client._flush_ranges_to_file = mocker.MagicMock(return_value=None)
+        client._get_region_server_fingerprints = mocker.MagicMock(return_value=OrderedDict([('http://rs1:16030/', None)]))
+        client._get_region_ranges = mocker.MagicMock(return_value=[('tsdb,1.b', None, None)])
+        client._create_rs_range_list()
+        assert client.get_rs_of_rowkey(b'\x00') == ('http://rs1:16030/', 'tsdb,1.a')
+        assert client._get_region_server_fingerprints.call_count == 0
+
+        region_source.get_region_servers.side_effect = error.RegionFinderError('Could not open a scanner')
+        client._create_rs_range_list()
+        assert client.get_rs_of_rowkey(b'\x00') == ('http://rs1:16030/', 'tsdb,1.b')
@@ -0,0 +1,84 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+import io
+import json
+import zlib
+import pytest
+from regionfinder import error, response_format
+
+# Returns the body of a chunked transfer so far, and whether it ended
+def dechunk(data):
+    body = b''
+    while len(data) > 0:
+        length, _, data = data.partition(b'\r\n')
+        length = int(length, 16)
+        if length == 0:
+            return body, True
+        body += data[:length]
+        data = data[length + 2:]
+    return body, False
+
+class TestResponseFormat:
+    def test_choose_format(self):
+        assert response_format.choose_format(None, None) == 'html'
+        assert response_format.choose_format('ndjson', 'text/html') == 'ndjson'
+        assert response_format.choose_format(None, 'application/json') == 'json'
+        assert response_format.choose_format(None, 'text/html;q=0.5, application/x-ndjson') == 'ndjson'
+        assert response_format.choose_format(None, 'application/json;q=0, */*') == 'html'
+        assert response_format.choose_format(None, 'image/png') == 'html'
+        with pytest.raises(error.RegionFinderError):
+            response_format.choose_format('xml', None)
+
+    def test_accepts_gzip(self):
+        assert response_format.accepts_gzip('gzip, deflate')
+        assert not response_format.accepts_gzip('gzip;q=0, deflate')
+        assert not response_format.accepts_gzip(None)
+
+    def test_etag(self):
+        rs_infos = [('rs1', 'r1'), ('rs2', 'r2')]
+        etag = response_format.etag(100, 'json', rs_infos)
+        assert etag == response_format.etag(100, 'json', list(rs_infos))
+        assert etag != response_format.etag(101, 'json', rs_infos)
+        assert etag != response_format.etag(100, 'ndjson', rs_infos)
+        assert etag != response_format.etag(100, 'json', rs_infos[:1])
+        assert response_format.etag_matches('"other", ' + etag, etag)
+        assert response_format.etag_matches(etag.replace('W/', ''), etag)
+        assert response_format.etag_matches('*', etag)
+        assert not response_format.etag_matches(None, etag)
+        assert not response_format.etag_matches('"other"', etag)
+
+    def test_to_json(self):
+        assert json.loads(response_format.to_json([('rs1', 'r1', 3)], {'q': 'm'})) == {
+            'query': {'q': 'm'}, 'regions': [{'regionServer': 'rs1', 'regionName': 'r1', 'series': 3}]}
+        lines = response_format.to_ndjson([('rs1', 'r1'), ('rs2', 'r2')]).splitlines()
+        assert [json.loads(line)['regionServer'] for line in lines] == ['rs1', 'rs2']
+
+    def test_chunked_gzip_stream(self):
+        out = io.BytesIO()
+        writer = response_format.GzipWriter(response_format.ChunkedWriter(out, chunked=True))
+        writer.write(b'{"a": 1}\n')
+        writer.flush()
+        # Everything written so far can be decoded before the stream ends
+        body, ended = dechunk(out.getvalue())
+        assert not ended
+        assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body) == b'{"a": 1}\n'
+        writer.write(b'{"b": 2}\n')
+        writer.close()
+        body, ended = dechunk(out.getvalue())
+        assert ended
+        assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == b'{"a": 1}\n{"b": 2}\n'
+
+    def test_unchunked_stream(self):
+        out = io.BytesIO()
+        writer = response_format.ChunkedWriter(out, chunked=False)
+        writer.write(b'abc')
+        writer.write(b'')
+        writer.close()
+        assert out.getvalue() == b'abc'
+        assert zlib.decompress(response_format.gzip_bytes(b'abc'), 16 + zlib.MAX_WBITS) == b'abc'
@@ -0,0 +1,45 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+from time import sleep
+from regionfinder.result_cache import ResultCache
+
+class TestResultCache:
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResultCache(max_entries=2)
+        cache.put('a', 1, ['rs1'])
+        cache.put('b', 1, ['rs2'])
+        assert cache.get('a', 1) == ['rs1']
+        cache.put('c', 1, ['rs3'])
+        assert cache.get('b', 1) is None
+        assert cache.get('a', 1) == ['rs1']
+        assert cache.get('c', 1) == ['rs3']
+        assert cache.stats()['evictions'] == 1
+
+    def test_entries_expire_and_follow_the_generation(self):
+        cache = ResultCache(ttl_seconds=0.2)
+        cache.put('a', 1, ['rs1'])
+        assert cache.get('a', 2) is None
+        # The stale entry is gone for good, even for its own generation
+        assert cache.get('a', 1) is None
+        cache.put('a', 2, ['rs1'])
+        sleep(0.3)
+        assert cache.get('a', 2) is None
+
+    def test_stats(self):
+        cache = ResultCache()
+        cache.put('a', 1, [])
+        cache.get('a', 1)
+        cache.get('b', 1)
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries'], stats['hitRatio']) == (1, 1, 1, 0.5)
+
+    def test_disabled_cache(self):
+        cache = ResultCache(max_entries=0)
+        cache.put('a', 1, ['rs1'])
+        assert cache.get('a', 1) is None
@@ -0,0 +1,35 @@
+'''
+  Copyright (c) 2019, salesforce.com, inc.
+  All rights reserved.
+  SPDX-License-Identifier: BSD-3-Clause
+  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+'''
+
+from regionfinder import HTTPTransport
+
+class TestHTTPTransport:
+    def test_pool_and_retry_policy(self):
+        transport = HTTPTransport(pool_size=4, host_pools=16, retries=3, backoff_factor=0.1)
+        adapter = transport.session.get_adapter('http://localhost:60010')
+        assert adapter._pool_connections == 16
+        assert adapter._pool_maxsize == 4
+        assert adapter.max_retries.connect == 3
+        assert adapter.max_retries.read == 0
+        assert 503 in adapter.max_retries.status_forcelist
+        assert 'gzip' in transport.session.headers['Accept-Encoding']
+        adapter = transport.session_without_retries.get_adapter('http://localhost:60030')
+        assert adapter.max_retries.connect == 0
+        assert adapter.max_retries.status == 0
+        transport.close()
+
+    def test_get_applies_default_timeout(self, mocker):
+        transport = HTTPTransport(connect_timeout=1, read_timeout=2)
+        session_get = mocker.patch.object(transport.session, 'get')
+        transport.get('http://localhost:4466/api/query')
+        session_get.assert_called_with('http://localhost:4466/api/query', timeout=(1, 2))
+        transport.get('http://localhost:60030/rs-status', timeout=(3, 4))
+        session_get.assert_called_with('http://localhost:60030/rs-status', timeout=(3, 4))
+        no_retry_get = mocker.patch.object(transport.session_without_retries, 'get')
+        transport.get('http://localhost:60030/rs-status', retry=False)
+        no_retry_get.assert_called_with('http://localhost:60030/rs-status', timeout=(1, 2))
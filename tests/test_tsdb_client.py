@@ -6,26 +6,54 @@
 
 '''
 
+import binascii
 import pytest
 import time
+try:
+    from urllib.parse import parse_qsl
+except ImportError:
+    from urlparse import parse_qsl
 from regionfinder import TSDBClient, error
-
-class MockTSDBResponse:
-    def __init__(self, json_data):
-        self.json_data = json_data
-
-    def json(self):
-        return self.json_data
+from regionfinder.tsdb_client import normalize_expression, parse_tsdb_time
+from tests.mocks import MockTSDBResponse
 
 fake_tsuid = '000000000000BBBBBBCCCCCC'
-salted_tsuid = '1222222AAAAAABBBBBB'
-def get_side_effect(arg):
+salted_tsuid = '12222222AAAAAABBBBBB'
+def get_side_effect(arg, **kwargs):
+    if '/api/search/lookup' in arg:
+        if 'unknown' in arg:
+            return MockTSDBResponse({'error': {'code': 404, 'message': "No such name for 'metrics'"}})
+        return MockTSDBResponse({'type': 'LOOKUP', 'results': [{'tsuid': fake_tsuid, 'metric': 'normal', 'tags': {}}]})
+    if 'unknown' in arg:
+        return MockTSDBResponse({'error': {'code': 400, 'message': "No such name for 'metrics'"}})
+    if 'show_query=true' in arg and 'group_by' in arg:
+        # The groups of group_by{host=*}, then the result of normal
+        return MockTSDBResponse([
+            {'metric': 'group_by', 'query': {'index': 0}, 'tags': {'host': 'a'}, 'tsuids': ['000000000000BBBBBB000001'], 'dps': {'1514768400': 1}},
+            {'metric': 'normal', 'query': {'index': 1}, 'tsuids': [fake_tsuid], 'dps': {'1514764800': '1.0'}},
+            {'metric': 'group_by', 'query': {'index': 0}, 'tags': {'host': 'b'}, 'tsuids': ['000000000000BBBBBB000002', '000000000000BBBBBB000003'],
+             'dps': {'1514764800': 2}}])
+    if 'show_query=true' in arg:
+        # Results of the second and first sub-query, and none for the third
+        return MockTSDBResponse([
+            {'metric': 'b', 'query': {'index': 1, 'metric': 'b', 'tags': {}}, 'tsuids': [salted_tsuid], 'dps': {'1514768400': 1}},
+            {'metric': 'a', 'query': {'index': 0, 'metric': 'a', 'tags': {}}, 'tsuids': [fake_tsuid], 'dps': {'1514764800': 1}},
+            {'metric': 'a', 'query': {'index': 0, 'metric': 'a', 'tags': {}}, 'tsuids': ['FFFFFFFFFFFFFFFFFFFFFFFF'], 'dps': {'1': 1}}])
     if 'dict' in arg:
         return MockTSDBResponse(dict())
     if 'empty_arr' in arg:
         return MockTSDBResponse([])
     if 'empty_dps' in arg:
         return MockTSDBResponse({'dps':{}, 'tsuids': [fake_tsuid]})
+    if 'many_results' in arg:
+        return MockTSDBResponse([{'metric': 'many_results', 'tags': {'dc': 'a'}, 'aggregateTags': ['host'], 'tsuids': [fake_tsuid, salted_tsuid],
+                                  'dps': {'1514768400': 2.0, '1514764860': 1.5, '1514766000': 3}},
+                                 {'tsuids': ['FFFFFFFFFFFFFFFFFFFFFFFF'], 'dps': {'1': 1}}])
+    if 'group_by' in arg:
+        # metric{host=*}: one result per host
+        return MockTSDBResponse([{'metric': 'group_by', 'tags': {'host': 'a'}, 'tsuids': ['000000000000BBBBBB000001'], 'dps': {'1514764800': 1}},
+                                 {'metric': 'group_by', 'tags': {'host': 'b'}, 'tsuids': ['000000000000BBBBBB000002', '000000000000BBBBBB000003'],
+                                  'dps': {'1514764800': 2}}])
     if 'salted' in arg:
         return MockTSDBResponse([{'dps':{'1514764800': '1.0'}, 'tsuids': [salted_tsuid]}])
     return MockTSDBResponse([{'dps':{'1514764800': '1.0'}, 'tsuids': [fake_tsuid]}])
@@ -33,20 +61,145 @@ def get_side_effect(arg):
 class TestTSDBClient:
     def test_get_encoded_timestamp(self):
         client = TSDBClient('', 3, 0)
-        assert client._get_encoded_timestamp(0) == ('0'*8)
-        assert client._get_encoded_timestamp(4095) == ('0'*5 + 'F'*3)
-        assert len(client._get_encoded_timestamp(time.time())) == 8
+        assert client._get_encoded_timestamp(0) == b'\x00' * 4
+        assert client._get_encoded_timestamp(4095) == b'\x00\x00\x0F\xFF'
+        assert len(client._get_encoded_timestamp(time.time())) == 4
 
     def test_get_rowkeys_of(self, mocker):
-        mocker.patch('regionfinder.tsdb_client.requests.get', side_effect=get_side_effect)
-        client = TSDBClient('', 6, 0)
+        mocker.patch('regionfinder.transport.HTTPTransport.get', side_effect=get_side_effect)
+        client = TSDBClient('', 3, 0)
         with pytest.raises(error.RegionFinderError):
             client.get_rowkeys_of('dict')
         with pytest.raises(error.RegionFinderError):
             client.get_rowkeys_of('empty_arr')
         with pytest.raises(error.RegionFinderError):
             client.get_rowkeys_of('empty_dps')
-        assert len(client.get_rowkeys_of('normal')[0]) == (len(fake_tsuid) + 8)
+        assert client.get_rowkeys_of('normal') == [binascii.unhexlify('000000' + '5A497A00' + '000000BBBBBBCCCCCC')]
 
         client = TSDBClient('', 3, 1)
-        assert len(client.get_rowkeys_of('salted')[0]) == (len(salted_tsuid) + 8)
+        assert client.get_rowkeys_of('salted') == [binascii.unhexlify('12222222' + '5A497A00' + 'AAAAAABBBBBB')]
+
+    def test_get_rowkeys_of_row_hour(self, mocker):
+        get = mocker.patch('regionfinder.transport.HTTPTransport.get', side_effect=get_side_effect)
+        client = TSDBClient('', 6, 0, tsuid_source='hour')
+        rowkeys = client.get_rowkeys_of('normal', '1514768399')
+        url = get.call_args[0][0]
+        assert 'start=1514764800' in url and 'end=1514768399' in url and 'm=sum%3A0all-count%3Anormal' in url
+        # The row base time is the start of the hour, whatever the returned datapoints are
+        assert rowkeys == [binascii.unhexlify(fake_tsuid[:12] + '5A497A00' + fake_tsuid[12:])]
+        with pytest.raises(error.RegionFinderError):
+            TSDBClient('', 6, 0, tsuid_source='search')
+
+    def test_iter_rowkeys_of(self, mocker):
+        mocker.patch('regionfinder.transport.HTTPTransport.get', side_effect=get_side_effect)
+        client = TSDBClient('', 6, 0)
+        # The series of every result (one per group of a group-by expression) are used, and the row hour of the earliest
+        #   datapoint of all of them (1) gives the rowkey time
+        assert list(client.iter_rowkeys_of('many_results')) == [
+            binascii.unhexlify(fake_tsuid[:12] + '00000000' + fake_tsuid[12:]),
+            binascii.unhexlify(salted_tsuid[:12] + '00000000' + salted_tsuid[12:]),
+            binascii.unhexlify('FFFFFFFFFFFF' + '00000000' + 'FFFFFFFFFFFF')]
+        rowkeys = TSDBClient('', 6, 0, tsuid_source='hour').iter_rowkeys_of('many_results', '1514764800')
+        assert next(rowkeys) == binascii.unhexlify(fake_tsuid[:12] + '5A497A00' + fake_tsuid[12:])
+
+    def test_get_rowkeys_of_many(self, mocker):
+        get = mocker.patch('regionfinder.transport.HTTPTransport.get', side_effect=get_side_effect)
+        client = TSDBClient('', 6, 0)
+        results = client.get_rowkeys_of_many(['a', 'b', 'c'])
+        url = get.call_args[0][0]
+        assert get.call_count == 1 and url.endswith('&m=sum%3Aa&m=sum%3Ab&m=sum%3Ac')
+        # Both results of the first sub-query are used, at the row hour of the earliest datapoint of either (1)
+        assert results[0] == [binascii.unhexlify(fake_tsuid[:12] + '00000000' + fake_tsuid[12:]),
+                              binascii.unhexlify('FFFFFFFFFFFF' + '00000000' + 'FFFFFFFFFFFF')]
+        assert results[1] == [binascii.unhexlify(salted_tsuid[:12] + '5A498810' + salted_tsuid[12:])]
+        assert isinstance(results[2], error.RegionFinderError)
+
+        # A group-by expression resolves to the same rowkeys in a batch as on its own
+        get.reset_mock()
+        results = client.get_rowkeys_of_many(['group_by', 'normal'])
+        assert get.call_count == 1 and len(results[0]) == 3
+        assert sorted(results[0]) == sorted(client.get_rowkeys_of('group_by'))
+        assert results[1] == client.get_rowkeys_of('normal')
+
+        # An unknown metric fails the whole request, so every metric is queried on its own
+        get.reset_mock()
+        results = client.get_rowkeys_of_many(['normal', 'unknown.metric'])
+        assert get.call_count == 3
+        assert results[0] == client.get_rowkeys_of('normal')
+        assert isinstance(results[1], error.RegionFinderError)
+
+    def test_get_key_spans_of(self, mocker):
+        get = mocker.patch('regionfinder.transport.HTTPTransport.get', side_effect=get_side_effect)
+        client = TSDBClient('', 3, 0)
+        # Hours from the start of the first row to the end of the last one, however far into the hour the times are
+        assert client.get_key_spans_of('normal', '1514764801', '1514768399') == [
+            (binascii.unhexlify('000000' + '5A497A00'), binascii.unhexlify('000000' + '5A497A01'))]
+        assert client.get_key_spans_of('normal', '1514764800', '1514768400') == [
+            (binascii.unhexlify('000000' + '5A497A00'), binascii.unhexlify('000000' + '5A498811'))]
+        # The UID is looked up once per metric name
+        assert get.call_count == 1 and 'limit=1' in get.call_args[0][0]
+
+        client = TSDBClient('', 3, 1, salt_buckets=2)
+        assert client.get_key_spans_of('metric', '1514764800', '1514764800', metric_uid='FFFFFF') == [
+            (binascii.unhexlify('00FFFFFF5A497A00'), binascii.unhexlify('00FFFFFF5A497A01')),
+            (binascii.unhexlify('01FFFFFF5A497A00'), binascii.unhexlify('01FFFFFF5A497A01'))]
+        assert get.call_count == 1
+
+        with pytest.raises(error.RegionFinderError):
+            client.get_key_spans_of('metric', metric_uid='FFFF')
+        with pytest.raises(error.RegionFinderError):
+            client.get_key_spans_of('metric', metric_uid='FFFFFG')
+        with pytest.raises(error.RegionFinderError):
+            client.get_key_spans_of('metric', metric_uid='FFFFF')
+        with pytest.raises(error.RegionFinderError):
+            client.get_key_spans_of('normal{host=a}')
+        with pytest.raises(error.RegionFinderError):
+            client.get_key_spans_of('normal', '1514768400', '1514764800')
+        with pytest.raises(error.RegionFinderError):
+            client.get_key_spans_of('unknown.metric')
+
+    def test_get_row_groups_of(self, mocker):
+        get = mocker.patch('regionfinder.transport.HTTPTransport.get', side_effect=get_side_effect)
+        client = TSDBClient('', 6, 0)
+        groups = client.get_row_groups_of('many_results', '1514764860', '1514768460')
+        url = get.call_args[0][0]
+        assert 'start=1514764800' in url and 'end=1514768460' in url and 'm=sum%3A0all-count%3Amany_results' in url
+        # One group per salt and metric, with every row hour of the window. The series of every result of a group-by
+        #   expression are counted, not only those of the first one
+        row_times = [binascii.unhexlify('5A497A00'), binascii.unhexlify('5A498810')]
+        assert groups == [(binascii.unhexlify(fake_tsuid[:12]), row_times, [binascii.unhexlify(fake_tsuid[12:])]),
+                          (binascii.unhexlify(salted_tsuid[:12]), row_times, [binascii.unhexlify(salted_tsuid[12:])]),
+                          (binascii.unhexlify('FFFFFFFFFFFF'), row_times, [binascii.unhexlify('FFFFFFFFFFFF')])]
+        groups = client.get_row_groups_of('group_by', '1514764800', '1514764800')
+        assert groups == [(binascii.unhexlify('000000000000'), [binascii.unhexlify('5A497A00')],
+                           [binascii.unhexlify('BBBBBB00000' + str(host)) for host in (1, 2, 3)])]
+        with pytest.raises(error.RegionFinderError):
+            client.get_row_groups_of('normal', '1514768400', '1514764800')
+        with pytest.raises(error.RegionFinderError):
+            client.get_row_groups_of('dict')
+
+    def test_parse_tsdb_time(self):
+        assert parse_tsdb_time('now', 1514764800) == 1514764800
+        assert parse_tsdb_time('1h-ago', 1514764800) == 1514764800 - 3600
+        assert parse_tsdb_time('2d-ago', 1514764800) == 1514764800 - 2*86400
+        assert parse_tsdb_time('1514764800') == 1514764800
+        assert parse_tsdb_time('1514764800123') == 1514764800
+        # Absolute dates are in local time
+        midnight = int(time.mktime((2018, 1, 1, 0, 0, 0, 0, 0, -1)))
+        assert parse_tsdb_time('2018/01/01') == midnight
+        assert parse_tsdb_time('2018/01/01-00:00:00') == midnight
+        assert parse_tsdb_time('2018/01/01 12:30') == midnight + 12*3600 + 30*60
+        assert parse_tsdb_time('2018/01/01-12:30:15') == midnight + 12*3600 + 30*60 + 15
+        with pytest.raises(error.RegionFinderError):
+            parse_tsdb_time('2018/13/01')
+        with pytest.raises(error.RegionFinderError):
+            parse_tsdb_time('yesterday')
+
+    def test_normalize_expression(self):
+        assert normalize_expression(' sys.cpu.user ') == 'sys.cpu.user'
+        assert normalize_expression('sys.cpu.user{host=a, dc=b}') == normalize_expression('sys.cpu.user{dc=b,host=a}')
+        # Query strings are decoded once by parse_qsl, and never again: host=a+b and host=a b are different series
+        plus = dict(parse_qsl('q=sys.cpu%7Bhost%3Da%2Bb%7D'))['q']
+        space = dict(parse_qsl('q=sys.cpu%7Bhost%3Da+b%7D'))['q']
+        assert normalize_expression(plus) == 'sys.cpu{host=a+b}'
+        assert normalize_expression(space) == 'sys.cpu{host=a b}'